@@ -0,0 +1,51 @@
+import threading
+
+from django.conf import settings
+
+
+def get_settings(name, defaults):
+    """
+    Returns a dict setting with its missing keys taken from defaults.
+
+    Parameters:
+    - name: Name of the dict in the Django settings, e.g. 'RETENTION'.
+    - defaults: Dict of every key with its default value.
+
+    Returns:
+    - New dict, safe to modify.
+    """
+    return {**defaults, **getattr(settings, name, {})}
+
+
+class LazyInstance:
+    """
+    Process-wide object built on first use from a dict setting.
+
+    The setting is read when the object is built, so later changes to it
+    only apply after reset().
+
+    Attributes:
+    - name: Name of the dict setting, see get_settings().
+    - defaults: Default values of the setting.
+    - factory: Callable (config) -> object.
+    """
+
+    def __init__(self, name, defaults, factory):
+        self.name = name
+        self.defaults = defaults
+        self.factory = factory
+        self.instance = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """ Returns the object, building it if this is the first use """
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    self.instance = self.factory(get_settings(self.name, self.defaults))
+        return self.instance
+
+    def reset(self, instance=None):
+        """ Replaces the object, or drops it to be rebuilt on next use """
+        with self.lock:
+            self.instance = instance
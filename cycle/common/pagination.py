@@ -0,0 +1,263 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_fields(ordering):
+    """ Returns (field_name, descending) pairs for an ordering """
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def get_position(row, fields):
+    """ Returns the ordering key of a model instance or values() dict """
+    if isinstance(row, dict):
+        return [row[name] for name, _ in fields]
+    return [getattr(row, name) for name, _ in fields]
+
+
+def build_seek_filter(fields, position):
+    """
+    Builds the lexicographic "strictly after position" condition.
+
+    For ordering (a, b, c) this is
+    a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+    with < in place of > for descending fields.
+    """
+    condition = Q()
+    equal = {}
+    for (name, descending), value in zip(fields, position):
+        lookup = '__lt' if descending else '__gt'
+        condition |= Q(**equal, **{name + lookup: value})
+        equal[name] = value
+    return condition
+
+
+def is_after(key, position, fields):
+    """ Python counterpart of build_seek_filter for a single row key """
+    for (_, descending), value, bound in zip(fields, key, position):
+        if value != bound:
+            return value < bound if descending else value > bound
+    return False
+
+
+def iterate_in_chunks(queryset, ordering=('created_at', 'id'), chunk_size=2000):
+    """
+    Walks a queryset in keyset-ordered chunks.
+
+    Every chunk is a separate LIMIT query seeking past the previous one, so
+    memory stays bounded by chunk_size even on backends that buffer whole
+    result sets client-side (MySQL ignores QuerySet.iterator() streaming).
+
+    Parameters:
+    - queryset: Queryset, or values() queryset including the ordering fields.
+    - ordering: Ordering fields, the last one must be unique.
+    - chunk_size: Maximum number of rows fetched per query.
+
+    Yields:
+    - Lists of at most chunk_size rows.
+    """
+    fields = get_fields(ordering)
+    queryset = queryset.order_by(*ordering)
+    position = None
+    while True:
+        page = queryset if position is None else queryset.filter(build_seek_filter(fields, position))
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        position = get_position(rows[-1], fields)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on a composite, unique ordering.
+
+    Each page is fetched with a range condition on the ordering columns
+    (e.g. created_at < x OR (created_at = x AND id < y)) instead of an OFFSET,
+    so page N costs the same index range scan as page 1. The cursor handed
+    back to the client is an opaque base64 token of the last row's key.
+
+    Attributes:
+    - ordering: Ordering fields, the last one must be unique (usually the pk).
+    - page_size: Default number of results per page.
+    - max_page_size: Upper bound for the page_size query parameter.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None, page_size=None, model=None):
+        self.model = model
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        if page_size is not None:
+            self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns the rows of the requested page and remembers the next cursor.
+
+        Parameters:
+        - queryset: Filtered queryset to paginate.
+        - request: HTTP request carrying the cursor and page_size parameters.
+        - view: DRF view instance (unused).
+
+        Returns:
+        - List of model instances for the page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.next_cursor = None
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, self.model or queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.build_seek_filter(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_cursor = self.encode_cursor(get_position(rows[-1], self.get_fields()))
+        return rows
+
+    def paginate_iterable(self, rows, request):
+        """
+        Paginates rows that are already in ordering order, e.g. rows streamed
+        from somewhere other than the database.
+
+        Parameters:
+        - rows: Iterable of dicts holding the ordering fields as typed values.
+        - request: HTTP request carrying the cursor and page_size parameters.
+
+        Returns:
+        - List of rows for the page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.next_cursor = None
+        fields = self.get_fields()
+
+        position = self.decode_cursor(request, self.model)
+        page = []
+        for row in rows:
+            if position is not None and not is_after(get_position(row, fields), position, fields):
+                continue
+            if len(page) == self.page_size:
+                self.next_cursor = self.encode_cursor(get_position(page[-1], fields))
+                break
+            page.append(row)
+        return page
+
+    def get_paginated_response(self, data):
+        """ Wraps the page in a response carrying the next cursor and link """
+        return Response({
+            'next': self.get_next_link(),
+            'cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_fields(self):
+        return get_fields(self.ordering)
+
+    def build_seek_filter(self, position):
+        """ Returns the "strictly after position" condition for the ordering """
+        return build_seek_filter(self.get_fields(), position)
+
+    def encode_cursor(self, position):
+        position = [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in position]
+        payload = json.dumps(position, separators=(',', ':')).encode()
+        return urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        """
+        Decodes the cursor query parameter into typed ordering values.
+
+        Raises:
+        - NotFound: If the cursor is malformed.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            position = json.loads(urlsafe_b64decode(padded.encode()))
+            fields = self.get_fields()
+            if not isinstance(position, list) or len(position) != len(fields):
+                raise ValueError
+            return [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(fields, position)
+            ]
+        except (BinasciiError, ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Reads the planner's row estimate of a model's table.
+
+    Returns:
+    - Approximate number of rows, or None if the backend keeps no estimate.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator answering the count of an unfiltered queryset from the
+    database's table statistics instead of a COUNT(*) over the whole table.
+
+    Filtered querysets, tables below exact_below rows and backends without
+    statistics are still counted exactly.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
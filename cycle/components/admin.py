@@ -1,7 +1,49 @@
 from django.contrib import admin
-from .models import Bike, Wallet, History, Notification
+from .models import Bike, Wallet, WalletEntry, WalletSnapshot, WalletHold, History, RentalSession, Notification, NotificationCounter
 
-admin.site.register(Bike)
-admin.site.register(Wallet)
+
+class BikeAdmin(admin.ModelAdmin):
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner', 'rented_by')
+
+class WalletAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'current_balance', 'balance', 'updated_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    # balance is the last snapshot and only moves through the ledger
+    readonly_fields = ('balance', 'last_top_up', 'current_balance')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_current_balance()
+
+    @admin.display(description='Current balance')
+    def current_balance(self, wallet):
+        return wallet.current_balance
+
+class RentalSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'bike', 'rentee', 'started_at', 'ended_at', 'amount')
+    list_select_related = ('bike', 'rentee')
+    raw_id_fields = ('bike', 'rentee', 'renter', 'hold')
+    actions = ['cancel_rentals']
+
+    @admin.action(description='Cancel selected rentals without charging them')
+    def cancel_rentals(self, request, queryset):
+        cancelled = 0
+        for session in queryset.filter(ended_at__isnull=True).select_related('bike'):
+            if RentalSession.cancel(session.bike) is not None:
+                cancelled += 1
+        self.message_user(request, f'Cancelled {cancelled} rentals and released their holds.')
+
+class NotificationAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+admin.site.register(Bike, BikeAdmin)
+admin.site.register(Wallet, WalletAdmin)
+admin.site.register(WalletEntry)
+admin.site.register(WalletSnapshot)
+admin.site.register(WalletHold)
 admin.site.register(History)
-admin.site.register(Notification)
\ No newline at end of file
+admin.site.register(RentalSession, RentalSessionAdmin)
+admin.site.register(Notification, NotificationAdmin)
+admin.site.register(NotificationCounter)
\ No newline at end of file
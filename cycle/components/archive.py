@@ -0,0 +1,307 @@
+import fcntl
+import gzip
+import heapq
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from uuid import UUID, uuid4
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from common.pagination import iterate_in_chunks
+from .models import History
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.archive.lock'
+
+# History columns written to the segments, keyed like HistorySerializer output
+FIELDS = [
+    'id', 'created_at', 'updated_at', 'bike', 'rentee', 'renter', 'amount_paid',
+    'rental_start_time', 'rental_end_time', 'rental_status',
+]
+DATETIME_FIELDS = ('created_at', 'updated_at', 'rental_start_time', 'rental_end_time')
+UUID_FIELDS = ('id', 'bike')
+
+
+def get_archive_dir():
+    """ Returns the configured HISTORY_ARCHIVE_DIR """
+    return str(settings.HISTORY_ARCHIVE_DIR)
+
+
+class ArchiveLocked(Exception):
+    """ Raised when another archive_history() run holds the archive lock """
+
+
+@contextmanager
+def lock_archive(archive_dir):
+    """
+    Holds an exclusive lock on the archive directory.
+
+    The lock is an flock() on a file next to the manifest, so it is released
+    by the kernel if the process dies, and it covers every process sharing
+    the directory, which is what owns the manifest and segments.
+
+    Raises:
+    - ArchiveLocked: If another process holds the lock.
+    """
+    with open(os.path.join(archive_dir, LOCK_NAME), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ArchiveLocked(f'{archive_dir} is being archived by another process')
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_manifest(archive_dir):
+    """
+    Reads the archive manifest.
+
+    Returns:
+    - List of segment entries with path, day, rows, first/last created_at
+      and whether their rows were deleted from the hot table.
+    """
+    try:
+        with open(os.path.join(archive_dir, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)['segments']
+    except FileNotFoundError:
+        return []
+
+
+def save_manifest(archive_dir, segments):
+    """ Atomically replaces the archive manifest """
+    path = os.path.join(archive_dir, MANIFEST_NAME)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as manifest_file:
+        json.dump({'segments': segments}, manifest_file, indent=1)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(temp_path, path)
+
+
+def encode_row(row):
+    return json.dumps({
+        name: value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, UUID) else value
+        for name, value in row.items()
+    })
+
+
+def row_key(row):
+    return row['created_at'], row['id']
+
+
+def to_history(row):
+    """ Builds an unsaved History instance from an archived row, for HistorySerializer """
+    return History(
+        id=row['id'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+        bike_id=row['bike'],
+        rentee_id=row['rentee'],
+        renter_id=row['renter'],
+        amount_paid=row['amount_paid'],
+        rental_start_time=row['rental_start_time'],
+        rental_end_time=row['rental_end_time'],
+        rental_status=row['rental_status'],
+    )
+
+
+def decode_row(line):
+    row = json.loads(line)
+    for name in DATETIME_FIELDS:
+        if row[name] is not None:
+            row[name] = parse_datetime(row[name])
+    for name in UUID_FIELDS:
+        if row[name] is not None:
+            row[name] = UUID(row[name])
+    return row
+
+
+class SegmentWriter:
+    """
+    Writes one day of History rows to a new gzip NDJSON segment.
+
+    Segments live in YYYY/MM/ directories and are written to a temporary
+    file that is only renamed into place by close(), so a crash never
+    leaves a half written segment behind.
+    """
+
+    def __init__(self, archive_dir, day):
+        self.day = day
+        self.relative_path = os.path.join(f'{day:%Y}', f'{day:%m}', f'{day.isoformat()}-{uuid4().hex[:8]}.ndjson.gz')
+        self.path = os.path.join(archive_dir, self.relative_path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.raw_file = open(f'{self.path}.tmp', 'wb')
+        self.segment_file = gzip.GzipFile(fileobj=self.raw_file, mode='wb')
+        self.rows = 0
+        self.first_created_at = self.last_created_at = None
+
+    def write(self, row):
+        self.segment_file.write(encode_row(row).encode() + b'\n')
+        self.rows += 1
+        self.first_created_at = self.first_created_at or row['created_at']
+        self.last_created_at = row['created_at']
+
+    def close(self):
+        """
+        Flushes the segment to disk and moves it into place.
+
+        Returns:
+        - Manifest entry of the segment.
+        """
+        self.segment_file.close()
+        self.raw_file.flush()
+        os.fsync(self.raw_file.fileno())
+        self.raw_file.close()
+        os.replace(f'{self.path}.tmp', self.path)
+        return {
+            'path': self.relative_path,
+            'day': self.day.isoformat(),
+            'rows': self.rows,
+            'first_created_at': self.first_created_at.isoformat(),
+            'last_created_at': self.last_created_at.isoformat(),
+            'deleted': False,
+        }
+
+
+def read_segment(archive_dir, entry):
+    """ Yields the decoded rows of a segment in (created_at, id) order """
+    with gzip.open(os.path.join(archive_dir, entry['path']), 'rt') as segment_file:
+        for line in segment_file:
+            yield decode_row(line)
+
+
+def delete_archived_rows(archive_dir, entry, chunk_size):
+    """ Deletes the rows of a segment from the hot table in primary key chunks """
+    ids = []
+    for row in read_segment(archive_dir, entry):
+        ids.append(row['id'])
+        if len(ids) == chunk_size:
+            History.objects.filter(pk__in=ids).delete()
+            ids = []
+    if ids:
+        History.objects.filter(pk__in=ids).delete()
+    entry['deleted'] = True
+
+
+def archive_history(min_age, archive_dir=None, chunk_size=1000):
+    """
+    Moves History rows older than min_age into daily segment files.
+
+    Only whole days before the cutoff are archived. A day is written to its
+    segment and recorded in the manifest before its rows are deleted, and
+    segments whose deletion was interrupted are finished first on the next
+    run, so no row is ever lost or archived twice. Runs hold the archive
+    directory lock, so concurrent runs fail instead of racing on the
+    manifest.
+
+    Parameters:
+    - min_age: timedelta, rows created before now - min_age are archived.
+    - archive_dir: Target directory, defaults to HISTORY_ARCHIVE_DIR.
+    - chunk_size: Number of rows read and deleted per query.
+
+    Returns:
+    - Number of archived rows.
+
+    Raises:
+    - ArchiveLocked: If another run is in progress.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    os.makedirs(archive_dir, exist_ok=True)
+    with lock_archive(archive_dir):
+        return archive_locked(min_age, archive_dir, chunk_size)
+
+
+def archive_locked(min_age, archive_dir, chunk_size):
+    """ Body of archive_history(), run while holding the archive lock """
+    segments = load_manifest(archive_dir)
+    for entry in segments:
+        if not entry['deleted']:
+            delete_archived_rows(archive_dir, entry, chunk_size)
+            save_manifest(archive_dir, segments)
+
+    cutoff_day = timezone.localdate() - min_age
+    cutoff = timezone.make_aware(datetime.combine(cutoff_day, time.min))
+    archived = 0
+    writer = None
+    old_rows = History.objects.filter(created_at__lt=cutoff).values(*FIELDS)
+    for chunk in iterate_in_chunks(old_rows, chunk_size=chunk_size):
+        for row in chunk:
+            day = timezone.localtime(row['created_at']).date()
+            if writer is not None and writer.day != day:
+                archived += finish_segment(archive_dir, segments, writer, chunk_size)
+                writer = None
+            if writer is None:
+                writer = SegmentWriter(archive_dir, day)
+            writer.write(row)
+    if writer is not None:
+        archived += finish_segment(archive_dir, segments, writer, chunk_size)
+    return archived
+
+
+def finish_segment(archive_dir, segments, writer, chunk_size):
+    """ Records a written segment in the manifest, then deletes its rows """
+    entry = writer.close()
+    segments.append(entry)
+    save_manifest(archive_dir, segments)
+    delete_archived_rows(archive_dir, entry, chunk_size)
+    save_manifest(archive_dir, segments)
+    return entry['rows']
+
+
+def iter_archived_history(start=None, end=None, descending=False, archive_dir=None, after=None):
+    """
+    Streams archived History rows overlapping a created_at range.
+
+    Segments outside the range, or wholly at or before the after position,
+    are skipped using the manifest alone, so resuming from a cursor only
+    opens the segments still ahead of it. Ascending reads merge the segments
+    of a day as streams, descending reads hold one day in memory at a time
+    to reverse it.
+
+    Parameters:
+    - start: Inclusive lower created_at bound, or None.
+    - end: Exclusive upper created_at bound, or None.
+    - descending: Yield newest rows first instead of oldest first.
+    - archive_dir: Archive directory, defaults to HISTORY_ARCHIVE_DIR.
+    - after: (created_at, id) of the last row already seen, e.g. from a
+      pagination cursor; only rows past it in the read order are yielded.
+
+    Yields:
+    - History row dicts in (created_at, id) order.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    if after is not None:
+        after = tuple(after)
+        if descending and (end is None or after[0] < end):
+            # Rows at after[0] with a smaller id are still ahead
+            end = after[0] + timedelta(microseconds=1)
+        elif not descending and (start is None or after[0] > start):
+            start = after[0]
+    segments = [
+        entry for entry in load_manifest(archive_dir)
+        if (start is None or parse_datetime(entry['last_created_at']) >= start)
+        and (end is None or parse_datetime(entry['first_created_at']) < end)
+    ]
+    by_day = {}
+    for entry in segments:
+        by_day.setdefault(entry['day'], []).append(entry)
+
+    for day in sorted(by_day, reverse=descending):
+        streams = [read_segment(archive_dir, entry) for entry in by_day[day]]
+        rows = heapq.merge(*streams, key=row_key)
+        if descending:
+            rows = sorted(rows, key=row_key, reverse=True)
+        for row in rows:
+            if start is not None and row['created_at'] < start:
+                continue
+            if end is not None and row['created_at'] >= end:
+                continue
+            if after is not None and (row_key(row) >= after if descending else row_key(row) <= after):
+                continue
+            yield row
@@ -0,0 +1,285 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from uuid import uuid4
+
+from django.apps import apps
+from django.core import serializers
+from django.db import DatabaseError, connection
+
+from common.conf import LazyInstance, get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_BATCH': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+    'SPOOL_DIR': None,
+}
+
+
+class EventBuffer:
+    """
+    In-process buffer that writes History events in batches.
+
+    Events are queued by the request thread and inserted with bulk_create
+    by a background thread whenever max_batch events are waiting or
+    flush_interval seconds have passed. Batches that cannot be inserted are
+    spooled to JSON files in spool_dir and replayed after the next
+    successful flush, and stop() drains the queue on interpreter shutdown.
+
+    If a batch can be neither inserted nor spooled, its events are saved
+    one by one, and the flusher logs and survives any error. Spool files
+    that cannot be replayed while the database is up are renamed to
+    *.failed so they do not block the files behind them.
+
+    The spool only covers batches the database rejected: events still
+    queued in memory are lost if the process dies without running its
+    atexit handlers (SIGKILL, OOM kill, power loss). Leave the buffer off
+    where every event must survive a hard crash.
+
+    Events keep the created_at assigned when they were recorded, see
+    History._record(), so rows may be inserted with a created_at up to
+    flush_interval in the past, or older still when replayed from the spool.
+
+    Attributes:
+    - model_label: "app_label.ModelName" of the buffered model.
+    - max_batch: Maximum number of events per INSERT.
+    - flush_interval: Maximum seconds an event waits in the queue.
+    - max_queue: Queue bound, once reached events are written synchronously.
+    - spool_dir: Directory for batches that failed to insert.
+    """
+
+    def __init__(self, model_label, max_batch=200, flush_interval=1.0, max_queue=10000, spool_dir=None):
+        self.model_label = model_label
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stopping = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def start(self):
+        """ Starts the flusher thread and registers the shutdown drain """
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name='history-event-buffer', daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def enqueue(self, instance):
+        """
+        Queues an unsaved instance for insertion.
+
+        Falls back to a synchronous INSERT when the queue is full or the
+        buffer is shutting down, so events are never dropped.
+        """
+        if self.thread is None:
+            self.start()
+        if self.stopping.is_set():
+            instance.save(force_insert=True)
+            return
+        try:
+            self.queue.put_nowait(instance)
+        except queue.Full:
+            instance.save(force_insert=True)
+
+    def run(self):
+        """ Flusher loop, collects batches by size or age """
+        try:
+            while not self.stopping.is_set():
+                try:
+                    batch = self.collect()
+                    if batch:
+                        # Reconnects after the database went away
+                        connection.close_if_unusable_or_obsolete()
+                        self.write(batch)
+                except Exception:
+                    logger.exception('History event buffer flush failed')
+        finally:
+            connection.close()
+
+    def collect(self):
+        """
+        Waits for up to max_batch events or flush_interval seconds, or until
+        stop() wakes the thread up.
+        """
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                instance = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if instance is None:
+                break
+            batch.append(instance)
+        return batch
+
+    def drain(self):
+        """ Writes everything currently queued from the calling thread """
+        while True:
+            batch = []
+            while len(batch) < self.max_batch:
+                try:
+                    instance = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if instance is not None:
+                    batch.append(instance)
+            if not batch:
+                return
+            self.write(batch)
+
+    def stop(self, timeout=10):
+        """ Stops the flusher thread and drains the remaining events """
+        self.stopping.set()
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            try:
+                # Wakes the flusher up from a wait for events
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        self.drain()
+
+    def write(self, batch):
+        """
+        Inserts a batch, spooling it to disk if the database refuses it and
+        saving its events one by one if it cannot be spooled either.
+        """
+        try:
+            self.model.objects.bulk_create(batch, batch_size=self.max_batch)
+        except Exception:
+            logger.exception('Could not write %d buffered events, spooling them', len(batch))
+            try:
+                self.spool(batch)
+            except Exception:
+                logger.exception('Could not spool %d buffered events, saving them one by one', len(batch))
+                self.save_each(batch)
+            return
+        try:
+            self.replay_spool()
+        except Exception:
+            logger.exception('Could not replay the History event spool')
+
+    def save_each(self, batch):
+        """ Last resort for a batch that could not be spooled """
+        for instance in batch:
+            try:
+                instance.save(force_insert=True)
+            except Exception:
+                logger.exception('History event %s lost', instance.pk)
+
+    def spool(self, batch):
+        """
+        Atomically writes a batch to a new file in spool_dir.
+
+        Raises:
+        - OSError: If there is no spool_dir or the file cannot be written.
+        """
+        if not self.spool_dir:
+            raise OSError('No HISTORY_EVENT_BUFFER SPOOL_DIR configured')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        name = f'{time.time_ns()}-{os.getpid()}-{uuid4().hex}.json'
+        temp_path = os.path.join(self.spool_dir, f'.{name}.tmp')
+        with open(temp_path, 'w') as spool_file:
+            serializers.serialize('json', batch, stream=spool_file)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+        os.replace(temp_path, os.path.join(self.spool_dir, name))
+
+    def replay_spool(self):
+        """
+        Inserts spooled batches and removes their files.
+
+        Files are claimed with an atomic rename so concurrent processes
+        sharing spool_dir never replay the same batch twice, and rows are
+        inserted with ignore_conflicts so a replay interrupted half way can
+        safely be repeated. A file that cannot be read, or whose insert
+        fails while the database is reachable, is renamed to *.failed for
+        inspection. When the database is down the file is put back and the
+        replay stops.
+
+        Returns:
+        - Number of replayed events.
+        """
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return 0
+        replayed = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            claimed_path = f'{path}.{os.getpid()}.replaying'
+            try:
+                os.rename(path, claimed_path)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed_path) as spool_file:
+                    batch = [item.object for item in serializers.deserialize('json', spool_file)]
+                self.model.objects.bulk_create(batch, batch_size=self.max_batch, ignore_conflicts=True)
+            except DatabaseError:
+                if not database_available():
+                    logger.exception('Could not replay spooled events from %s, database unavailable', name)
+                    os.rename(claimed_path, path)
+                    break
+                logger.exception('Could not replay spooled events from %s, moving it aside', name)
+                os.rename(claimed_path, f'{path}.failed')
+                continue
+            except Exception:
+                logger.exception('Could not read spooled events from %s, moving it aside', name)
+                os.rename(claimed_path, f'{path}.failed')
+                continue
+            os.remove(claimed_path)
+            replayed += len(batch)
+        return replayed
+
+
+def database_available():
+    """ Returns whether the default database answers a query """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return False
+    return True
+
+
+_buffer = LazyInstance('HISTORY_EVENT_BUFFER', DEFAULTS, lambda config: EventBuffer(
+    'components.History',
+    max_batch=config['MAX_BATCH'],
+    flush_interval=config['FLUSH_INTERVAL'],
+    max_queue=config['MAX_QUEUE'],
+    spool_dir=config['SPOOL_DIR'],
+))
+
+
+def get_event_buffer():
+    """
+    Returns the process-wide History event buffer.
+
+    Returns:
+    - EventBuffer instance, or None when HISTORY_EVENT_BUFFER is not enabled.
+    """
+    if not get_settings('HISTORY_EVENT_BUFFER', DEFAULTS)['ENABLED']:
+        return None
+    return _buffer.get()
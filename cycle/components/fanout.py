@@ -0,0 +1,40 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connection
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+# A single worker keeps broadcasts from competing with each other for the
+# database; queued broadcasts run one after the other.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-fanout')
+
+
+def broadcast_in_background(content, role=None, institution=None):
+    """
+    Queue Notification.broadcast() on the fan-out worker thread.
+
+    Parameters:
+    - content: Content of the notification.
+    - role: Only notify users with this User.Role.
+    - institution: Only notify renters of this institution.
+
+    Returns:
+    - Future resolving to the number of notifications created.
+    """
+    return _executor.submit(_broadcast, content, role, institution)
+
+
+def _broadcast(content, role, institution):
+    close_old_connections()
+    try:
+        sent = Notification.broadcast(content, role=role, institution=institution)
+        logger.info('Broadcast notification to %d users', sent)
+        return sent
+    except Exception:
+        logger.exception('Notification broadcast failed')
+        raise
+    finally:
+        connection.close()
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+class KeyLocks:
+    """
+    Reference counted per-key locks, so concurrent duplicates inside one
+    process wait for the first request instead of racing it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locks = {}
+
+    def acquire(self, key):
+        with self.lock:
+            entry = self.locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+
+    def release(self, key):
+        with self.lock:
+            entry = self.locks[key]
+            entry[0].release()
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+
+_key_locks = KeyLocks()
+
+
+def idempotent(method):
+    """
+    Makes a DRF view method replay its response for a repeated Idempotency-Key.
+
+    The first request with a key claims a row in IdempotencyRecord, runs the
+    view and stores its response; retries with the same key get the stored
+    response back, from the in-process cache when possible, without running
+    the view again. Duplicates arriving while the first request is still
+    running are coalesced: in the same process they wait on a per-key lock,
+    across processes they poll the record for up to IDEMPOTENCY_WAIT.
+    5xx responses are not stored so the client can retry them.
+
+    Replays carry an Idempotent-Replayed: true header. Reusing a key for a
+    different request body returns 422.
+
+    An in-flight claim is only a lease of IDEMPOTENCY_LEASE, extended to
+    IDEMPOTENCY_TTL once the response is stored, so if the worker dies
+    mid-request a retry can take the key over after the lease instead of
+    getting 409 for a whole TTL.
+
+    Keys are scoped per user. Anonymous clients cannot be told apart, so
+    their keys are scoped by the request fingerprint as well: a key only
+    replays for the exact same request, and two clients picking the same
+    key never see each other's response or a 422.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'detail': f'{HEADER} is too long.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = hashlib.sha256(
+            b'\n'.join([request.method.encode(), request.path.encode(), request._request.body])
+        ).hexdigest()
+        scope = f'user:{request.user.pk}' if request.user.is_authenticated else f'anonymous:{fingerprint[:48]}'
+        cache_key = 'idempotency:' + hashlib.sha256(f'{scope}:{key}'.encode()).hexdigest()
+
+        _key_locks.acquire(cache_key)
+        try:
+            stored = cache.get(cache_key)
+            if stored is None:
+                record, claimed = claim(scope, key, fingerprint)
+                if claimed:
+                    return run(method, self, request, args, kwargs, record, cache_key)
+                stored = wait_for(record)
+                if stored is None:
+                    return Response(
+                        {'detail': 'A request with this key is still being processed.'},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                cache.set(cache_key, stored, settings.IDEMPOTENCY_CACHE_TTL)
+        finally:
+            _key_locks.release(cache_key)
+
+        if stored['fingerprint'] != fingerprint:
+            return Response(
+                {'detail': f'{HEADER} was already used for a different request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return replay(stored)
+
+    return wrapper
+
+
+def claim(scope, key, fingerprint):
+    """
+    Inserts the in-flight record for a key, leased for IDEMPOTENCY_LEASE.
+
+    A record past its expires_at, a finished one past IDEMPOTENCY_TTL or an
+    in-flight one whose worker died, is deleted and the key claimed again.
+
+    Returns:
+    - (record, claimed): the new record and True if the key was claimed,
+      otherwise the existing record (None if it kept vanishing under
+      concurrent claims) and False.
+    """
+    for _ in range(3):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyRecord.objects.create(
+                    scope=scope, key=key, fingerprint=fingerprint, expires_at=now + settings.IDEMPOTENCY_LEASE
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+            if record is None:
+                continue
+            if record.expires_at > now:
+                return record, False
+            # Only delete it if it is still expired, its owner may have just
+            # stored the response and extended it
+            IdempotencyRecord.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+    return None, False
+
+
+def wait_for(record):
+    """
+    Polls an in-flight record until its response is stored.
+
+    Returns:
+    - Stored response dict, or None if it did not complete in time.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT.total_seconds()
+    while record and record.status_code is None:
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.05)
+        record = IdempotencyRecord.objects.filter(pk=record.pk).first()
+    if not record:
+        return None
+    return stored_response(record)
+
+
+def run(method, view, request, args, kwargs, record, cache_key):
+    """
+    Runs the view for a freshly claimed key and stores its response.
+
+    The record is updated by primary key, so a worker that outlived its
+    lease never overwrites the record of the request that took the key over.
+    """
+    try:
+        response = method(view, request, *args, **kwargs)
+    except Exception:
+        IdempotencyRecord.objects.filter(pk=record.pk).delete()
+        raise
+    if response.status_code >= 500:
+        IdempotencyRecord.objects.filter(pk=record.pk).delete()
+        return response
+
+    body = json.dumps(getattr(response, 'data', None), cls=JSONEncoder)
+    now = timezone.now()
+    IdempotencyRecord.objects.filter(pk=record.pk).update(
+        status_code=response.status_code, response_body=body,
+        expires_at=now + settings.IDEMPOTENCY_TTL, updated_at=now,
+    )
+    stored = {'fingerprint': record.fingerprint, 'status_code': response.status_code, 'body': body}
+    cache.set(cache_key, stored, settings.IDEMPOTENCY_CACHE_TTL)
+    return response
+
+
+def stored_response(record):
+    return {
+        'fingerprint': record.fingerprint,
+        'status_code': record.status_code,
+        'body': record.response_body,
+    }
+
+
+def replay(stored):
+    response = Response(json.loads(stored['body']), status=stored['status_code'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from components.retention import POLICIES, apply_retention
+
+
+class Command(BaseCommand):
+    """
+    Deletes expired tokens and sessions, old read notifications and expired
+    idempotency keys according to RETENTION. Meant to run from cron.
+    """
+    help = "Applies the retention policies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', dest='policies',
+                            help='Only apply this policy, may be repeated')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Number of rows deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=None,
+                            help='Seconds to pause between batches')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Maximum number of batches per policy')
+
+    def handle(self, *args, **options):
+        names = options['policies']
+        unknown = set(names or ()) - {policy.name for policy in POLICIES}
+        if unknown:
+            raise CommandError(f"Unknown policies: {', '.join(sorted(unknown))}")
+        deleted = apply_retention(
+            names, batch_size=options['batch_size'], sleep=options['sleep'], max_batches=options['max_batches']
+        )
+        for name, count in deleted.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Deleted {sum(deleted.values())} rows'))
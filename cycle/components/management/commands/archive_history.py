@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from components.archive import ArchiveLocked, archive_history
+
+
+class Command(BaseCommand):
+    """
+    Moves old History rows into compressed daily segment files under
+    HISTORY_ARCHIVE_DIR and deletes them from the table in chunks. Archived
+    rows stay readable through the archived=true option of the History list
+    and export endpoints.
+    """
+    help = "Archives History rows older than the configured age"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-days', type=int, default=settings.HISTORY_ARCHIVE_MIN_AGE_DAYS,
+                            help='Archive rows created before this many days ago')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of rows read and deleted per query')
+        parser.add_argument('--dir', default=None, help='Archive directory, defaults to HISTORY_ARCHIVE_DIR')
+
+    def handle(self, *args, **options):
+        try:
+            archived = archive_history(
+                timedelta(days=options['min_age_days']),
+                archive_dir=options['dir'],
+                chunk_size=options['chunk_size'],
+            )
+        except ArchiveLocked as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} History rows'))
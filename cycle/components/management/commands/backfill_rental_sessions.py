@@ -0,0 +1,122 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from common.pagination import iterate_in_chunks
+from components.models import Bike, History, RentalSession
+
+
+class Command(BaseCommand):
+    """
+    Builds RentalSession rows from existing BIKE_RENTED / BIKE_RETURNED
+    History events.
+
+    Bikes are walked in primary key chunks and the events of each chunk are
+    read in keyset chunks and paired per bike in created_at order, so memory
+    stays bounded by the chunk sizes however long a bike's history is. A
+    rented event closes the session it opened at the next returned event of
+    the same bike. When a bike is rented again without a return in between,
+    the earlier session is ended at the start of the later one.
+
+    Sessions are keyed on their start event. New ones are inserted, and a
+    rerun closes sessions still open in the table once their return event
+    exists. Sessions already closed in the table, by BikeReturnView, a
+    cancel or an earlier run, are never rewritten: the live code knows
+    about cancels and buffered returns that the events do not show. Wallet
+    holds are left alone.
+    """
+    help = "Backfills rental sessions from the History table"
+
+    fields = ['id', 'bike', 'rentee', 'renter', 'amount_paid', 'created_at',
+              'rental_start_time', 'rental_end_time', 'rental_status']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bike-chunk-size', type=int, default=200,
+                            help='Number of bikes whose events are paired per batch')
+        parser.add_argument('--event-chunk-size', type=int, default=2000,
+                            help='Number of History events read per query')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of sessions inserted per INSERT')
+
+    def handle(self, *args, **options):
+        written = 0
+        sessions = []
+        bikes = Bike.objects.values('id')
+        for chunk in iterate_in_chunks(bikes, ordering=('id',), chunk_size=options['bike_chunk_size']):
+            events = History.objects.filter(
+                bike_id__in=[bike['id'] for bike in chunk],
+                rental_status__in=[History.EventType.BIKE_RENTED, History.EventType.BIKE_RETURNED],
+            ).values(*self.fields)
+            for session in self.pair(self.iter_events(events, options['event_chunk_size'])):
+                sessions.append(session)
+                if len(sessions) == options['batch_size']:
+                    written += self.write(sessions)
+                    sessions = []
+        if sessions:
+            written += self.write(sessions)
+        self.stdout.write(self.style.SUCCESS(f'Paired {written} rental sessions'))
+
+    def iter_events(self, events, chunk_size):
+        for chunk in iterate_in_chunks(events, ordering=('bike', 'created_at', 'id'), chunk_size=chunk_size):
+            yield from chunk
+
+    def write(self, sessions):
+        """ Inserts new sessions and closes the ones still open in the table """
+        existing = dict(
+            RentalSession.objects.filter(start_event__in=[session.start_event for session in sessions])
+            .values_list('start_event', 'ended_at')
+        )
+        # Conflicts are sessions started by BikeRentView since the lookup
+        RentalSession.objects.bulk_create(
+            [session for session in sessions if session.start_event not in existing], ignore_conflicts=True,
+        )
+        now = timezone.now()
+        for session in sessions:
+            if session.ended_at is None or session.start_event not in existing or existing[session.start_event]:
+                continue
+            # Guarded so that a session closed since the lookup is kept
+            RentalSession.objects.filter(start_event=session.start_event, ended_at__isnull=True).update(
+                ended_at=session.ended_at, duration=session.duration, end_event=session.end_event, updated_at=now,
+            )
+        return len(sessions)
+
+    def pair(self, events):
+        """
+        Pairs ordered events into sessions.
+
+        Parameters:
+        - events: History values ordered by bike, created_at and id.
+
+        Yields:
+        - Unsaved RentalSession instances.
+        """
+        open_session = None
+        for event in events:
+            if open_session is not None and open_session.bike_id != event['bike']:
+                yield open_session
+                open_session = None
+
+            if event['rental_status'] == History.EventType.BIKE_RENTED:
+                started_at = event['rental_start_time'] or event['created_at']
+                if open_session is not None:
+                    yield self.close(open_session, started_at, None)
+                open_session = RentalSession(
+                    bike_id=event['bike'],
+                    rentee_id=event['rentee'],
+                    renter_id=event['renter'],
+                    amount=event['amount_paid'],
+                    started_at=started_at,
+                    start_event=event['id'],
+                )
+            elif open_session is not None:
+                ended_at = event['rental_end_time'] or event['created_at']
+                yield self.close(open_session, ended_at, event['id'])
+                open_session = None
+
+        if open_session is not None:
+            yield open_session
+
+    def close(self, session, ended_at, end_event):
+        session.ended_at = ended_at
+        session.duration = ended_at - session.started_at
+        session.end_event = end_event
+        return session
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from components.models import WalletHold
+
+
+class Command(BaseCommand):
+    """
+    Frees wallet holds whose rentals outlived WALLET_HOLD_TTL. Meant to run
+    from cron every few minutes.
+    """
+    help = "Expires stale wallet holds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of holds expired per UPDATE')
+
+    def handle(self, *args, **options):
+        expired = WalletHold.expire_stale(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} wallet holds'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q, Sum
+
+from common.pagination import iterate_in_chunks
+from components.models import Wallet
+
+
+class Command(BaseCommand):
+    """
+    Checks that every Wallet.balance equals the sum of its folded ledger
+    entries, and fails listing the wallets where they disagree.
+    """
+    help = "Verifies wallet balances against the ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of wallets checked per query')
+
+    def handle(self, *args, **options):
+        mismatches = []
+        checked = 0
+        wallets = Wallet.objects.annotate(
+            ledger_balance=Sum('entries__amount', filter=Q(entries__folded=True), default=0)
+        ).values('id', 'balance', 'ledger_balance')
+        for chunk in iterate_in_chunks(wallets, ordering=('id',), chunk_size=options['chunk_size']):
+            checked += len(chunk)
+            mismatches += [wallet for wallet in chunk if wallet['balance'] != wallet['ledger_balance']]
+
+        for wallet in mismatches:
+            self.stderr.write(
+                f"Wallet {wallet['id']}: balance {wallet['balance']} != ledger {wallet['ledger_balance']}"
+            )
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} of {checked} wallets do not match their ledger')
+        self.stdout.write(self.style.SUCCESS(f'All {checked} wallets match their ledger'))
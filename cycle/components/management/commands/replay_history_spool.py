@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from common.conf import get_settings
+from components.eventlog import DEFAULTS, EventBuffer
+
+
+class Command(BaseCommand):
+    """
+    Inserts History events that the event buffer spooled to disk while the
+    database was unavailable.
+    """
+    help = "Replays History events spooled by the buffered event logger"
+
+    def handle(self, *args, **options):
+        config = get_settings('HISTORY_EVENT_BUFFER', DEFAULTS)
+        event_buffer = EventBuffer('components.History', max_batch=config['MAX_BATCH'], spool_dir=config['SPOOL_DIR'])
+        replayed = event_buffer.replay_spool()
+        self.stdout.write(self.style.SUCCESS(f'Replayed {replayed} spooled History events'))
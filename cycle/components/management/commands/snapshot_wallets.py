@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from components.models import Wallet, WalletEntry
+
+
+class Command(BaseCommand):
+    """
+    Folds the unfolded ledger entries of busy wallets into Wallet.balance,
+    keeping the tail read by every balance lookup short.
+    """
+    help = "Takes balance snapshots of wallets with a long ledger tail"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-tail', type=int, default=50,
+                            help='Only snapshot wallets with at least this many unfolded entries')
+
+    def handle(self, *args, **options):
+        wallet_ids = (
+            WalletEntry.objects.filter(folded=False)
+            .values('wallet')
+            .annotate(tail=Count('id'))
+            .filter(tail__gte=options['min_tail'])
+            .values_list('wallet', flat=True)
+        )
+        snapshots = 0
+        for wallet in Wallet.objects.filter(pk__in=list(wallet_ids)).iterator():
+            if wallet.take_snapshot() is not None:
+                snapshots += 1
+        self.stdout.write(self.style.SUCCESS(f'Took {snapshots} wallet snapshots'))
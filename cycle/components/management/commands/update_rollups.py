@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from components.archive import ArchiveLocked
+from components.rollups import rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    """
+    Folds new History rows into the daily renter, bike and rental_status
+    rollups. Meant to run every few minutes from cron; reruns are idempotent.
+
+    With --rebuild-from (and optionally --rebuild-to) the rollups of those
+    days are recomputed from History instead, repairing rows that committed
+    more than --lag-seconds after their created_at. Archived days are
+    refolded from the History archive.
+    """
+    help = "Incrementally updates the daily History rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of History rows folded per transaction')
+        parser.add_argument('--lag-seconds', type=int, default=60,
+                            help='Minimum age of the History rows to fold')
+        parser.add_argument('--rebuild-from', help='First day (YYYY-MM-DD) of the rollups to rebuild')
+        parser.add_argument('--rebuild-to', help='Last day (YYYY-MM-DD) of the rollups to rebuild, defaults to today')
+
+    def handle(self, *args, **options):
+        if options['rebuild_from']:
+            start = self.parse_day(options['rebuild_from'])
+            end = self.parse_day(options['rebuild_to']) if options['rebuild_to'] else timezone.localdate()
+            try:
+                folded = rebuild_rollups(start, end, chunk_size=options['chunk_size'])
+            except ArchiveLocked as error:
+                raise CommandError(str(error))
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt the rollups of {start} to {end} from {folded} History rows'))
+            return
+        folded = update_rollups(
+            chunk_size=options['chunk_size'],
+            lag=timedelta(seconds=options['lag_seconds']),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} History rows into the rollups'))
+
+    def parse_day(self, value):
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f"'{value}' is not a valid date")
+        return day
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("components", "0004_alter_bike_rented_by_alter_history_rentee"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bike",
+            index=models.Index(fields=["created_at", "id"], name="bike_created_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="bike",
+            index=models.Index(
+                fields=["owner", "created_at", "id"], name="bike_owner_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bike",
+            index=models.Index(
+                fields=["rented", "created_at", "id"], name="bike_rented_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bike",
+            index=models.Index(
+                fields=["brand", "created_at", "id"], name="bike_brand_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bike",
+            index=models.Index(fields=["rent_price"], name="bike_rent_price_idx"),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("components", "0005_bike_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="history",
+            index=models.Index(
+                fields=["created_at", "id"], name="history_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="history",
+            index=models.Index(
+                fields=["renter", "created_at", "id"], name="history_renter_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="history",
+            index=models.Index(
+                fields=["rentee", "created_at", "id"], name="history_rentee_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_delete_rentee_rentee_alter_renteeprofile_user"),
+        ("components", "0006_history_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RentalSession",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("started_at", models.DateTimeField()),
+                ("ended_at", models.DateTimeField(blank=True, null=True)),
+                ("duration", models.DurationField(blank=True, null=True)),
+                ("amount", models.IntegerField(default=0)),
+                ("start_event", models.UUIDField(blank=True, null=True, unique=True)),
+                ("end_event", models.UUIDField(blank=True, null=True)),
+                (
+                    "bike",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rental_sessions",
+                        to="components.bike",
+                    ),
+                ),
+                (
+                    "rentee",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rental_sessions",
+                        to="users.rentee",
+                    ),
+                ),
+                (
+                    "renter",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rental_sessions",
+                        to="users.renter",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["bike", "ended_at"], name="session_bike_open_idx"
+                    ),
+                    models.Index(
+                        fields=["rentee", "ended_at"], name="session_rentee_open_idx"
+                    ),
+                    models.Index(
+                        fields=["renter", "started_at"],
+                        name="session_renter_started_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,168 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_delete_rentee_rentee_alter_renteeprofile_user"),
+        ("components", "0007_rentalsession"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BikeDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("day", models.DateField()),
+                (
+                    "rental_status",
+                    models.CharField(
+                        choices=[
+                            ("Bike Rented", "Bike Rented"),
+                            ("Bike Returned", "Bike Returned"),
+                            ("Renter Rental", "Renter Rental"),
+                            ("Rentee Rental", "Rentee Rental"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("events", models.IntegerField(default=0)),
+                ("amount", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RenterDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("day", models.DateField()),
+                (
+                    "rental_status",
+                    models.CharField(
+                        choices=[
+                            ("Bike Rented", "Bike Rented"),
+                            ("Bike Returned", "Bike Returned"),
+                            ("Renter Rental", "Renter Rental"),
+                            ("Rentee Rental", "Rentee Rental"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("events", models.IntegerField(default=0)),
+                ("amount", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("name", models.CharField(max_length=60, unique=True)),
+                ("last_created_at", models.DateTimeField(blank=True, null=True)),
+                ("last_history_id", models.UUIDField(blank=True, null=True)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="StatusDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("day", models.DateField()),
+                (
+                    "rental_status",
+                    models.CharField(
+                        choices=[
+                            ("Bike Rented", "Bike Rented"),
+                            ("Bike Returned", "Bike Returned"),
+                            ("Renter Rental", "Renter Rental"),
+                            ("Rentee Rental", "Rentee Rental"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("events", models.IntegerField(default=0)),
+                ("amount", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="statusdailyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "rental_status"), name="unique_status_daily_rollup"
+            ),
+        ),
+        migrations.AddField(
+            model_name="renterdailyrollup",
+            name="renter",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_rollups",
+                to="users.renter",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bikedailyrollup",
+            name="bike",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_rollups",
+                to="components.bike",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="renterdailyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("renter", "day", "rental_status"),
+                name="unique_renter_daily_rollup",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="bikedailyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("bike", "day", "rental_status"), name="unique_bike_daily_rollup"
+            ),
+        ),
+    ]
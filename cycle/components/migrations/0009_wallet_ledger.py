@@ -0,0 +1,110 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def open_ledgers(apps, schema_editor):
+    """
+    Record every existing balance as a folded opening entry so that the
+    ledger and Wallet.balance agree from the start.
+    """
+    Wallet = apps.get_model("components", "Wallet")
+    WalletEntry = apps.get_model("components", "WalletEntry")
+    WalletSnapshot = apps.get_model("components", "WalletSnapshot")
+    for wallet in Wallet.objects.exclude(balance=0).iterator():
+        WalletEntry.objects.create(
+            wallet=wallet, amount=wallet.balance, kind="Opening", folded=True
+        )
+        WalletSnapshot.objects.create(wallet=wallet, balance=wallet.balance, entries=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("components", "0008_daily_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalletSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("balance", models.IntegerField()),
+                ("entries", models.IntegerField()),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="components.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["wallet", "created_at"], name="wallet_snapshot_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="WalletEntry",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("amount", models.IntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("Opening", "Opening"),
+                            ("Top Up", "Top Up"),
+                            ("Debit", "Debit"),
+                            ("Refund", "Refund"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("reference", models.CharField(blank=True, max_length=100)),
+                ("folded", models.BooleanField(default=False)),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="entries",
+                        to="components.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["wallet", "folded"], name="wallet_entry_tail_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("components", "0009_wallet_ledger"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalletHold",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("amount", models.IntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Held", "Held"),
+                            ("Captured", "Captured"),
+                            ("Released", "Released"),
+                            ("Expired", "Expired"),
+                        ],
+                        default="Held",
+                        max_length=20,
+                    ),
+                ),
+                ("reference", models.CharField(blank=True, max_length=100)),
+                ("expires_at", models.DateTimeField()),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="holds",
+                        to="components.wallet",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="rentalsession",
+            name="hold",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="components.wallethold",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallethold",
+            index=models.Index(
+                fields=["wallet", "status"], name="wallet_hold_active_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallethold",
+            index=models.Index(
+                fields=["status", "expires_at"], name="wallet_hold_expiry_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("components", "0012_notification_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "created_at"], name="notification_user_created_idx"
+            ),
+        ),
+    ]
@@ -1,7 +1,12 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from uuid import uuid4
 from users.models import User, Rentee, Renter
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
+from .eventlog import get_event_buffer
+from common.pagination import iterate_in_chunks
+from .streams import get_notification_hub, notification_payload
 
 class BaseModel(models.Model):
     """
@@ -14,6 +19,22 @@ class BaseModel(models.Model):
     class Meta:
         abstract = True
 
+class BikeQuerySet(models.QuerySet):
+    """
+    QuerySet for Bike with read-optimized helpers.
+    """
+
+    def for_listing(self):
+        """
+        Prefetches the ids of the rentees of every bike in one extra query.
+
+        Returns:
+        - QuerySet to be serialized with BikeListSerializer.
+        """
+        return self.prefetch_related(
+            models.Prefetch('rented_by', queryset=Rentee.objects.only('pk'))
+        )
+
 class Bike(BaseModel):
     """
     Model that handles creation of Bike instances.
@@ -31,25 +52,361 @@ class Bike(BaseModel):
     brand = models.CharField(max_length=60, null=True)
     rent_price = models.IntegerField(default=0)
 
+    objects = BikeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='bike_created_id_idx'),
+            models.Index(fields=['owner', 'created_at', 'id'], name='bike_owner_created_idx'),
+            models.Index(fields=['rented', 'created_at', 'id'], name='bike_rented_created_idx'),
+            models.Index(fields=['brand', 'created_at', 'id'], name='bike_brand_created_idx'),
+            models.Index(fields=['rent_price'], name='bike_rent_price_idx'),
+        ]
+
     def __str__(self):
         return f'{self.id}.{self.brand} owned by {self.owner}'
 
+class InsufficientFunds(Exception):
+    """ Raised when a wallet cannot cover a debit """
+
+class WalletQuerySet(models.QuerySet):
+    """
+    QuerySet for Wallet with ledger-aware helpers.
+    """
+
+    def with_current_balance(self):
+        """
+        Annotates current_balance: the snapshot balance plus the entries not
+        folded into it yet, computed in the same query.
+        """
+        tail = WalletEntry.objects.filter(
+            wallet=models.OuterRef('pk'), folded=False
+        ).values('wallet').annotate(total=models.Sum('amount')).values('total')
+        return self.annotate(
+            current_balance=models.F('balance') + Coalesce(models.Subquery(tail), 0)
+        )
+
+    def with_available_balance(self):
+        """
+        Annotates current_balance, held (the sum of active holds) and
+        available = current_balance - held, all in the same query.
+        """
+        held = WalletHold.objects.filter(
+            wallet=models.OuterRef('pk'), status=WalletHold.Status.HELD
+        ).values('wallet').annotate(total=models.Sum('amount')).values('total')
+        return self.with_current_balance().annotate(
+            held=Coalesce(models.Subquery(held), 0)
+        ).annotate(
+            available_balance=models.F('current_balance') - models.F('held')
+        )
+
+    def for_user(self, user_id):
+        """
+        Returns the wallet of a user, creating an empty one if there is none.
+
+        A user's oldest wallet is the one used for rentals and top-ups.
+        """
+        wallet = self.filter(user_id=user_id).order_by('created_at').first()
+        if wallet is None:
+            wallet = self.create(user_id=user_id)
+        return wallet
+
 class Wallet(BaseModel):
     """
     Model that handles creation of each User's wallet.
 
+    Money moves through append-only WalletEntry rows. Credits only insert
+    an entry and never touch the wallet row, so concurrent top-ups of a hot
+    wallet do not queue on its row lock. balance is a snapshot: the total
+    of the entries folded into it by take_snapshot(), so the current
+    balance is balance plus the short tail of unfolded entries.
+
     Fields:
     - user: User associated with the wallet.
-    - balance: Current balance in the wallet.
-    - last_top_up: Date and time of the last wallet top-up.
+    - balance: Balance as of the last snapshot.
+    - last_top_up: Date and time of the last wallet top-up folded into balance.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     balance = models.IntegerField(default=0)
     last_top_up = models.DateTimeField(default=timezone.now)
 
+    objects = WalletQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.id}.{self.user}\'s Wallet'
 
+    def get_balance(self):
+        """
+        Returns:
+        - Current balance, snapshot plus unfolded entries, read in one query.
+        """
+        return Wallet.objects.with_current_balance().values_list('current_balance', flat=True).get(pk=self.pk)
+
+    def credit(self, amount, kind=None, reference=''):
+        """
+        Add money to the wallet.
+
+        Parameters:
+        - amount: Positive amount to add.
+        - kind: WalletEntry.Kind of the entry, TOP_UP by default.
+        - reference: Free form reference, e.g. a payment id.
+
+        Returns:
+        - WalletEntry instance.
+        """
+        if amount <= 0:
+            raise ValueError("Credit amount must be positive")
+        return WalletEntry.objects.create(
+            wallet=self, amount=amount, kind=kind or WalletEntry.Kind.TOP_UP, reference=reference
+        )
+
+    def get_available_balance(self):
+        """
+        Returns:
+        - Current balance minus active holds, read in one query.
+        """
+        return Wallet.objects.with_available_balance().values_list('available_balance', flat=True).get(pk=self.pk)
+
+    def hold(self, amount, reference='', expires_in=None):
+        """
+        Reserve money for a rental that has not been charged yet.
+
+        Like debit() this locks the wallet row only for one balance read and
+        one INSERT; the hold itself is a row that is later captured,
+        released or expired without locking the wallet again.
+
+        Parameters:
+        - amount: Positive amount to reserve.
+        - reference: Free form reference, e.g. a Bike id.
+        - expires_in: timedelta after which the sweeper frees the hold,
+          WALLET_HOLD_TTL by default.
+
+        Returns:
+        - WalletHold instance.
+
+        Raises:
+        - InsufficientFunds: If the available balance is lower than amount.
+        """
+        if amount <= 0:
+            raise ValueError("Hold amount must be positive")
+        expires_in = expires_in or settings.WALLET_HOLD_TTL
+        with transaction.atomic():
+            Wallet.objects.select_for_update().filter(pk=self.pk).values_list('pk').get()
+            if self.get_available_balance() < amount:
+                raise InsufficientFunds(f"Wallet {self.pk} cannot reserve {amount}")
+            return WalletHold.objects.create(
+                wallet=self, amount=amount, reference=reference, expires_at=timezone.now() + expires_in
+            )
+
+    def debit(self, amount, kind=None, reference=''):
+        """
+        Take money out of the wallet.
+
+        Debits lock the wallet row for the length of one balance read and
+        one INSERT so two debits cannot both spend the same money. Credits
+        committed meanwhile are simply not counted yet.
+
+        Parameters:
+        - amount: Positive amount to take.
+        - kind: WalletEntry.Kind of the entry, DEBIT by default.
+        - reference: Free form reference, e.g. a History id.
+
+        Returns:
+        - WalletEntry instance.
+
+        Raises:
+        - InsufficientFunds: If the available balance is lower than amount.
+        """
+        if amount <= 0:
+            raise ValueError("Debit amount must be positive")
+        with transaction.atomic():
+            Wallet.objects.select_for_update().filter(pk=self.pk).values_list('pk').get()
+            if self.get_available_balance() < amount:
+                raise InsufficientFunds(f"Wallet {self.pk} cannot cover {amount}")
+            return WalletEntry.objects.create(
+                wallet=self, amount=-amount, kind=kind or WalletEntry.Kind.DEBIT, reference=reference
+            )
+
+    def take_snapshot(self):
+        """
+        Fold the unfolded entries into balance and record a WalletSnapshot.
+
+        Entries are claimed with SELECT ... FOR UPDATE, so entries committed
+        while the snapshot runs are left for the next one, and balance is
+        moved with an F() expression rather than a read-modify-write.
+
+        Returns:
+        - WalletSnapshot instance, or None if there was nothing to fold.
+        """
+        with transaction.atomic():
+            Wallet.objects.select_for_update().filter(pk=self.pk).values_list('pk').get()
+            entries = list(
+                WalletEntry.objects.select_for_update()
+                .filter(wallet=self, folded=False)
+                .values_list('pk', 'amount', 'kind', 'created_at')
+            )
+            if not entries:
+                return None
+            total = sum(amount for _, amount, _, _ in entries)
+            top_ups = [created_at for _, _, kind, created_at in entries if kind == WalletEntry.Kind.TOP_UP]
+
+            WalletEntry.objects.filter(pk__in=[pk for pk, _, _, _ in entries]).update(folded=True)
+            changes = {'balance': models.F('balance') + total, 'updated_at': timezone.now()}
+            if top_ups:
+                changes['last_top_up'] = max(top_ups)
+            Wallet.objects.filter(pk=self.pk).update(**changes)
+            self.refresh_from_db(fields=['balance', 'last_top_up', 'updated_at'])
+            return WalletSnapshot.objects.create(wallet=self, balance=self.balance, entries=len(entries))
+
+class WalletEntry(BaseModel):
+    """
+    Model for the append-only ledger of a Wallet.
+
+    Fields:
+    - wallet: Wallet the entry belongs to.
+    - amount: Signed amount, positive for credits and negative for debits.
+    - kind: Type of the entry.
+    - reference: Free form reference to what caused the entry.
+    - folded: Whether the entry is included in Wallet.balance.
+    """
+
+    class Kind(models.TextChoices):
+        OPENING = 'Opening'
+        TOP_UP = 'Top Up'
+        DEBIT = 'Debit'
+        REFUND = 'Refund'
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="entries")
+    amount = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    reference = models.CharField(max_length=100, blank=True)
+    folded = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'folded'], name='wallet_entry_tail_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of {self.amount} on {self.wallet_id}"
+
+class WalletSnapshot(BaseModel):
+    """
+    Model recording the balance of a Wallet each time entries are folded.
+
+    Fields:
+    - wallet: Wallet the snapshot belongs to.
+    - balance: Wallet.balance right after the snapshot.
+    - entries: Number of entries folded by the snapshot.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="snapshots")
+    balance = models.IntegerField()
+    entries = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'created_at'], name='wallet_snapshot_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} at {self.balance}"
+
+class WalletHold(BaseModel):
+    """
+    Model for money reserved on a Wallet while a rental is running.
+
+    Fields:
+    - wallet: Wallet the money is reserved on.
+    - amount: Reserved amount.
+    - status: Held until it is captured, released or expired.
+    - reference: Free form reference to what the hold is for.
+    - expires_at: Time after which the sweeper expires the hold.
+    """
+
+    class Status(models.TextChoices):
+        HELD = 'Held'
+        CAPTURED = 'Captured'
+        RELEASED = 'Released'
+        EXPIRED = 'Expired'
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="holds")
+    amount = models.IntegerField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.HELD)
+    reference = models.CharField(max_length=100, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'status'], name='wallet_hold_active_idx'),
+            models.Index(fields=['status', 'expires_at'], name='wallet_hold_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} hold of {self.amount} on {self.wallet_id}"
+
+    def capture(self, reference=''):
+        """
+        Charge the held amount.
+
+        Expired holds can still be captured: the rental took place, only the
+        reservation lapsed, so the debit is posted even if it overdraws.
+
+        Parameters:
+        - reference: Reference of the debit entry.
+
+        Returns:
+        - WalletEntry instance, or None if the hold was already settled.
+        """
+        with transaction.atomic():
+            settled = WalletHold.objects.filter(
+                pk=self.pk, status__in=[self.Status.HELD, self.Status.EXPIRED]
+            ).update(status=self.Status.CAPTURED, updated_at=timezone.now())
+            if not settled:
+                return None
+            self.status = self.Status.CAPTURED
+            return WalletEntry.objects.create(
+                wallet_id=self.wallet_id, amount=-self.amount, kind=WalletEntry.Kind.DEBIT,
+                reference=reference or self.reference,
+            )
+
+    def release(self):
+        """
+        Free the held amount without charging it.
+
+        Returns:
+        - True if the hold was active and is now released.
+        """
+        released = WalletHold.objects.filter(pk=self.pk, status=self.Status.HELD).update(
+            status=self.Status.RELEASED, updated_at=timezone.now()
+        )
+        if released:
+            self.status = self.Status.RELEASED
+        return bool(released)
+
+    @classmethod
+    def expire_stale(cls, batch_size=500):
+        """
+        Expire holds past their expires_at in small batches.
+
+        Parameters:
+        - batch_size: Number of holds expired per UPDATE.
+
+        Returns:
+        - Number of expired holds.
+        """
+        expired = 0
+        now = timezone.now()
+        while True:
+            ids = list(
+                cls.objects.filter(status=cls.Status.HELD, expires_at__lt=now)
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return expired
+            expired += cls.objects.filter(pk__in=ids, status=cls.Status.HELD).update(
+                status=cls.Status.EXPIRED, updated_at=now
+            )
+
 class History(BaseModel):
     """
     Model that handles creation of rental history.
@@ -63,6 +420,9 @@ class History(BaseModel):
     - rental_end_time: End time of the rental.
     - rental_status: Type of rental event (Bike Rented, Bike Returned, Renter Rental, Rentee Rental).
     """
+    # Time of the event rather than of the INSERT, so rows written later by
+    # the event buffer or a spool replay keep the time they were recorded.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     bike = models.ForeignKey(Bike, on_delete=models.CASCADE, null=True, blank=True)
     rentee = models.ForeignKey(Rentee, on_delete=models.CASCADE, null=True, blank=True, related_name="rentee_history")
     renter = models.ForeignKey(Renter, on_delete=models.CASCADE, null=True, blank=True, related_name="renter_history")
@@ -70,6 +430,13 @@ class History(BaseModel):
     rental_start_time = models.DateTimeField(null=True, blank=True)
     rental_end_time = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='history_created_id_idx'),
+            models.Index(fields=['renter', 'created_at', 'id'], name='history_renter_created_idx'),
+            models.Index(fields=['rentee', 'created_at', 'id'], name='history_rentee_created_idx'),
+        ]
+
     def __str__(self):
         return f"History {self.id}"
 
@@ -84,7 +451,29 @@ class History(BaseModel):
         choices=EventType.choices,
         default=EventType.BIKE_RENTED,
     )
-    
+
+    @classmethod
+    def _record(cls, **fields):
+        """
+        Writes a History event, through the event buffer when it is enabled.
+
+        Buffered events are only queued once the surrounding transaction
+        commits, so rolled back rentals leave no trace. Their created_at is
+        the time of this call and is kept when the buffer inserts them, at
+        most FLUSH_INTERVAL later (or on a later spool replay).
+
+        Returns:
+        - History instance, unsaved until flushed when buffering.
+        """
+        history = cls(**fields)
+        event_buffer = get_event_buffer()
+        if event_buffer is None:
+            history.save(force_insert=True)
+        else:
+            history.updated_at = history.created_at
+            transaction.on_commit(lambda: event_buffer.enqueue(history))
+        return history
+
     @classmethod
     def log_bike_rental(cls, bike, rentee, renter, amount_paid, logged_in_user):
         """ 
@@ -101,7 +490,7 @@ class History(BaseModel):
         - History instance for the logged rental event.
         """
         if logged_in_user.role == 'RENTEE':
-            history = cls.objects.create(
+            history = cls._record(
                 bike=bike,
                 rentee=rentee,
                 renter=renter,
@@ -123,7 +512,7 @@ class History(BaseModel):
         - History instance for the logged return event.
         """
         if logged_in_user.role == 'RENTEE':
-            history = cls.objects.create(
+            history = cls._record(
                 bike=bike,
                 rental_status=cls.EventType.BIKE_RETURNED,
             )
@@ -143,7 +532,7 @@ class History(BaseModel):
         - History instance for the logged rental event.
         """
         if logged_in_user.role == 'RENTER':
-            history = cls.objects.create(
+            history = cls._record(
                 renter=renter,
                 amount_paid=amount_paid,
                 rental_status=cls.EventType.RENTER_RENTAL,
@@ -164,13 +553,244 @@ class History(BaseModel):
         - History instance for the logged rental event.
         """
         if logged_in_user.role == 'RENTEE':
-            history = cls.objects.create(
+            history = cls._record(
                 rentee=rentee,
                 amount_paid=amount_paid,
                 rental_status=cls.EventType.RENTEE_RENTAL,
             )
             return history
 
+class RentalSession(BaseModel):
+    """
+    Model pairing the rented and returned events of one rental.
+
+    Fields:
+    - bike: Bike that was rented.
+    - rentee: Rentee who rented the bike.
+    - renter: Renter who owns the bike.
+    - started_at: Time the rental started.
+    - ended_at: Time the bike was returned, null while the rental is active.
+    - duration: Length of the rental, set when it ends.
+    - amount: Amount charged for the rental.
+    - start_event: Id of the BIKE_RENTED History row that opened the session.
+    - end_event: Id of the BIKE_RETURNED History row that closed it.
+    - hold: WalletHold reserving the amount, captured when the rental ends.
+
+    The History ids are plain values rather than foreign keys so sessions
+    survive History archival and can point at events still being buffered.
+    """
+    bike = models.ForeignKey(Bike, on_delete=models.CASCADE, related_name="rental_sessions")
+    rentee = models.ForeignKey(Rentee, on_delete=models.CASCADE, null=True, blank=True, related_name="rental_sessions")
+    renter = models.ForeignKey(Renter, on_delete=models.CASCADE, null=True, blank=True, related_name="rental_sessions")
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+    amount = models.IntegerField(default=0)
+    start_event = models.UUIDField(unique=True, null=True, blank=True)
+    end_event = models.UUIDField(null=True, blank=True)
+    hold = models.ForeignKey(WalletHold, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bike', 'ended_at'], name='session_bike_open_idx'),
+            models.Index(fields=['rentee', 'ended_at'], name='session_rentee_open_idx'),
+            models.Index(fields=['renter', 'started_at'], name='session_renter_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"Rental of {self.bike_id} from {self.started_at}"
+
+    @classmethod
+    def start(cls, bike, rentee, renter, amount, history=None, hold=None):
+        """
+        Open a rental session.
+
+        Parameters:
+        - bike: Bike instance.
+        - rentee: Rentee instance.
+        - renter: Renter instance.
+        - amount: Amount charged for the rental.
+        - history: BIKE_RENTED History instance that opened the rental.
+        - hold: WalletHold reserving the amount.
+
+        Returns:
+        - RentalSession instance.
+        """
+        return cls.objects.create(
+            bike=bike,
+            rentee=rentee,
+            renter=renter,
+            amount=amount,
+            started_at=timezone.now(),
+            start_event=history.pk if history is not None else None,
+            hold=hold,
+        )
+
+    @classmethod
+    def end(cls, bike, history=None):
+        """
+        Close the active session of a bike and capture its wallet hold.
+
+        Parameters:
+        - bike: Bike instance.
+        - history: BIKE_RETURNED History instance that closed the rental.
+
+        Returns:
+        - The closed RentalSession instance, or None if none was active.
+        """
+        session = cls.objects.filter(bike=bike, ended_at__isnull=True).order_by('-started_at').first()
+        if session is None:
+            return None
+        session.ended_at = timezone.now()
+        session.duration = session.ended_at - session.started_at
+        session.end_event = history.pk if history is not None else None
+        session.save(update_fields=['ended_at', 'duration', 'end_event', 'updated_at'])
+        if session.hold is not None:
+            session.hold.capture(reference=str(session.pk))
+        return session
+
+    @classmethod
+    def cancel(cls, bike):
+        """
+        Close the active session of a bike without charging it, releasing
+        its wallet hold and freeing the bike.
+
+        Parameters:
+        - bike: Bike instance.
+
+        Returns:
+        - The cancelled RentalSession instance, or None if none was active.
+        """
+        with transaction.atomic():
+            session = (
+                cls.objects.select_for_update()
+                .filter(bike=bike, ended_at__isnull=True).order_by('-started_at').first()
+            )
+            if session is None:
+                return None
+            session.ended_at = timezone.now()
+            session.duration = session.ended_at - session.started_at
+            session.save(update_fields=['ended_at', 'duration', 'updated_at'])
+            Bike.objects.filter(pk=bike.pk, rented=True).update(rented=False, updated_at=timezone.now())
+            if session.rentee_id is not None:
+                bike.rented_by.remove(session.rentee_id)
+            if session.hold is not None:
+                session.hold.release()
+        bike.rented = False
+        return session
+
+class RenterDailyRollup(BaseModel):
+    """
+    Model holding the daily History totals of a renter per rental_status.
+
+    Fields:
+    - day: Day the events were logged (UTC).
+    - renter: Renter the events belong to.
+    - rental_status: Type of the rolled up events.
+    - events: Number of events.
+    - amount: Sum of amount_paid.
+    """
+    day = models.DateField()
+    renter = models.ForeignKey(Renter, on_delete=models.CASCADE, related_name="daily_rollups")
+    rental_status = models.CharField(max_length=20, choices=History.EventType.choices)
+    events = models.IntegerField(default=0)
+    amount = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['renter', 'day', 'rental_status'], name='unique_renter_daily_rollup'),
+        ]
+
+class BikeDailyRollup(BaseModel):
+    """
+    Model holding the daily History totals of a bike per rental_status.
+
+    Fields:
+    - day: Day the events were logged (UTC).
+    - bike: Bike the events belong to.
+    - rental_status: Type of the rolled up events.
+    - events: Number of events, e.g. rentals for BIKE_RENTED.
+    - amount: Sum of amount_paid.
+    """
+    day = models.DateField()
+    bike = models.ForeignKey(Bike, on_delete=models.CASCADE, related_name="daily_rollups")
+    rental_status = models.CharField(max_length=20, choices=History.EventType.choices)
+    events = models.IntegerField(default=0)
+    amount = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bike', 'day', 'rental_status'], name='unique_bike_daily_rollup'),
+        ]
+
+class StatusDailyRollup(BaseModel):
+    """
+    Model holding the daily History totals per rental_status.
+
+    Fields:
+    - day: Day the events were logged (UTC).
+    - rental_status: Type of the rolled up events.
+    - events: Number of events.
+    - amount: Sum of amount_paid.
+    """
+    day = models.DateField()
+    rental_status = models.CharField(max_length=20, choices=History.EventType.choices)
+    events = models.IntegerField(default=0)
+    amount = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'rental_status'], name='unique_status_daily_rollup'),
+        ]
+
+class RollupWatermark(BaseModel):
+    """
+    Model recording how far the History rollups have been computed.
+
+    Fields:
+    - name: Name of the rollup job.
+    - last_created_at: created_at of the last rolled up History row.
+    - last_history_id: id of the last rolled up History row.
+    """
+    name = models.CharField(max_length=60, unique=True)
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_history_id = models.UUIDField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} rolled up to {self.last_created_at}"
+
+class IdempotencyRecord(BaseModel):
+    """
+    Model storing the response of a request sent with an Idempotency-Key.
+
+    Fields:
+    - scope: Who sent the key, "user:<id>", or "anonymous:<fingerprint>"
+      for unauthenticated requests.
+    - key: Client supplied Idempotency-Key header.
+    - fingerprint: Hash of the method, path and body of the request.
+    - status_code: Response status, null while the request is in flight.
+    - response_body: JSON encoded response data.
+    - expires_at: Time after which the key may be reused, a short lease
+      while the request is in flight.
+    """
+    scope = models.CharField(max_length=60)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.IntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
 class Notification(BaseModel):
     """
     Model for handling user notifications.
@@ -184,6 +804,12 @@ class Notification(BaseModel):
     content = models.TextField()
     read_status = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'read_status', 'created_at'], name='notification_unread_idx'),
+            models.Index(fields=['user', 'created_at'], name='notification_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Notification {self.id} - User: {self.user.username}, Content: {self.content}"
 
@@ -199,9 +825,48 @@ class Notification(BaseModel):
         Returns:
         - Notification instance.
         """
-        notification = cls.objects.create(user=user, content=content)
+        with transaction.atomic():
+            notification = cls.objects.create(user=user, content=content)
+            NotificationCounter.add([notification.user_id], 1)
+            transaction.on_commit(lambda: get_notification_hub().publish([notification_payload(notification)]))
         return notification
 
+    @classmethod
+    def broadcast(cls, content, role=None, institution=None, chunk_size=1000):
+        """
+        Send the same notification to many users.
+
+        Recipients are read in primary key chunks and each chunk is written
+        with one bulk INSERT, so memory and statement size stay bounded no
+        matter how many users are targeted. Each chunk is published to the
+        notification streams once committed.
+
+        Parameters:
+        - content: Content of the notification.
+        - role: Only notify active users with this User.Role.
+        - institution: Only notify renters of this institution.
+        - chunk_size: Number of recipients read and inserted per query.
+
+        Returns:
+        - Number of notifications created.
+        """
+        recipients = User.objects.filter(is_active=True)
+        if role is not None:
+            recipients = recipients.filter(role=role)
+        if institution is not None:
+            recipients = recipients.filter(renter__institution=institution)
+
+        sent = 0
+        for chunk in iterate_in_chunks(recipients.values('id'), ordering=('id',), chunk_size=chunk_size):
+            user_ids = [user['id'] for user in chunk]
+            with transaction.atomic():
+                notifications = cls.objects.bulk_create([cls(user_id=user_id, content=content) for user_id in user_ids])
+                NotificationCounter.add(user_ids, 1)
+                payloads = [notification_payload(notification) for notification in notifications]
+                transaction.on_commit(lambda payloads=payloads: get_notification_hub().publish(payloads))
+            sent += len(chunk)
+        return sent
+
     @classmethod
     def mark_as_read(cls, notification_id):
         """ 
@@ -210,6 +875,97 @@ class Notification(BaseModel):
         Parameters:
         - notification_id: ID of the notification to mark as read.
         """
-        notification = cls.objects.get(id=notification_id)
-        notification.read_status = True
-        notification.save()
+        user_id = cls.objects.filter(id=notification_id).values_list('user_id', flat=True).get()
+        cls.mark_many_as_read(user_id, ids=[notification_id])
+
+    @classmethod
+    def mark_many_as_read(cls, user_id, ids=None, before=None):
+        """
+        Mark a user's notifications as read with a single UPDATE.
+
+        Parameters:
+        - user_id: ID of the user whose notifications are marked.
+        - ids: Only mark these notification IDs.
+        - before: Only mark notifications created before this datetime.
+          With neither ids nor before every notification is marked.
+
+        Returns:
+        - Number of notifications that were unread.
+        """
+        notifications = cls.objects.filter(user_id=user_id, read_status=False)
+        if ids is not None:
+            notifications = notifications.filter(id__in=ids)
+        if before is not None:
+            notifications = notifications.filter(created_at__lt=before)
+        with transaction.atomic():
+            marked = notifications.update(read_status=True, updated_at=timezone.now())
+            if marked:
+                NotificationCounter.add([user_id], -marked)
+        return marked
+
+class NotificationCounter(BaseModel):
+    """
+    Model caching the number of unread notifications of a user.
+
+    Counters are created lazily from a real count the first time they are
+    read, and from then on moved with F() updates in the same transaction
+    as the notifications they count, so the badge count is a unique index
+    lookup instead of a COUNT over the user's notifications.
+
+    Fields:
+    - user: User the counter belongs to.
+    - unread: Number of unread notifications.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="notification_counter")
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+    @classmethod
+    def add(cls, user_ids, delta):
+        """
+        Move the counters of users that already have one.
+
+        Users without a counter are skipped, get_unread() counts them.
+
+        Parameters:
+        - user_ids: IDs of the users.
+        - delta: Amount to add, negative to subtract.
+        """
+        cls.objects.filter(user_id__in=user_ids).update(
+            unread=Greatest(models.F('unread') + delta, 0), updated_at=timezone.now()
+        )
+
+    @classmethod
+    def get_unread(cls, user_id):
+        """
+        Return the unread count of a user, creating the counter if needed.
+
+        Parameters:
+        - user_id: ID of the user.
+
+        Returns:
+        - Number of unread notifications.
+        """
+        unread = cls.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+        if unread is not None:
+            return unread
+        return cls.recount(user_id)
+
+    @classmethod
+    def recount(cls, user_id):
+        """
+        Reset a counter from the notifications table.
+
+        Parameters:
+        - user_id: ID of the user.
+
+        Returns:
+        - Number of unread notifications.
+        """
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(user_id=user_id)], ignore_conflicts=True)
+            unread = Notification.objects.filter(user_id=user_id, read_status=False).count()
+            cls.objects.filter(user_id=user_id).update(unread=unread, updated_at=timezone.now())
+        return unread
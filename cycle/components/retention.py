@@ -0,0 +1,136 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from common.conf import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    'SLEEP': 0.2,
+    'EXPIRED_TOKENS': timedelta(days=1),
+    'EXPIRED_SESSIONS': timedelta(0),
+    'READ_NOTIFICATIONS': timedelta(days=90),
+    'EXPIRED_IDEMPOTENCY_KEYS': timedelta(0),
+}
+
+
+class RetentionPolicy:
+    """
+    Rows of one model that may be deleted.
+
+    Attributes:
+    - name: Name used to select the policy from the command line.
+    - model_label: "app_label.ModelName" of the model.
+    - age_setting: RETENTION key holding how long past expiry rows are kept.
+    - build_filter: Callable (cutoff) -> filter kwargs of the deletable rows.
+    """
+
+    def __init__(self, name, model_label, age_setting, build_filter):
+        self.name = name
+        self.model_label = model_label
+        self.age_setting = age_setting
+        self.build_filter = build_filter
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def get_queryset(self, config, now):
+        return self.model.objects.filter(**self.build_filter(now - config[self.age_setting]))
+
+
+# Blacklisted tokens go before the outstanding tokens they point to, so
+# deleting the latter never cascades.
+POLICIES = (
+    RetentionPolicy(
+        'blacklisted_tokens', 'token_blacklist.BlacklistedToken', 'EXPIRED_TOKENS',
+        lambda cutoff: {'token__expires_at__lt': cutoff},
+    ),
+    RetentionPolicy(
+        'outstanding_tokens', 'token_blacklist.OutstandingToken', 'EXPIRED_TOKENS',
+        lambda cutoff: {'expires_at__lt': cutoff},
+    ),
+    RetentionPolicy(
+        'sessions', 'sessions.Session', 'EXPIRED_SESSIONS',
+        lambda cutoff: {'expire_date__lt': cutoff},
+    ),
+    RetentionPolicy(
+        'read_notifications', 'components.Notification', 'READ_NOTIFICATIONS',
+        lambda cutoff: {'read_status': True, 'updated_at__lt': cutoff},
+    ),
+    RetentionPolicy(
+        'idempotency_records', 'components.IdempotencyRecord', 'EXPIRED_IDEMPOTENCY_KEYS',
+        lambda cutoff: {'expires_at__lt': cutoff},
+    ),
+)
+
+
+def get_config():
+    return get_settings('RETENTION', DEFAULTS)
+
+
+def apply_policy(policy, batch_size=None, sleep=None, max_batches=None):
+    """
+    Deletes the expired rows of one policy in small primary key batches.
+
+    Each batch selects the next batch_size matching primary keys past the
+    previous batch and deletes exactly those in its own short transaction,
+    so no statement locks more than batch_size rows or builds a large undo
+    log, and the scan never revisits rows it already passed. Sleeping
+    between batches leaves the database room for regular traffic.
+
+    Parameters:
+    - policy: RetentionPolicy to apply.
+    - batch_size: Rows per DELETE, defaults to RETENTION BATCH_SIZE.
+    - sleep: Seconds to pause between batches, defaults to RETENTION SLEEP.
+    - max_batches: Stop after this many batches, None for no limit.
+
+    Returns:
+    - Number of deleted rows.
+    """
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    sleep = config['SLEEP'] if sleep is None else sleep
+    expired = policy.get_queryset(config, timezone.now()).order_by('pk')
+
+    deleted = batches = 0
+    last_pk = None
+    while max_batches is None or batches < max_batches:
+        page = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        with transaction.atomic():
+            deleted += expired.filter(pk__in=pks).delete()[1].get(policy.model._meta.label, 0)
+        batches += 1
+        last_pk = pks[-1]
+        if len(pks) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+    logger.info('Retention policy %s deleted %d rows', policy.name, deleted)
+    return deleted
+
+
+def apply_retention(names=None, batch_size=None, sleep=None, max_batches=None):
+    """
+    Applies the retention policies in order.
+
+    Parameters:
+    - names: Names of the policies to apply, None for all of them.
+    - batch_size, sleep, max_batches: See apply_policy().
+
+    Returns:
+    - Dict of policy name to number of deleted rows.
+    """
+    return {
+        policy.name: apply_policy(policy, batch_size=batch_size, sleep=sleep, max_batches=max_batches)
+        for policy in POLICIES
+        if names is None or policy.name in names
+    }
@@ -0,0 +1,184 @@
+import os
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from common.pagination import build_seek_filter, get_fields, iterate_in_chunks
+from .archive import get_archive_dir, iter_archived_history, lock_archive, row_key
+from .models import BikeDailyRollup, History, RenterDailyRollup, RollupWatermark, StatusDailyRollup
+
+WATERMARK_NAME = 'history-daily'
+ORDERING = ('created_at', 'id')
+
+# (rollup model, History values() key holding the grouping object or None)
+ROLLUPS = (
+    (RenterDailyRollup, 'renter'),
+    (BikeDailyRollup, 'bike'),
+    (StatusDailyRollup, None),
+)
+
+
+def update_rollups(chunk_size=5000, lag=timedelta(minutes=1)):
+    """
+    Folds History rows written since the last run into the daily rollups.
+
+    Rows are consumed in (created_at, id) order past the watermark, one
+    chunk per transaction, and the watermark moves in the same transaction
+    as the totals it covers, so a rerun after a crash neither skips nor
+    double counts a row. Rows younger than lag are left for the next run
+    because transactions still in flight may commit rows behind them.
+
+    created_at is assigned before commit, so a row committed more than lag
+    after its created_at (a long transaction, or an event buffer flush or
+    spool replay, see components.eventlog) lands behind the watermark and
+    is never folded. Pick lag above the longest expected delay and repair
+    the affected days with rebuild_rollups().
+
+    Parameters:
+    - chunk_size: Number of History rows folded per transaction.
+    - lag: Minimum age of the rows to fold.
+
+    Returns:
+    - Number of History rows folded.
+    """
+    horizon = timezone.now() - lag
+    folded = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+            rows = History.objects.filter(created_at__lt=horizon)
+            if watermark.last_created_at is not None:
+                position = [watermark.last_created_at, watermark.last_history_id]
+                rows = rows.filter(build_seek_filter(get_fields(ORDERING), position))
+            rows = list(
+                rows.order_by(*ORDERING)
+                .values('id', 'created_at', 'renter', 'bike', 'rental_status', 'amount_paid')[:chunk_size]
+            )
+            if not rows:
+                return folded
+
+            for model, key in ROLLUPS:
+                apply_totals(model, key, rows)
+            watermark.last_created_at = rows[-1]['created_at']
+            watermark.last_history_id = rows[-1]['id']
+            watermark.save(update_fields=['last_created_at', 'last_history_id', 'updated_at'])
+        folded += len(rows)
+
+
+def rebuild_rollups(start, end, chunk_size=5000, archive_dir=None):
+    """
+    Recomputes the rollups of a range of days from History.
+
+    The rollups of the days are deleted and refolded from every History
+    row of those days up to the watermark, which picks up rows that
+    committed too late for update_rollups(). Rows past the watermark are
+    left to update_rollups() so nothing is counted twice. Runs in one
+    transaction holding the watermark lock, so incremental runs wait for it.
+
+    Days moved out of the table by archive_history() are refolded from the
+    archive segments. Rows of a segment whose deletion was interrupted are
+    in both places and count once. The archive lock is held throughout so
+    no rows move between the two reads.
+
+    Parameters:
+    - start: First day to rebuild.
+    - end: Last day to rebuild, inclusive.
+    - chunk_size: Number of History rows read per query.
+    - archive_dir: Archive directory, defaults to HISTORY_ARCHIVE_DIR.
+
+    Returns:
+    - Number of History rows folded.
+
+    Raises:
+    - ArchiveLocked: If archive_history() is running.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    lower = timezone.make_aware(datetime.combine(start, time.min))
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    folded = 0
+    with lock_archive(archive_dir) if os.path.isdir(archive_dir) else nullcontext(), transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+        for model, _ in ROLLUPS:
+            model.objects.filter(day__gte=start, day__lte=end).delete()
+        if watermark.last_created_at is None:
+            return folded
+
+        position = (watermark.last_created_at, watermark.last_history_id)
+        rows = History.objects.filter(created_at__gte=lower, created_at__lt=upper)
+        rows = rows.exclude(build_seek_filter(get_fields(ORDERING), position))
+        rows = rows.values('id', 'created_at', 'renter', 'bike', 'rental_status', 'amount_paid')
+        for chunk in iterate_in_chunks(rows, ordering=ORDERING, chunk_size=chunk_size):
+            for model, key in ROLLUPS:
+                apply_totals(model, key, chunk)
+            folded += len(chunk)
+
+        archived = iter_archived_history(lower, upper, archive_dir=archive_dir)
+        while True:
+            chunk = list(islice(archived, chunk_size))
+            if not chunk:
+                break
+            chunk = [row for row in chunk if row_key(row) <= position]
+            hot = set(History.objects.filter(pk__in=[row['id'] for row in chunk]).values_list('pk', flat=True))
+            chunk = [row for row in chunk if row['id'] not in hot]
+            for model, key in ROLLUPS:
+                apply_totals(model, key, chunk)
+            folded += len(chunk)
+    return folded
+
+
+def apply_totals(model, key, rows):
+    """
+    Adds the totals of a chunk of History rows to one rollup table.
+
+    Must run while holding the watermark lock, which makes this the only
+    writer of the rollups and the read-modify-write below safe.
+
+    Parameters:
+    - model: Rollup model to update.
+    - key: History values() key of the grouping object, None for per status.
+    - rows: History values() dicts.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for row in rows:
+        if key is not None and row[key] is None:
+            continue
+        group = (
+            timezone.localtime(row['created_at']).date(),
+            row['rental_status'],
+            row[key] if key is not None else None,
+        )
+        totals[group][0] += 1
+        totals[group][1] += row['amount_paid']
+    if not totals:
+        return
+
+    lookup = {
+        'day__in': {day for day, _, _ in totals},
+        'rental_status__in': {rental_status for _, rental_status, _ in totals},
+    }
+    if key is not None:
+        lookup[f'{key}_id__in'] = {group_id for _, _, group_id in totals}
+    existing = {
+        (rollup.day, rollup.rental_status, getattr(rollup, f'{key}_id') if key is not None else None): rollup
+        for rollup in model.objects.filter(**lookup)
+    }
+
+    now = timezone.now()
+    changed, created = [], []
+    for group, (events, amount) in totals.items():
+        rollup = existing.get(group)
+        if rollup is None:
+            day, rental_status, group_id = group
+            fields = {f'{key}_id': group_id} if key is not None else {}
+            created.append(model(day=day, rental_status=rental_status, events=events, amount=amount, **fields))
+        else:
+            rollup.events += events
+            rollup.amount += amount
+            rollup.updated_at = now
+            changed.append(rollup)
+    model.objects.bulk_create(created)
+    model.objects.bulk_update(changed, ['events', 'amount', 'updated_at'])
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Bike, History, Wallet, Notification
+from .models import (
+    Bike, History, Wallet, Notification, RenterDailyRollup, BikeDailyRollup, StatusDailyRollup,
+)
 
 class BikeSerializer(serializers.ModelSerializer):
     """ Serializes all Bike objects into JSON format """
@@ -7,17 +9,91 @@ class BikeSerializer(serializers.ModelSerializer):
         model = Bike
         fields = '__all__'
 
+class BikeListSerializer(serializers.ModelSerializer):
+    """
+    Read-only Bike serializer for listings.
+
+    rented_by is rendered as a list of Rentee ids read from the prefetch
+    cache, so it must be paired with Bike.objects.for_listing() to serialize
+    a whole page in a constant number of queries.
+    """
+    rented_by = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Bike
+        fields = '__all__'
+
 class HistorySerializer(serializers.ModelSerializer):
     """ Serializes all History Objescts to JSON format """
     class Meta:
         model = History
         fields = '__all__'
 
+class HistoryBatchItemSerializer(serializers.ModelSerializer):
+    """
+    Validates one History payload of a batch upload.
+
+    Related objects are taken as raw primary keys so that a batch can be
+    checked for missing references with one query per model instead of one
+    lookup per row, see HistoryCreateView.
+    """
+    bike = serializers.UUIDField(source='bike_id', required=False, allow_null=True)
+    rentee = serializers.IntegerField(source='rentee_id', required=False, allow_null=True)
+    renter = serializers.IntegerField(source='renter_id', required=False, allow_null=True)
+
+    class Meta:
+        model = History
+        fields = '__all__'
+
+class RenterDailyRollupSerializer(serializers.ModelSerializer):
+    """ Serializes the daily renter totals into JSON format """
+    class Meta:
+        model = RenterDailyRollup
+        fields = ['day', 'renter', 'rental_status', 'events', 'amount']
+
+class BikeDailyRollupSerializer(serializers.ModelSerializer):
+    """ Serializes the daily bike totals into JSON format """
+    class Meta:
+        model = BikeDailyRollup
+        fields = ['day', 'bike', 'rental_status', 'events', 'amount']
+
+class StatusDailyRollupSerializer(serializers.ModelSerializer):
+    """ Serializes the daily rental_status totals into JSON format """
+    class Meta:
+        model = StatusDailyRollup
+        fields = ['day', 'rental_status', 'events', 'amount']
+
 class WalletSerializer(serializers.ModelSerializer):
-    """ Serializes all Wallet objects into JSON format """
+    """
+    Serializes all Wallet objects into JSON format.
+
+    balance is only the balance at the last snapshot and is moved by the
+    ledger alone, so it is read-only; current_balance is the live balance
+    and available_balance what is left of it after active holds, read from
+    Wallet.objects.with_available_balance() when annotated.
+    """
+    current_balance = serializers.SerializerMethodField()
+    available_balance = serializers.SerializerMethodField()
+
     class Meta:
         model = Wallet
         fields = '__all__'
+        read_only_fields = ['balance', 'last_top_up']
+
+    def get_current_balance(self, wallet):
+        if hasattr(wallet, 'current_balance'):
+            return wallet.current_balance
+        return wallet.get_balance()
+
+    def get_available_balance(self, wallet):
+        if hasattr(wallet, 'available_balance'):
+            return wallet.available_balance
+        return wallet.get_available_balance()
+
+class WalletTopUpSerializer(serializers.Serializer):
+    """ Validates a wallet top-up """
+    amount = serializers.IntegerField(min_value=1)
+    reference = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
 
 class NotificationSerializer(serializers.ModelSerializer):
     """Serializes all Notification objects innto JSON format """
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from common.conf import LazyInstance, get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'POLL_INTERVAL': 5.0,
+    'POLL_OVERLAP': 5.0,
+    'HEARTBEAT': 15.0,
+    'MAX_AGE': 300.0,
+    'MAX_QUEUE': 100,
+    'RETRY': 3000,
+}
+
+# Notification columns pushed to the clients, keyed like NotificationSerializer
+FIELDS = ['id', 'created_at', 'updated_at', 'user', 'content', 'read_status']
+
+
+def notification_payload(notification):
+    """ Returns the pushed representation of a Notification instance """
+    return {
+        'id': notification.id,
+        'created_at': notification.created_at,
+        'updated_at': notification.updated_at,
+        'user': notification.user_id,
+        'content': notification.content,
+        'read_status': notification.read_status,
+    }
+
+
+class Subscription:
+    """
+    One stream's inbox on the hub.
+
+    Rows are handed over from any thread with call_soon_threadsafe onto the
+    stream's event loop. When the bounded queue overflows the subscription
+    is flagged so the stream resynchronizes from the database instead.
+    """
+
+    def __init__(self, user_id, max_queue):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def deliver(self, payload):
+        """ Queues a row, must run on the subscription's event loop """
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class NotificationHub:
+    """
+    In-process pub/sub of new notifications keyed by user.
+
+    Notification.create_notification() and broadcast() publish their rows
+    once committed, which reaches the streams of this process immediately.
+    Rows written by other processes are picked up by a single poller thread
+    that, every poll_interval seconds, reads the notifications created
+    since its previous pass (minus poll_overlap for transactions that
+    committed late) for the users subscribed here, so the polling cost is
+    one query per process rather than one per connection.
+
+    Attributes:
+    - poll_interval: Seconds between database polls, None disables polling.
+    - poll_overlap: Seconds each poll reaches back past the previous one.
+    - max_queue: Rows a subscription may hold before it must resynchronize.
+    """
+
+    def __init__(self, poll_interval=5.0, poll_overlap=5.0, max_queue=100):
+        self.poll_interval = poll_interval
+        self.poll_overlap = poll_overlap
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+        self.thread = None
+
+    @property
+    def model(self):
+        return apps.get_model('components.Notification')
+
+    def subscribe(self, user_id):
+        """ Registers a subscription for a user, must run inside an event loop """
+        subscription = Subscription(user_id, self.max_queue)
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+            if self.poll_interval and self.thread is None:
+                self.thread = threading.Thread(target=self.poll, name='notification-stream-poller', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, payloads):
+        """
+        Hands rows to the subscriptions of their users.
+
+        Parameters:
+        - payloads: Iterable of notification_payload() dicts.
+        """
+        for payload in payloads:
+            with self.lock:
+                subscriptions = list(self.subscriptions.get(payload['user'], ()))
+            for subscription in subscriptions:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, payload)
+                except RuntimeError:
+                    # The stream's loop is closed, it is about to unsubscribe
+                    pass
+
+    def poll(self):
+        """ Poller loop, publishes rows committed by other processes """
+        since = timezone.now()
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock:
+                user_ids = list(self.subscriptions)
+            started = timezone.now()
+            if not user_ids:
+                since = started
+                continue
+            close_old_connections()
+            try:
+                self.publish(self.fetch(user_ids, since - timedelta(seconds=self.poll_overlap)))
+                since = started
+            except Exception:
+                logger.exception('Could not poll for new notifications')
+                connection.close()
+
+    def fetch(self, user_ids, since, chunk_size=1000):
+        """
+        Reads the notifications of some users created since a time.
+
+        Returns:
+        - List of notification_payload() shaped dicts in (created_at, id) order.
+        """
+        rows = []
+        for start in range(0, len(user_ids), chunk_size):
+            rows.extend(
+                self.model.objects.filter(user_id__in=user_ids[start:start + chunk_size], created_at__gte=since)
+                .order_by('created_at', 'id')
+                .values(*FIELDS)
+            )
+        rows.sort(key=lambda row: (row['created_at'], row['id']))
+        return rows
+
+
+_hub = LazyInstance('NOTIFICATION_STREAM', DEFAULTS, lambda config: NotificationHub(
+    poll_interval=config['POLL_INTERVAL'],
+    poll_overlap=config['POLL_OVERLAP'],
+    max_queue=config['MAX_QUEUE'],
+))
+
+
+def get_config():
+    return get_settings('NOTIFICATION_STREAM', DEFAULTS)
+
+
+def get_notification_hub():
+    """ Returns the process-wide NotificationHub configured by NOTIFICATION_STREAM """
+    return _hub.get()
+
+
+def format_event(payload):
+    """ Encodes a row as a server-sent event carrying its id """
+    data = json.dumps(payload, cls=DjangoJSONEncoder)
+    return f"id: {payload['id']}\nevent: notification\ndata: {data}\n\n"
+
+
+async def stream_notifications(user_id, last_event_id=None):
+    """
+    Yields server-sent events for a user's new notifications.
+
+    Rows are taken from the hub as they are published. A reconnecting client
+    sending Last-Event-ID first gets what it missed from the database, and
+    so does a stream whose queue overflowed. Already sent ids are
+    remembered so rows seen both by a publish and by a poll go out once.
+    The stream sends a comment every HEARTBEAT seconds and ends after
+    MAX_AGE seconds, telling the client to reconnect, which bounds the life
+    of connections whose disconnect went unnoticed.
+
+    Parameters:
+    - user_id: ID of the authenticated user.
+    - last_event_id: Last-Event-ID header of a reconnecting client.
+
+    Yields:
+    - Encoded server-sent event strings.
+    """
+    config = get_config()
+    hub = get_notification_hub()
+    subscription = hub.subscribe(user_id)
+    sent = deque(maxlen=config['MAX_QUEUE'] * 10)
+    overlap = timedelta(seconds=config['POLL_OVERLAP'])
+    try:
+        yield f"retry: {config['RETRY']}\n\n"
+        since = None
+        if last_event_id:
+            since = await sync_to_async(_created_at)(hub.model, user_id, last_event_id)
+            if since is not None:
+                sent.append(last_event_id)
+        deadline = time.monotonic() + config['MAX_AGE']
+        while True:
+            rows = []
+            if since is not None or subscription.overflowed:
+                subscription.overflowed = False
+                since = since or timezone.now() - overlap * 2
+                rows = await sync_to_async(hub.fetch)([user_id], since)
+                since = None
+            timeout = min(config['HEARTBEAT'], deadline - time.monotonic())
+            if not rows:
+                if timeout <= 0:
+                    return
+                try:
+                    rows.append(await asyncio.wait_for(subscription.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+            while not subscription.queue.empty():
+                rows.append(subscription.queue.get_nowait())
+            for row in rows:
+                event_id = str(row['id'])
+                if event_id in sent:
+                    continue
+                sent.append(event_id)
+                yield format_event(row)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def _created_at(model, user_id, notification_id):
+    try:
+        return model.objects.filter(user_id=user_id, id=notification_id).values_list('created_at', flat=True).first()
+    except (ValidationError, ValueError):
+        # Malformed Last-Event-ID, start from now
+        return None
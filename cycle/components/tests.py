@@ -1,3 +1,1088 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from threading import Barrier, Thread
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from users.models import Renter, Rentee, User
+from .models import (
+    Bike, History, IdempotencyRecord, InsufficientFunds, Notification, NotificationCounter, RentalSession,
+    RenterDailyRollup, StatusDailyRollup, Wallet, WalletEntry, WalletHold,
+)
+from . import archive, streams
+from .archive import archive_history
+from .eventlog import EventBuffer
+from .retention import POLICIES, apply_policy, apply_retention
+from .rollups import rebuild_rollups, update_rollups
+from .serializers import BikeListSerializer, HistorySerializer, WalletSerializer
+from .streams import stream_notifications
+from .views import HistoryCreateView, HistoryExportView
+
+
+def create_renter(email='renter@example.com'):
+    return Renter.objects.create_user(
+        email, email.split('@')[0], 'Renter', 'password',
+        institution='Cycle University', phone_number='0700000000', registration_number='REG-1',
+    )
+
+
+def create_rentee(email='rentee@example.com', funds=0):
+    rentee = Rentee.objects.create_user(email, email.split('@')[0], 'Rentee', 'password')
+    if funds:
+        Wallet.objects.create(user=rentee).credit(funds)
+    return rentee
+
+
+def create_admin(email='admin@example.com'):
+    admin = User.objects.create_superuser(email, email.split('@')[0], 'Admin', 'password')
+    # User.save() gives new users the renter base role
+    User.objects.filter(pk=admin.pk).update(role=User.Role.ADMIN)
+    admin.role = User.Role.ADMIN
+    return admin
+
+
+class BikeListingQueryCountTest(TestCase):
+    """ The bike listing must not issue a query per bike for rented_by """
+
+    bike_count = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.renter = create_renter()
+        rentees = [create_rentee(f'rentee{i}@example.com') for i in range(3)]
+        bikes = Bike.objects.bulk_create(
+            Bike(owner=cls.renter, brand='Cycle', rent_price=i) for i in range(cls.bike_count)
+        )
+        Through = Bike.rented_by.through
+        Through.objects.bulk_create(
+            Through(bike_id=bike.pk, rentee_id=rentees[i % len(rentees)].pk)
+            for i, bike in enumerate(bikes)
+        )
+
+    def test_serializer_queries_are_constant(self):
+        with self.assertNumQueries(2):
+            data = BikeListSerializer(Bike.objects.for_listing(), many=True).data
+        self.assertEqual(len(data), self.bike_count)
+        self.assertTrue(all(len(bike['rented_by']) == 1 for bike in data))
+
+    def test_view_queries_do_not_depend_on_page_size(self):
+        client = APIClient()
+        client.force_authenticate(self.renter)
+        with self.assertNumQueries(2):
+            small = client.get('/components/bikes/', {'page_size': 10})
+        with self.assertNumQueries(2):
+            large = client.get('/components/bikes/', {'page_size': 200})
+        self.assertEqual(len(small.data['results']), 10)
+        self.assertEqual(len(large.data['results']), 200)
+
+
+class BikeListTest(TestCase):
+    """ The bike listing walks every bike once with its cursor and applies its filters """
+
+    url = '/components/bikes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.renter = create_renter()
+        cls.other = create_renter('other@example.com')
+        cls.rentee = create_rentee()
+        cls.bikes = Bike.objects.bulk_create(
+            Bike(owner=cls.renter, brand=('Cycle', 'Other')[i % 2], rent_price=i * 10, rented=i % 3 == 0)
+            for i in range(10)
+        )
+        Bike.objects.create(owner=cls.other, brand='Cycle', rent_price=50)
+
+    def walk(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        ids, response = [], client.get(self.url, {'page_size': 3, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(bike['id'] for bike in response.data['results'])
+            if response.data['next'] is None:
+                return ids
+            response = client.get(response.data['next'])
+
+    def expected(self, bikes):
+        return [str(bike.pk) for bike in sorted(bikes, key=lambda bike: (bike.created_at, bike.pk), reverse=True)]
+
+    def test_cursor_walks_every_bike_once(self):
+        self.assertEqual(self.walk(self.renter), self.expected(self.bikes))
+        self.assertEqual(len(self.walk(self.rentee)), 11)
+
+    def test_filters(self):
+        def matching(predicate):
+            return self.expected([bike for bike in self.bikes if predicate(bike)])
+
+        self.assertEqual(self.walk(self.renter, rented='false'), matching(lambda bike: not bike.rented))
+        self.assertEqual(self.walk(self.renter, brand='Other'), matching(lambda bike: bike.brand == 'Other'))
+        self.assertEqual(
+            self.walk(self.renter, min_price=20, max_price=60, rented='no'),
+            matching(lambda bike: 20 <= bike.rent_price <= 60 and not bike.rented),
+        )
+
+    def test_rejects_invalid_parameters(self):
+        client = APIClient()
+        client.force_authenticate(self.renter)
+        for params in ({'rented': 'maybe'}, {'min_price': 'cheap'}, {'max_price': '1.5'}):
+            self.assertEqual(client.get(self.url, params).status_code, 400)
+        response = client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual((response.status_code, response.data['detail']), (404, 'Invalid cursor'))
+
+
+class BikeRentalConcurrencyTest(TransactionTestCase):
+    """ Concurrent rent requests for one bike must produce exactly one rental """
+
+    thread_count = 16
+
+    def setUp(self):
+        self.bike = Bike.objects.create(owner=create_renter(), brand='Cycle', rent_price=100)
+        self.rentees = [create_rentee(f'rentee{i}@example.com', funds=1000) for i in range(self.thread_count)]
+
+    def post_concurrently(self, url, users):
+        barrier = Barrier(len(users))
+        statuses = []
+
+        def post(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                statuses.append(client.post(url).status_code)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=post, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_no_double_rentals(self):
+        url = f'/components/bikes/{self.bike.pk}/rent/'
+        for _ in range(3):
+            statuses = self.post_concurrently(url, self.rentees)
+            self.assertEqual(statuses.count(201), 1)
+            self.assertEqual(statuses.count(409), self.thread_count - 1)
+
+            self.bike.refresh_from_db()
+            self.assertTrue(self.bike.rented)
+            winner = self.bike.rented_by.get()
+            client = APIClient()
+            client.force_authenticate(winner)
+            self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/return/').status_code, 200)
+
+        self.assertEqual(History.objects.filter(rental_status=History.EventType.BIKE_RENTED).count(), 3)
+        self.assertEqual(History.objects.filter(rental_status=History.EventType.BIKE_RETURNED).count(), 3)
+        self.assertEqual(WalletHold.objects.filter(status=WalletHold.Status.CAPTURED).count(), 3)
+        self.assertEqual(WalletEntry.objects.filter(kind=WalletEntry.Kind.DEBIT).count(), 3)
+        self.assertFalse(WalletHold.objects.filter(status=WalletHold.Status.HELD).exists())
+
+    def test_return_requires_the_renting_rentee(self):
+        owner, other = self.rentees[:2]
+        client = APIClient()
+        client.force_authenticate(owner)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 201)
+
+        client.force_authenticate(other)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/return/').status_code, 409)
+        self.bike.refresh_from_db()
+        self.assertTrue(self.bike.rented)
+
+    def test_no_double_returns(self):
+        rentee = self.rentees[0]
+        client = APIClient()
+        client.force_authenticate(rentee)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 201)
+
+        statuses = self.post_concurrently(f'/components/bikes/{self.bike.pk}/return/', [rentee] * self.thread_count)
+        self.assertEqual(statuses.count(200), 1)
+        self.assertEqual(statuses.count(409), self.thread_count - 1)
+        self.assertEqual(History.objects.filter(rental_status=History.EventType.BIKE_RETURNED).count(), 1)
+        self.assertEqual(WalletHold.objects.filter(status=WalletHold.Status.CAPTURED).count(), 1)
+
+    def test_stale_return_keeps_the_next_rental(self):
+        first, second = self.rentees[:2]
+        client = APIClient()
+        client.force_authenticate(first)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 201)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/return/').status_code, 200)
+        client.force_authenticate(second)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 201)
+
+        client.force_authenticate(first)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/return/').status_code, 409)
+        self.bike.refresh_from_db()
+        self.assertTrue(self.bike.rented)
+        self.assertEqual(self.bike.rented_by.get(), second)
+
+    def test_failed_rent_leaves_no_hold(self):
+        rentee = self.rentees[0]
+        client = APIClient()
+        client.force_authenticate(rentee)
+        with mock.patch.object(RentalSession, 'start', side_effect=RuntimeError('session failed')):
+            with self.assertRaises(RuntimeError):
+                client.post(f'/components/bikes/{self.bike.pk}/rent/')
+        self.bike.refresh_from_db()
+        self.assertFalse(self.bike.rented)
+        self.assertFalse(WalletHold.objects.exists())
+        self.assertEqual(Wallet.objects.get(user=rentee).get_available_balance(), 1000)
+
+    def test_cancelled_rent_releases_its_hold(self):
+        rentee = self.rentees[0]
+        client = APIClient()
+        client.force_authenticate(rentee)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 201)
+        self.assertEqual(Wallet.objects.get(user=rentee).get_available_balance(), 900)
+
+        session = RentalSession.cancel(self.bike)
+        self.assertIsNotNone(session.ended_at)
+        self.assertEqual(WalletHold.objects.get().status, WalletHold.Status.RELEASED)
+        self.assertEqual(Wallet.objects.get(user=rentee).get_available_balance(), 1000)
+        self.bike.refresh_from_db()
+        self.assertFalse(self.bike.rented)
+        self.assertFalse(self.bike.rented_by.exists())
+        self.assertIsNone(RentalSession.cancel(self.bike))
+
+    def test_topped_up_wallet_can_rent(self):
+        rentee = create_rentee('new@example.com')
+        client = APIClient()
+        client.force_authenticate(rentee)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 402)
+        wallet = client.get('/components/wallet/').data
+        self.assertEqual((wallet['current_balance'], wallet['available_balance']), (0, 0))
+
+        admin = User.objects.create_superuser('admin@example.com', 'admin', 'Admin', 'password')
+        client.force_authenticate(admin)
+        url = f"/components/wallets/{wallet['id']}/top-up/"
+        for _ in range(2):
+            response = client.post(url, {'amount': 150}, format='json', headers={'Idempotency-Key': 'payment-1'})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['current_balance'], 150)
+
+        client.force_authenticate(rentee)
+        self.assertEqual(client.post(url, {'amount': 150}, format='json').status_code, 403)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 201)
+        self.assertEqual(client.get('/components/wallet/').data['available_balance'], 50)
+
+    def test_rent_requires_available_funds(self):
+        rentee = create_rentee('broke@example.com', funds=50)
+        client = APIClient()
+        client.force_authenticate(rentee)
+        self.assertEqual(client.post(f'/components/bikes/{self.bike.pk}/rent/').status_code, 402)
+        self.bike.refresh_from_db()
+        self.assertFalse(self.bike.rented)
+        self.assertFalse(self.bike.rented_by.exists())
+        self.assertEqual(Wallet.objects.get(user=rentee).get_available_balance(), 50)
+
+
+class EventBufferTest(TransactionTestCase):
+    """ Buffered History events must reach the table, the spool or a direct save """
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+        self.renter = create_renter()
+        self.bike = Bike.objects.create(owner=self.renter, brand='Cycle', rent_price=100)
+
+    def buffer(self, **options):
+        event_buffer = EventBuffer('components.History', spool_dir=self.spool_dir, **options)
+        self.addCleanup(event_buffer.stop)
+        return event_buffer
+
+    def events(self, count):
+        return [
+            History(bike=self.bike, renter=self.renter, amount_paid=i, rental_status=History.EventType.BIKE_RENTED)
+            for i in range(count)
+        ]
+
+    def wait_for_rows(self, count):
+        deadline = time.monotonic() + 5
+        while History.objects.count() < count:
+            self.assertLess(time.monotonic(), deadline, f'{count} events were not written')
+            time.sleep(0.01)
+
+    def test_flushes_by_size(self):
+        event_buffer = self.buffer(max_batch=3, flush_interval=60)
+        for event in self.events(4):
+            event_buffer.enqueue(event)
+        self.wait_for_rows(3)
+        time.sleep(0.1)
+        self.assertEqual(History.objects.count(), 3)
+        event_buffer.stop()
+        self.assertEqual(History.objects.count(), 4)
+
+    def test_flushes_by_interval(self):
+        event_buffer = self.buffer(max_batch=100, flush_interval=0.05)
+        event, = self.events(1)
+        event_buffer.enqueue(event)
+        self.wait_for_rows(1)
+        self.assertEqual(History.objects.get().created_at, event.created_at)
+
+    def test_stop_drains_the_queue(self):
+        event_buffer = self.buffer(max_batch=100, flush_interval=60)
+        for event in self.events(5):
+            event_buffer.enqueue(event)
+        started = time.monotonic()
+        event_buffer.stop()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(History.objects.count(), 5)
+        # a later event restarts the flusher
+        event_buffer.enqueue(self.events(1)[0])
+        self.assertIsNotNone(event_buffer.thread)
+        event_buffer.stop()
+        self.assertEqual(History.objects.count(), 6)
+
+    def test_spools_rejected_batches_and_replays_them(self):
+        event_buffer = self.buffer()
+        with mock.patch.object(History.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('components.eventlog', 'ERROR'):
+            event_buffer.write(self.events(3))
+        self.assertEqual(len(os.listdir(self.spool_dir)), 1)
+        self.assertFalse(History.objects.exists())
+        event_buffer.write(self.events(2))
+        self.assertEqual(History.objects.count(), 5)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_flusher_survives_spool_failures(self):
+        blocked = os.path.join(self.spool_dir, 'not-a-directory')
+        open(blocked, 'w').close()
+        event_buffer = EventBuffer('components.History', max_batch=2, flush_interval=0.05, spool_dir=blocked)
+        self.addCleanup(event_buffer.stop)
+        with mock.patch.object(History.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('components.eventlog', 'ERROR'):
+            for event in self.events(2):
+                event_buffer.enqueue(event)
+            # saved one by one once the batch can be neither inserted nor spooled
+            self.wait_for_rows(2)
+        with mock.patch.object(event_buffer, 'replay_spool', side_effect=RuntimeError), \
+                self.assertLogs('components.eventlog', 'ERROR'):
+            for event in self.events(2):
+                event_buffer.enqueue(event)
+            self.wait_for_rows(4)
+        self.assertTrue(event_buffer.thread.is_alive())
+        event_buffer.enqueue(self.events(1)[0])
+        self.wait_for_rows(5)
+
+    def test_replay_moves_bad_files_aside(self):
+        event_buffer = self.buffer()
+        with open(os.path.join(self.spool_dir, '0-corrupt.json'), 'w') as spool_file:
+            spool_file.write('[{"model": "components.history", "fields"')
+        event_buffer.spool(self.events(2))
+        with override_settings(HISTORY_EVENT_BUFFER={'SPOOL_DIR': self.spool_dir}), \
+                self.assertLogs('components.eventlog', 'ERROR'):
+            call_command('replay_history_spool', stdout=StringIO())
+        self.assertEqual(History.objects.count(), 2)
+        self.assertEqual(os.listdir(self.spool_dir), ['0-corrupt.json.failed'])
+
+        # an insert the reachable database keeps refusing is moved aside too
+        event_buffer.spool(self.events(1))
+        event_buffer.spool(self.events(1))
+        with mock.patch.object(History.objects, 'bulk_create', side_effect=[IntegrityError, None]), \
+                self.assertLogs('components.eventlog', 'ERROR'):
+            self.assertEqual(event_buffer.replay_spool(), 1)
+        self.assertEqual(len([name for name in os.listdir(self.spool_dir) if name.endswith('.failed')]), 2)
+
+        # files wait for a database that is down
+        event_buffer.spool(self.events(1))
+        with mock.patch.object(History.objects, 'bulk_create', side_effect=DatabaseError), \
+                mock.patch('components.eventlog.database_available', return_value=False), \
+                self.assertLogs('components.eventlog', 'ERROR'):
+            self.assertEqual(event_buffer.replay_spool(), 0)
+        self.assertEqual(event_buffer.replay_spool(), 1)
+
+
+class BackfillRentalSessionsTest(TestCase):
+    """ Rerunning the backfill must close sessions once their return is logged """
+
+    def test_rerun_closes_open_sessions(self):
+        renter, rentee = create_renter(), create_rentee()
+        bike = Bike.objects.create(owner=renter, brand='Cycle', rent_price=100)
+        rented = History.objects.create(
+            bike=bike, rentee=rentee, renter=renter, amount_paid=100,
+            created_at=timezone.now() - timedelta(hours=2), rental_status=History.EventType.BIKE_RENTED,
+        )
+        call_command('backfill_rental_sessions', '--event-chunk-size', '1', stdout=StringIO())
+        session = RentalSession.objects.get()
+        self.assertEqual(session.start_event, rented.pk)
+        self.assertIsNone(session.ended_at)
+
+        returned = History.objects.create(
+            bike=bike, rentee=rentee, renter=renter,
+            created_at=timezone.now() - timedelta(hours=1), rental_status=History.EventType.BIKE_RETURNED,
+        )
+        call_command('backfill_rental_sessions', '--event-chunk-size', '1', stdout=StringIO())
+        session = RentalSession.objects.get()
+        self.assertEqual(session.end_event, returned.pk)
+        self.assertEqual(session.ended_at, returned.created_at)
+        self.assertEqual(session.duration, returned.created_at - rented.created_at)
+
+    def rent(self, bike, rentee):
+        client = APIClient()
+        client.force_authenticate(rentee)
+        self.assertEqual(client.post(f'/components/bikes/{bike.pk}/rent/').status_code, 201)
+        return client
+
+    def test_keeps_cancelled_sessions(self):
+        bike = Bike.objects.create(owner=create_renter(), brand='Cycle', rent_price=100)
+        rentee = create_rentee(funds=1000)
+        self.rent(bike, rentee)
+        cancelled = RentalSession.cancel(bike)
+        call_command('backfill_rental_sessions', stdout=StringIO())
+        session = RentalSession.objects.get(pk=cancelled.pk)
+        self.assertEqual((session.ended_at, session.duration), (cancelled.ended_at, cancelled.duration))
+        self.assertEqual(session.hold.status, WalletHold.Status.RELEASED)
+        self.assertFalse(RentalSession.objects.filter(bike=bike, ended_at__isnull=True).exists())
+
+        # the next rental must not become the end of the cancelled one
+        self.rent(bike, rentee)
+        call_command('backfill_rental_sessions', stdout=StringIO())
+        self.assertEqual(RentalSession.objects.get(pk=cancelled.pk).ended_at, cancelled.ended_at)
+        self.assertEqual(RentalSession.objects.filter(bike=bike, ended_at__isnull=True).count(), 1)
+
+    def test_keeps_live_returns_with_buffered_events(self):
+        bike = Bike.objects.create(owner=create_renter(), brand='Cycle', rent_price=100)
+        client = self.rent(bike, create_rentee(funds=1000))
+        self.assertEqual(client.post(f'/components/bikes/{bike.pk}/return/').status_code, 200)
+        returned = RentalSession.objects.get(bike=bike)
+        # as if the BIKE_RETURNED event were still queued in the event buffer
+        History.objects.filter(bike=bike, rental_status=History.EventType.BIKE_RETURNED).delete()
+        call_command('backfill_rental_sessions', stdout=StringIO())
+        session = RentalSession.objects.get(bike=bike)
+        self.assertEqual((session.ended_at, session.end_event), (returned.ended_at, returned.end_event))
+        self.assertIsNotNone(session.ended_at)
+
+
+class DailyRollupTest(TestCase):
+    """ Rows committed behind the watermark are only counted by a rebuild """
+
+    def setUp(self):
+        self.renter = create_renter()
+        self.bike = Bike.objects.create(owner=self.renter, brand='Cycle', rent_price=100)
+
+    def log(self, created_at, amount=100):
+        return History.objects.create(
+            bike=self.bike, renter=self.renter, amount_paid=amount, created_at=created_at,
+            rental_status=History.EventType.BIKE_RENTED,
+        )
+
+    def totals(self):
+        rollup = StatusDailyRollup.objects.get(rental_status=History.EventType.BIKE_RENTED)
+        return rollup.events, rollup.amount
+
+    def test_rebuild_counts_late_rows_once(self):
+        now = timezone.now()
+        self.log(now - timedelta(minutes=10))
+        self.log(now - timedelta(minutes=5))
+        self.assertEqual(update_rollups(lag=timedelta(0)), 2)
+
+        self.log(now - timedelta(minutes=8), amount=50)
+        self.assertEqual(update_rollups(lag=timedelta(0)), 0)
+        self.assertEqual(self.totals(), (2, 200))
+
+        day = timezone.localdate()
+        self.assertEqual(rebuild_rollups(day - timedelta(days=1), day), 3)
+        self.assertEqual(self.totals(), (3, 250))
+        self.log(timezone.now())
+        update_rollups(lag=timedelta(0))
+        self.assertEqual(self.totals(), (4, 350))
+        self.assertEqual(RenterDailyRollup.objects.get(renter=self.renter).events, 4)
+
+    def test_rebuild_refolds_archived_days(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        now = timezone.now()
+        for days in (3, 3, 2):
+            self.log(now - timedelta(days=days))
+        self.assertEqual(update_rollups(lag=timedelta(0)), 3)
+        self.assertEqual(archive_history(timedelta(days=1), archive_dir=archive_dir), 3)
+        self.assertFalse(History.objects.exists())
+        # a segment whose rows were written but not yet deleted
+        archived = next(archive.iter_archived_history(archive_dir=archive_dir))
+        History.objects.create(**{
+            name: value for name, value in archive.to_history(archived).__dict__.items() if not name.startswith('_')
+        })
+
+        day = timezone.localdate()
+        self.assertEqual(rebuild_rollups(day - timedelta(days=10), day, archive_dir=archive_dir), 3)
+        rollups = StatusDailyRollup.objects.order_by('day')
+        self.assertEqual([(rollup.events, rollup.amount) for rollup in rollups], [(2, 200), (1, 100)])
+        self.assertEqual(RenterDailyRollup.objects.filter(renter=self.renter).count(), 2)
+
+        with override_settings(HISTORY_ARCHIVE_DIR=archive_dir), archive.lock_archive(archive_dir):
+            with self.assertRaises(CommandError):
+                call_command('update_rollups', '--rebuild-from', str(day - timedelta(days=10)), stdout=StringIO())
+
+    def test_report_rejects_invalid_parameters(self):
+        client = APIClient()
+        client.force_authenticate(self.renter)
+        for params in ({'start': '2024-13-01'}, {'end': 'yesterday'}, {'rental_status': 'Lost'}):
+            self.assertEqual(client.get('/components/reports/daily/', params).status_code, 400)
+        self.assertEqual(client.get('/components/reports/daily/', {'start': '2024-01-01'}).status_code, 200)
+
+
+class HistoryArchiveTest(TestCase):
+    """ Archived History must page like the live table without rereading old segments """
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.renter = create_renter()
+        bike = Bike.objects.create(owner=self.renter, brand='Cycle', rent_price=100)
+        start = timezone.now() - timedelta(days=30)
+        self.ids = [
+            History.objects.create(
+                bike=bike, renter=self.renter, amount_paid=i, created_at=start + timedelta(days=i // 3, minutes=i),
+            ).pk
+            for i in range(15)
+        ]
+        self.live = HistorySerializer(History.objects.get(pk=self.ids[0])).data
+
+    def test_round_trip(self):
+        with override_settings(HISTORY_ARCHIVE_DIR=self.archive_dir):
+            self.assertEqual(archive_history(timedelta(days=1)), 15)
+            self.assertFalse(History.objects.exists())
+
+            client = APIClient()
+            client.force_authenticate(self.renter)
+            seen, opened = [], []
+            params = {'archived': 'true', 'page_size': 4}
+            while True:
+                with mock.patch('components.archive.read_segment', side_effect=archive.read_segment) as read:
+                    response = client.get('/components/history/', params)
+                self.assertEqual(response.status_code, 200)
+                opened.append(read.call_count)
+                seen += response.data['results']
+                if response.data['cursor'] is None:
+                    break
+                params['cursor'] = response.data['cursor']
+
+        self.assertEqual([row['id'] for row in seen], [str(pk) for pk in reversed(self.ids)])
+        self.assertEqual(seen[-1], self.live)
+        # A page reads page_size + 1 rows, spanning at most three of the five
+        # days, and never reopens the newer days before its cursor
+        self.assertLessEqual(max(opened), 3)
+
+    def test_concurrent_runs_are_refused(self):
+        with archive.lock_archive(self.archive_dir):
+            with self.assertRaises(archive.ArchiveLocked):
+                archive_history(timedelta(days=1), archive_dir=self.archive_dir)
+        self.assertEqual(History.objects.count(), 15)
+
+
+class WalletLedgerTest(TestCase):
+    """ Credits and debits go through the ledger and snapshots fold them into balance """
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(user=create_rentee())
+
+    def test_credit_debit_and_snapshot(self):
+        self.wallet.credit(100)
+        self.wallet.credit(50, reference='payment-1')
+        self.wallet.debit(30)
+        with self.assertRaises(InsufficientFunds):
+            self.wallet.debit(121)
+        with self.assertRaises(ValueError):
+            self.wallet.credit(0)
+        self.assertEqual(self.wallet.get_balance(), 120)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, 0)
+
+        snapshot = self.wallet.take_snapshot()
+        self.assertEqual((snapshot.balance, snapshot.entries), (120, 3))
+        self.assertEqual(self.wallet.balance, 120)
+        self.assertFalse(self.wallet.entries.filter(folded=False).exists())
+        self.assertIsNone(self.wallet.take_snapshot())
+
+        self.wallet.debit(20)
+        self.assertEqual(self.wallet.get_balance(), 100)
+        data = WalletSerializer(Wallet.objects.with_current_balance().get(pk=self.wallet.pk)).data
+        self.assertEqual((data['balance'], data['current_balance']), (120, 100))
+
+    def test_serializer_cannot_write_balance(self):
+        serializer = WalletSerializer(self.wallet, data={'user': self.wallet.user_id, 'balance': 1000}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, 0)
+
+    def test_reconcile(self):
+        self.wallet.credit(100)
+        self.wallet.take_snapshot()
+        call_command('reconcile_wallets', stdout=StringIO())
+
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=999)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_wallets', stdout=StringIO(), stderr=StringIO())
+
+
+class HistoryListTest(TestCase):
+    """ The history list walks every row once with its cursor and applies its filters """
+
+    url = '/components/history/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.renter = create_renter()
+        cls.other = create_renter('other@example.com')
+        cls.now = timezone.now().replace(microsecond=0)
+        statuses = [History.EventType.RENTER_RENTAL, History.EventType.BIKE_RENTED]
+        # pairs of rows share a created_at so the pages must break ties on id
+        cls.rows = History.objects.bulk_create(
+            History(renter=cls.renter, rental_status=statuses[i % 2], created_at=cls.now - timedelta(hours=i // 2))
+            for i in range(11)
+        )
+        History.objects.create(renter=cls.other)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.renter)
+
+    def walk(self, **params):
+        ids, response = [], self.client.get(self.url, {'page_size': 3, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.data['results'])
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def expected(self, rows):
+        return [str(row.pk) for row in sorted(rows, key=lambda row: (row.created_at, row.pk), reverse=True)]
+
+    def test_cursor_walks_every_row_once(self):
+        self.assertEqual(self.walk(), self.expected(self.rows))
+
+    def test_filters(self):
+        rentals = [row for row in self.rows if row.rental_status == History.EventType.BIKE_RENTED]
+        self.assertEqual(self.walk(rental_status=History.EventType.BIKE_RENTED), self.expected(rentals))
+        start, end = self.now - timedelta(hours=3), self.now - timedelta(hours=1)
+        in_range = [row for row in self.rows if start <= row.created_at < end]
+        self.assertEqual(len(in_range), 4)
+        self.assertEqual(self.walk(start=start.isoformat(), end=end.isoformat()), self.expected(in_range))
+
+    def test_rejects_invalid_parameters(self):
+        for params in ({'rental_status': 'Lost'}, {'start': 'yesterday'}, {'archived': 'maybe'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+        for cursor in ('not-a-cursor', 'WyJ4Il0'):
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual((response.status_code, response.data['detail']), (404, 'Invalid cursor'))
+
+
+class HistoryExportTest(TestCase):
+    """ The export streams the rows the user may see in the requested format and range """
+
+    url = '/components/history/export/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.renter = create_renter()
+        cls.other = create_renter('other@example.com')
+        cls.admin = create_admin()
+        cls.now = timezone.now().replace(microsecond=0)
+        cls.rows = [
+            History.objects.create(renter=renter, amount_paid=days, created_at=cls.now - timedelta(days=days))
+            for renter, days in ((cls.renter, 1), (cls.renter, 3), (cls.other, 2))
+        ]
+
+    def export(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(self.url, params)
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        response = self.export(self.renter)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        # oldest first
+        self.assertEqual([row['id'] for row in rows], [str(self.rows[1].pk), str(self.rows[0].pk)])
+        self.assertEqual(set(rows[0]), set(HistoryExportView.fields))
+        self.assertEqual((rows[0]['renter'], rows[0]['amount_paid']), (self.renter.pk, 3))
+
+    def test_csv(self):
+        response = self.export(self.admin, output='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="history.csv"')
+        rows = list(csv.DictReader(StringIO(self.content(response))))
+        self.assertEqual([row['amount_paid'] for row in rows], ['3', '2', '1'])
+        self.assertEqual(rows[0]['id'], str(self.rows[1].pk))
+
+    def test_time_range(self):
+        response = self.export(
+            self.admin,
+            start=(self.now - timedelta(days=2)).isoformat(), end=(self.now - timedelta(days=1)).isoformat(),
+        )
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        # start is inclusive, end exclusive
+        self.assertEqual([row['id'] for row in rows], [str(self.rows[2].pk)])
+
+    def test_role_scoping(self):
+        rentee = create_rentee()
+        History.objects.create(rentee=rentee)
+        self.assertEqual(len(self.content(self.export(self.other)).splitlines()), 1)
+        self.assertEqual(len(self.content(self.export(rentee)).splitlines()), 1)
+        self.assertEqual(len(self.content(self.export(self.admin)).splitlines()), 4)
+
+    def test_rejects_invalid_parameters(self):
+        response = self.export(self.renter, output='xlsx')
+        self.assertEqual((response.status_code, response.data), (400, {'detail': "Unsupported output 'xlsx'."}))
+        self.assertEqual(self.export(self.renter, start='yesterday').status_code, 400)
+        self.assertEqual(self.export(self.renter, archived='maybe').status_code, 400)
+
+
+class HistoryBatchCreateTest(TestCase):
+    """ Batches insert their valid items and report the others by index """
+
+    url = '/components/history/create/'
+
+    def setUp(self):
+        cache.clear()
+        self.renter = create_renter()
+        self.rentee = create_rentee()
+        self.bike = Bike.objects.create(owner=self.renter, brand='Cycle', rent_price=100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.renter)
+
+    def item(self, **fields):
+        return {'amount_paid': 100, 'rental_status': History.EventType.RENTER_RENTAL, **fields}
+
+    def post(self, items, client=None):
+        return (client or self.client).post(self.url, items, format='json')
+
+    def test_every_item_created(self):
+        response = self.post([self.item(bike=str(self.bike.pk)), self.item(amount_paid=200)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual(History.objects.filter(renter=self.renter, bike=self.bike).count(), 1)
+        self.assertEqual(History.objects.filter(renter=self.renter).count(), 2)
+
+    def test_errors_are_keyed_by_index(self):
+        missing = '00000000-0000-0000-0000-000000000000'
+        response = self.post([
+            self.item(),
+            'not an object',
+            self.item(bike=missing),
+            self.item(amount_paid='lots'),
+            self.item(bike=str(self.bike.pk)),
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 2)
+        errors = {error['index']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3])
+        self.assertIn('non_field_errors', errors[1])
+        self.assertEqual(errors[2], {'bike': [f'Invalid pk "{missing}" - object does not exist.']})
+        self.assertIn('amount_paid', errors[3])
+        self.assertEqual(History.objects.count(), 2)
+
+    def test_no_valid_item(self):
+        response = self.post([self.item(rentee=0), 'not an object'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1])
+        self.assertFalse(History.objects.exists())
+
+    def test_max_batch_size(self):
+        with mock.patch.object(HistoryCreateView, 'max_batch_size', 2):
+            response = self.post([self.item()] * 3)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data, {'detail': 'A batch may hold at most 2 items.'})
+            self.assertFalse(History.objects.exists())
+            self.assertEqual(self.post([self.item()] * 2).status_code, 201)
+
+    def test_owner_overrides_the_payload(self):
+        other_renter = create_renter('other-renter@example.com')
+        other_rentee = create_rentee('other-rentee@example.com')
+        self.post([self.item(renter=other_renter.pk)])
+        self.assertEqual(History.objects.get().renter_id, self.renter.pk)
+
+        client = APIClient()
+        client.force_authenticate(self.rentee)
+        response = self.post([self.item(rentee=other_rentee.pk, renter=other_renter.pk)], client=client)
+        self.assertEqual(response.status_code, 201)
+        history = History.objects.get(rentee__isnull=False)
+        self.assertEqual((history.rentee_id, history.renter_id), (self.rentee.pk, other_renter.pk))
+
+
+@override_settings(IDEMPOTENCY_WAIT=timedelta(0))
+class IdempotencyTest(TestCase):
+    """ Idempotency-Key replays, conflicts, mismatches and takeover of crashed claims """
+
+    url = '/components/history/create/'
+
+    def setUp(self):
+        cache.clear()
+        self.renter = create_renter()
+        self.client = APIClient()
+        self.client.force_authenticate(self.renter)
+
+    def post(self, key, amount=100, client=None):
+        return (client or self.client).post(
+            self.url, {'amount_paid': amount, 'rental_status': History.EventType.RENTER_RENTAL},
+            format='json', headers={'Idempotency-Key': key},
+        )
+
+    def claim_in_flight(self, key, lease):
+        return IdempotencyRecord.objects.create(
+            scope=f'user:{self.renter.pk}', key=key, fingerprint='', expires_at=timezone.now() + lease,
+        )
+
+    def test_replay(self):
+        first = self.post('key-1')
+        cache.clear()
+        second = self.post('key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((second.status_code, second.data), (201, first.data))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(History.objects.count(), 1)
+        self.assertGreater(IdempotencyRecord.objects.get().expires_at, timezone.now() + timedelta(hours=1))
+
+    def test_in_flight_key_conflicts(self):
+        self.claim_in_flight('key-1', timedelta(seconds=30))
+        self.assertEqual(self.post('key-1').status_code, 409)
+        self.assertFalse(History.objects.exists())
+
+    def test_different_request_is_rejected(self):
+        self.assertEqual(self.post('key-1').status_code, 201)
+        self.assertEqual(self.post('key-1', amount=200).status_code, 422)
+        self.assertEqual(History.objects.count(), 1)
+
+    def test_crashed_claim_is_taken_over(self):
+        self.claim_in_flight('key-1', -timedelta(seconds=1))
+        response = self.post('key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(History.objects.count(), 1)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 201)
+
+    def test_anonymous_keys_are_not_shared(self):
+        anonymous = APIClient()
+        url = '/accounts/users/create/renter/'
+        data = {
+            'email': 'first@example.com', 'username': 'first', 'first_name': 'First', 'password': 'password',
+            'institution': 'Cycle University', 'phone_number': '0700000001', 'registration_number': 'REG-2',
+            'role': User.Role.RENTER,
+        }
+        first = anonymous.post(url, data, format='json', headers={'Idempotency-Key': 'signup'})
+        self.assertEqual(first.status_code, 201)
+        other = {**data, 'email': 'second@example.com', 'username': 'second', 'registration_number': 'REG-3'}
+        second = anonymous.post(url, other, format='json', headers={'Idempotency-Key': 'signup'})
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.data, first.data)
+        retry = anonymous.post(url, data, format='json', headers={'Idempotency-Key': 'signup'})
+        self.assertEqual((retry.data, retry['Idempotent-Replayed']), (first.data, 'true'))
+
+
+class RetentionTest(TestCase):
+    """ Retention deletes only expired rows, in forward primary key batches """
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = create_rentee()
+
+    def token(self, jti, expires_in, blacklisted=False):
+        token = OutstandingToken.objects.create(jti=jti, token='', expires_at=self.now + expires_in)
+        if blacklisted:
+            BlacklistedToken.objects.create(token=token)
+        return token
+
+    def idempotency_record(self, key, expires_in):
+        return IdempotencyRecord.objects.create(
+            scope='test', key=key, fingerprint='', expires_at=self.now + expires_in,
+        )
+
+    def notification(self, read_status, age):
+        notification = Notification.objects.create(user=self.user, content='Hello', read_status=read_status)
+        Notification.objects.filter(pk=notification.pk).update(updated_at=self.now - age)
+        return notification
+
+    def test_deletes_only_rows_past_the_cutoff(self):
+        self.token('old', -timedelta(days=2), blacklisted=True)
+        self.token('grace', -timedelta(hours=12), blacklisted=True)
+        self.token('live', timedelta(days=1))
+        Session.objects.create(session_key='expired', session_data='', expire_date=self.now - timedelta(minutes=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=self.now + timedelta(days=1))
+        self.notification(True, timedelta(days=91))
+        kept = [
+            self.notification(True, timedelta(days=89)),
+            self.notification(False, timedelta(days=365)),
+        ]
+        self.idempotency_record('expired', -timedelta(minutes=1))
+        self.idempotency_record('live', timedelta(minutes=1))
+
+        deleted = apply_retention(sleep=0)
+        self.assertEqual(deleted, {
+            'blacklisted_tokens': 1, 'outstanding_tokens': 1, 'sessions': 1,
+            'read_notifications': 1, 'idempotency_records': 1,
+        })
+        self.assertEqual(set(OutstandingToken.objects.values_list('jti', flat=True)), {'grace', 'live'})
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token__jti', flat=True)), ['grace'])
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertEqual(set(Notification.objects.all()), set(kept))
+        self.assertEqual(list(IdempotencyRecord.objects.values_list('key', flat=True)), ['live'])
+
+    def test_blacklisted_tokens_go_first(self):
+        names = [policy.name for policy in POLICIES]
+        self.assertLess(names.index('blacklisted_tokens'), names.index('outstanding_tokens'))
+        self.token('old', -timedelta(days=2), blacklisted=True)
+        deleted = apply_retention(['blacklisted_tokens', 'outstanding_tokens'], sleep=0)
+        # each row is deleted by its own policy rather than by a cascade
+        self.assertEqual(deleted, {'blacklisted_tokens': 1, 'outstanding_tokens': 1})
+
+    def test_batches_move_forward_and_stop_at_max_batches(self):
+        records = [self.idempotency_record(f'key-{i}', -timedelta(minutes=1)) for i in range(5)]
+        policy = next(policy for policy in POLICIES if policy.name == 'idempotency_records')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(apply_policy(policy, batch_size=2, sleep=0, max_batches=2), 4)
+        remaining = max(records, key=lambda record: record.pk)
+        self.assertEqual(list(IdempotencyRecord.objects.all()), [remaining])
+        selects = [query['sql'] for query in queries.captured_queries if 'LIMIT 2' in query['sql']]
+        self.assertEqual(len(selects), 2)
+        self.assertIn('"id" >', selects[1])
+        self.assertEqual(apply_policy(policy, batch_size=2, sleep=0), 1)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(CommandError):
+            call_command('apply_retention', '--policy', 'bogus', stdout=StringIO())
+
+
+class NotificationReadTest(TestCase):
+    """ Notifications are marked read in bulk and the unread counter follows them """
+
+    def setUp(self):
+        self.rentee = create_rentee()
+        self.other = create_rentee('other@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.rentee)
+
+    def notify(self, user, age=0):
+        notification = Notification.create_notification(user, 'Hello')
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=age))
+        return notification
+
+    def unread(self, user):
+        return NotificationCounter.objects.get(user=user).unread
+
+    def test_mark_by_ids(self):
+        first, second = self.notify(self.rentee), self.notify(self.rentee)
+        foreign = self.notify(self.other)
+        response = self.client.post(
+            '/components/notifications/read/', {'ids': [str(first.pk), str(foreign.pk)]}, format='json'
+        )
+        self.assertEqual(response.data, {'updated': 1, 'unread': 1})
+        self.assertEqual(
+            set(Notification.objects.filter(read_status=True).values_list('pk', flat=True)), {first.pk}
+        )
+        # already read notifications are not counted twice
+        self.assertEqual(Notification.mark_many_as_read(self.rentee.pk, ids=[first.pk, second.pk]), 1)
+        self.assertEqual(self.unread(self.rentee), 0)
+
+    def test_mark_before(self):
+        old, new = self.notify(self.rentee, age=2), self.notify(self.rentee)
+        self.notify(self.other, age=2)
+        before = (timezone.now() - timedelta(days=1)).isoformat()
+        response = self.client.post('/components/notifications/read/', {'before': before}, format='json')
+        self.assertEqual(response.data, {'updated': 1, 'unread': 1})
+        self.assertTrue(Notification.objects.get(pk=old.pk).read_status)
+        self.assertFalse(Notification.objects.get(pk=new.pk).read_status)
+        self.assertFalse(Notification.objects.filter(user=self.other, read_status=True).exists())
+        response = self.client.post('/components/notifications/read/', {'before': 'yesterday'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_counter_moves_on_create_broadcast_and_read(self):
+        self.assertEqual(self.client.get('/components/notifications/unread-count/').data, {'unread': 0})
+        self.notify(self.rentee)
+        self.assertEqual(self.unread(self.rentee), 1)
+        Notification.broadcast('Everyone', role=User.Role.RENTEE)
+        self.assertEqual(self.unread(self.rentee), 2)
+        Notification.mark_many_as_read(self.rentee.pk)
+        self.assertEqual(self.unread(self.rentee), 0)
+        self.assertEqual(self.client.get('/components/notifications/unread-count/').data, {'unread': 0})
+
+    def test_counter_is_created_lazily(self):
+        self.notify(self.other)
+        self.notify(self.other)
+        # users without a counter are skipped by the updates
+        self.assertFalse(NotificationCounter.objects.filter(user=self.other).exists())
+        self.assertEqual(NotificationCounter.get_unread(self.other.pk), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(NotificationCounter.get_unread(self.other.pk), 2)
+        NotificationCounter.objects.filter(user=self.other).update(unread=5)
+        self.assertEqual(NotificationCounter.recount(self.other.pk), 2)
+        self.assertEqual(self.unread(self.other), 2)
+
+
+@override_settings(NOTIFICATION_STREAM={'POLL_INTERVAL': None, 'HEARTBEAT': 5.0})
+class NotificationStreamTest(TestCase):
+    """ Committed notifications reach the stream and reconnects catch up from the database """
+
+    def setUp(self):
+        streams._hub.reset()
+        self.addCleanup(streams._hub.reset)
+        self.rentee = create_rentee()
+
+    async def next_event(self, events):
+        return await asyncio.wait_for(events.__anext__(), 5)
+
+    async def test_committed_notifications_are_pushed(self):
+        events = stream_notifications(self.rentee.pk)
+        self.assertTrue((await self.next_event(events)).startswith('retry: '))
+        pending = asyncio.ensure_future(self.next_event(events))
+
+        def notify():
+            with self.captureOnCommitCallbacks() as callbacks:
+                notification = Notification.create_notification(self.rentee, 'Your bike is ready')
+            return notification, callbacks
+
+        notification, callbacks = await sync_to_async(notify)()
+        await asyncio.sleep(0.05)
+        # nothing is pushed before the transaction commits
+        self.assertFalse(pending.done())
+        for callback in callbacks:
+            callback()
+        event = await pending
+        self.assertTrue(event.startswith(f'id: {notification.id}\nevent: notification\n'))
+        self.assertIn('"content": "Your bike is ready"', event)
+        await events.aclose()
+        self.assertFalse(streams._hub.get().subscriptions)
+
+    async def test_last_event_id_catches_up(self):
+        def notify():
+            notifications = [Notification.create_notification(self.rentee, f'Notification {i}') for i in range(3)]
+            for i, notification in enumerate(notifications):
+                Notification.objects.filter(pk=notification.pk).update(
+                    created_at=timezone.now() - timedelta(minutes=10 - i)
+                )
+            return [str(notification.id) for notification in notifications]
+
+        ids = await sync_to_async(notify)()
+        events = stream_notifications(self.rentee.pk, last_event_id=ids[0])
+        await self.next_event(events)
+        received = [await self.next_event(events) for _ in ids[1:]]
+        self.assertEqual([event.split('\n')[0] for event in received], [f'id: {pk}' for pk in ids[1:]])
+        await events.aclose()
+
+    def test_requires_authentication(self):
+        response = self.client.get('/components/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/components/notifications/stream/', HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
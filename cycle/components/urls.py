@@ -1,12 +1,32 @@
 from django.urls import path
 from .views import (
     BikeListView,
-    HistoryListView, 
-    HistoryCreateView
+    BikeRentView,
+    BikeReturnView,
+    WalletView,
+    WalletTopUpView,
+    HistoryListView,
+    HistoryExportView,
+    HistoryCreateView,
+    DailyReportView,
+    NotificationBroadcastView,
+    NotificationReadView,
+    NotificationUnreadCountView,
+    NotificationStreamView,
 )
 
 urlpatterns = [
     path('bikes/', BikeListView.as_view(), name='bike-list'),
+    path('bikes/<uuid:pk>/rent/', BikeRentView.as_view(), name='bike-rent'),
+    path('bikes/<uuid:pk>/return/', BikeReturnView.as_view(), name='bike-return'),
+    path('wallet/', WalletView.as_view(), name='wallet'),
+    path('wallets/<uuid:pk>/top-up/', WalletTopUpView.as_view(), name='wallet-top-up'),
     path('history/', HistoryListView.as_view(), name='history-list'),
+    path('history/export/', HistoryExportView.as_view(), name='history-export'),
     path('history/create/', HistoryCreateView.as_view(), name='create-history'),
+    path('notifications/broadcast/', NotificationBroadcastView.as_view(), name='notification-broadcast'),
+    path('notifications/read/', NotificationReadView.as_view(), name='notification-read'),
+    path('notifications/unread-count/', NotificationUnreadCountView.as_view(), name='notification-unread-count'),
+    path('notifications/stream/', NotificationStreamView.as_view(), name='notification-stream'),
+    path('reports/daily/', DailyReportView.as_view(), name='daily-report'),
 ]
@@ -1,69 +1,537 @@
 
+import csv
+import json
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import authentication, permissions
+from rest_framework import authentication, exceptions, permissions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Bike, History, Wallet, Notification
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
+from .models import (
+    Bike, History, RentalSession, Wallet, Notification, NotificationCounter, InsufficientFunds,
+    RenterDailyRollup, BikeDailyRollup, StatusDailyRollup,
+)
+from users.loaders import get_role_user
 from users.models import Renter, Rentee, User
-from .serializers import BikeSerializer, HistorySerializer, WalletSerializer, NotificationSerializer
+from .serializers import (
+    BikeSerializer, BikeListSerializer, HistorySerializer, HistoryBatchItemSerializer,
+    WalletSerializer, WalletTopUpSerializer, NotificationSerializer,
+    RenterDailyRollupSerializer, BikeDailyRollupSerializer, StatusDailyRollupSerializer,
+)
+from common.pagination import KeysetPagination, iterate_in_chunks
+from .archive import iter_archived_history, to_history
+from .idempotency import idempotent
+from .fanout import broadcast_in_background
+from .streams import stream_notifications
+
+
+def _parse_time_range(params):
+    """
+    Builds created_at filters from the start/end query parameters.
+
+    Parameters:
+    - params: Query parameters holding optional ISO 8601 start and end.
+
+    Returns:
+    - Dict of filter kwargs (start inclusive, end exclusive).
+
+    Raises:
+    - ValueError: If a bound is not a valid datetime.
+    """
+    filters = {}
+    for param, lookup in (('start', 'created_at__gte'), ('end', 'created_at__lt')):
+        if param not in params:
+            continue
+        value = parse_datetime(params[param])
+        if value is None:
+            raise ValueError(f"'{params[param]}' is not a valid datetime")
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        filters[lookup] = value
+    return filters
+
+
+def _history_for_user(user):
+    """ Returns the History rows visible to the user """
+    if user.role == User.Role.RENTER:
+        return History.objects.filter(renter_id=user.pk)
+    if user.role == User.Role.RENTEE:
+        return History.objects.filter(rentee_id=user.pk)
+    return History.objects.all()
+
+
+def _archived_history_for_user(user, time_range, descending=False, after=None):
+    """ Streams the archived History rows visible to the user, see iter_archived_history() """
+    rows = iter_archived_history(
+        start=time_range.get('created_at__gte'),
+        end=time_range.get('created_at__lt'),
+        descending=descending,
+        after=after,
+    )
+    if user.role == User.Role.RENTER:
+        return (row for row in rows if row['renter'] == user.pk)
+    if user.role == User.Role.RENTEE:
+        return (row for row in rows if row['rentee'] == user.pk)
+    return rows
+
+
+def _parse_bool(value):
+    """ Parses a boolean query parameter, raising ValueError when it is not one """
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f"'{value}' is not a valid boolean")
+
 
 class BikeListView(APIView):
     """
-    Returns a list of all Bikes in the database
+    Returns a cursor-paginated list of Bikes, newest first.
+
+    Query parameters:
+    - rented: true/false to filter on availability.
+    - brand: Exact brand name.
+    - min_price / max_price: Inclusive rent_price range.
+    - cursor / page_size: Pagination controls, see KeysetPagination.
     """
+    pagination_class = KeysetPagination
+
     def get(self, request):
         """
         Function that handles the GET request
         """
         if request.user.role == User.Role.RENTER:
-            bikes = Bike.objects.filter(owner=request.user)
+            bikes = Bike.objects.for_listing().filter(owner_id=request.user.pk)
         else:
-            bikes = Bike.objects.all()
+            bikes = Bike.objects.for_listing()
+
+        params = request.query_params
+        try:
+            if 'rented' in params:
+                bikes = bikes.filter(rented=_parse_bool(params['rented']))
+            if 'min_price' in params:
+                bikes = bikes.filter(rent_price__gte=int(params['min_price']))
+            if 'max_price' in params:
+                bikes = bikes.filter(rent_price__lte=int(params['max_price']))
+        except ValueError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        if 'brand' in params:
+            bikes = bikes.filter(brand=params['brand'])
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(bikes, request, view=self)
+        bike_serializer = BikeListSerializer(page, many=True)
+        return paginator.get_paginated_response(bike_serializer.data)
+
+class BikeRentView(APIView):
+    """
+    Rents a Bike to the logged in Rentee.
+
+    The bike is claimed with a conditional UPDATE (rented = False -> True) so
+    that concurrent requests for the same bike cannot both succeed: the
+    losers see zero affected rows and get a 409 instead of waiting on a lock.
+    The rent price is then reserved on the rentee's wallet (opened empty on
+    first use) with a hold that is captured when the bike is returned; if it
+    cannot be reserved the claim is rolled back and a 402 is returned.
+
+    The hold is written in the claim's transaction, so a rent that fails
+    after reserving it rolls the hold back with everything else. Holds of
+    rentals that are cancelled instead of returned are released by
+    RentalSession.cancel().
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        """ Handles the POST http method """
+        if request.user.role != User.Role.RENTEE:
+            return Response({'detail': 'Only rentees can rent bikes.'}, status=status.HTTP_403_FORBIDDEN)
+        rentee = get_role_user(request)
+        if not isinstance(rentee, Rentee):
+            return Response({'detail': 'Only rentees can rent bikes.'}, status=status.HTTP_403_FORBIDDEN)
+        bike = get_object_or_404(Bike.objects.select_related('owner'), pk=pk)
+        wallet = Wallet.objects.for_user(rentee.pk) if bike.rent_price > 0 else None
+
+        try:
+            with transaction.atomic():
+                claimed = Bike.objects.filter(pk=bike.pk, rented=False).update(
+                    rented=True, updated_at=timezone.now()
+                )
+                if not claimed:
+                    return Response({'detail': 'Bike is already rented.'}, status=status.HTTP_409_CONFLICT)
+                hold = wallet.hold(bike.rent_price, reference=str(bike.pk)) if wallet is not None else None
+                bike.rented = True
+                bike.rented_by.add(rentee)
+                history = History.log_bike_rental(bike, rentee, bike.owner, bike.rent_price, request.user)
+                RentalSession.start(bike, rentee, bike.owner, bike.rent_price, history, hold)
+        except InsufficientFunds:
+            return Response({'detail': 'Insufficient wallet balance.'}, status=status.HTTP_402_PAYMENT_REQUIRED)
+
+        return Response(HistorySerializer(history).data, status=status.HTTP_201_CREATED)
+
+
+class BikeReturnView(APIView):
+    """
+    Returns a Bike rented by the logged in Rentee.
+
+    Uses the same conditional UPDATE as BikeRentView (rented = True -> False),
+    guarded on the bike being rented by the requesting rentee, so a bike can
+    only be returned once per rental and a stale or duplicate return cannot
+    release a rental another rentee has started since.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        """ Handles the POST http method """
+        if request.user.role != User.Role.RENTEE:
+            return Response({'detail': 'Only rentees can return bikes.'}, status=status.HTTP_403_FORBIDDEN)
+        bike = get_object_or_404(Bike, pk=pk)
+
+        with transaction.atomic():
+            # An EXISTS subquery rather than a rented_by join: Django turns an
+            # UPDATE over a join into a separate SELECT of pks on MySQL, which
+            # would drop the rented = True condition from the UPDATE itself.
+            rented_by_user = Bike.rented_by.through.objects.filter(bike_id=OuterRef('pk'), rentee_id=request.user.pk)
+            released = Bike.objects.filter(Exists(rented_by_user), pk=bike.pk, rented=True).update(
+                rented=False, updated_at=timezone.now()
+            )
+            if not released:
+                return Response({'detail': 'Bike is not rented by you.'}, status=status.HTTP_409_CONFLICT)
+            bike.rented = False
+            bike.rented_by.remove(request.user.pk)
+            history = History.log_bike_return(bike, request.user)
+            RentalSession.end(bike, history)
+
+        return Response(HistorySerializer(history).data, status=status.HTTP_200_OK)
+
+
+class WalletView(APIView):
+    """
+    Returns the logged in user's wallet with its current and available
+    balance, opening an empty wallet on first use.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """ Handles the GET method """
+        wallet = Wallet.objects.for_user(request.user.pk)
+        wallet = Wallet.objects.with_available_balance().get(pk=wallet.pk)
+        return Response(WalletSerializer(wallet).data)
+
+
+class WalletTopUpView(APIView):
+    """
+    Credits a wallet, e.g. once a payment has been received.
+
+    Only admins may top up. Send an Idempotency-Key so a retried top-up is
+    credited once.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    @idempotent
+    def post(self, request, pk):
+        """ Handles the POST http method """
+        if request.user.role != User.Role.ADMIN and not request.user.is_staff:
+            return Response({'detail': 'Only admins can top up wallets.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = WalletTopUpSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        wallet = get_object_or_404(Wallet, pk=pk)
+        wallet.credit(serializer.validated_data['amount'], reference=serializer.validated_data['reference'])
+        wallet = Wallet.objects.with_available_balance().get(pk=wallet.pk)
+        return Response(WalletSerializer(wallet).data, status=status.HTTP_201_CREATED)
 
-        bike_serializer = BikeSerializer(bikes, many=True)
-        return Response(bike_serializer.data)
 
 class HistoryListView(APIView):
     """
     Returns a list of all the History objects if the user is an Admin otherwise
-    returns only the History for the specified user
+    returns only the History for the specified user, newest first and
+    cursor-paginated.
+
+    Query parameters:
+    - rental_status: One of History.EventType.
+    - start / end: Optional ISO 8601 created_at range, end exclusive.
+    - archived: true to read the archive segments instead of the table,
+      rows have the same shape as live ones.
+    - cursor / page_size: Pagination controls, see KeysetPagination.
     """
 
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get(self, request):
         """ Handles the GET mathod """
-        if request.user.role == User.Role.RENTER:
-            history = History.objects.filter(renter=request.user)
-        elif request.user.role == User.Role.RENTEE:
-            history = History.objects.filter(rentee=request.user)
+        params = request.query_params
+        try:
+            time_range = _parse_time_range(params)
+            archived = _parse_bool(params.get('archived', 'false'))
+        except ValueError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        rental_status = params.get('rental_status')
+        if rental_status is not None and rental_status not in History.EventType.values:
+            return Response(
+                {'detail': f"'{rental_status}' is not a valid rental_status"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        paginator = self.pagination_class(model=History)
+        if archived:
+            # Resume from the cursor so segments newer than it are never opened
+            after = paginator.decode_cursor(request, History)
+            rows = _archived_history_for_user(request.user, time_range, descending=True, after=after)
+            if rental_status is not None:
+                rows = (row for row in rows if row['rental_status'] == rental_status)
+            page = paginator.paginate_iterable(rows, request)
+            history_serializer = HistorySerializer([to_history(row) for row in page], many=True)
+            return paginator.get_paginated_response(history_serializer.data)
+
+        history = _history_for_user(request.user).filter(**time_range)
+        if rental_status is not None:
+            history = history.filter(rental_status=rental_status)
+        page = paginator.paginate_queryset(history, request, view=self)
+        history_serializer = HistorySerializer(page, many=True)
+        return paginator.get_paginated_response(history_serializer.data)
+
+
+class HistoryExportView(APIView):
+    """
+    Streams the History visible to the user as NDJSON or CSV.
+
+    Rows are read in keyset-ordered chunks and written out as they arrive,
+    so worker memory stays flat regardless of how many rows match.
+
+    Query parameters:
+    - output: ndjson (default) or csv.
+    - start / end: Optional ISO 8601 created_at range, end exclusive.
+    - archived: true to stream the archive segments instead of the table.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    chunk_size = 2000
+    fields = [
+        'id', 'created_at', 'updated_at', 'bike', 'rentee', 'renter', 'amount_paid',
+        'rental_start_time', 'rental_end_time', 'rental_status',
+    ]
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+
+    def get(self, request):
+        """ Handles the GET method """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in self.content_types:
+            return Response({'detail': f"Unsupported output '{output}'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            time_range = _parse_time_range(request.query_params)
+            archived = _parse_bool(request.query_params.get('archived', 'false'))
+        except ValueError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if archived:
+            rows = _archived_history_for_user(request.user, time_range)
         else:
-            history = History.objects.all()
+            history = _history_for_user(request.user).filter(**time_range).values(*self.fields)
+            rows = self.iter_rows(history)
+        lines = self.iter_csv(rows) if output == 'csv' else self.iter_ndjson(rows)
+
+        response = StreamingHttpResponse(lines, content_type=self.content_types[output])
+        response['Content-Disposition'] = f'attachment; filename="history.{output}"'
+        return response
+
+    def iter_rows(self, history):
+        for chunk in iterate_in_chunks(history, chunk_size=self.chunk_size):
+            yield from chunk
+
+    def iter_ndjson(self, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+    def iter_csv(self, rows):
+        buffer = _LineBuffer()
+        writer = csv.DictWriter(buffer, fieldnames=self.fields)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class _LineBuffer:
+    """ File-like object that hands written CSV lines straight back """
+
+    def write(self, value):
+        return value
+
+
+class DailyReportView(APIView):
+    """
+    Returns daily History totals read from the rollup tables only.
+
+    Renters see the totals of their own account and bikes, admins see
+    everything. The rollups trail History by one update_rollups run.
+
+    Query parameters:
+    - by: renter, bike or status (default).
+    - start / end: Optional inclusive day range as YYYY-MM-DD.
+    - rental_status: One of History.EventType.
+    - cursor / page_size: Pagination controls, see KeysetPagination.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    reports = {
+        'renter': (RenterDailyRollup, RenterDailyRollupSerializer),
+        'bike': (BikeDailyRollup, BikeDailyRollupSerializer),
+        'status': (StatusDailyRollup, StatusDailyRollupSerializer),
+    }
+
+    def get(self, request):
+        """ Handles the GET method """
+        params = request.query_params
+        by = params.get('by', 'status')
+        if by not in self.reports:
+            return Response({'detail': f"Unsupported report '{by}'."}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.role == User.Role.RENTEE:
+            return Response({'detail': 'Reports are not available to rentees.'}, status=status.HTTP_403_FORBIDDEN)
+        if request.user.role == User.Role.RENTER and by == 'status':
+            by = 'renter'
+
+        model, serializer_class = self.reports[by]
+        rollups = model.objects.all()
+        if request.user.role == User.Role.RENTER:
+            rollups = rollups.filter(**{'renter_id': request.user.pk} if by == 'renter' else {'bike__owner_id': request.user.pk})
+
+        for param, lookup in (('start', 'day__gte'), ('end', 'day__lte')):
+            if param in params:
+                try:
+                    day = parse_date(params[param])
+                except ValueError:
+                    # Well formed but impossible dates such as 2024-13-01
+                    day = None
+                if day is None:
+                    return Response({'detail': f"'{params[param]}' is not a valid date"}, status=status.HTTP_400_BAD_REQUEST)
+                rollups = rollups.filter(**{lookup: day})
+        rental_status = params.get('rental_status')
+        if rental_status is not None:
+            if rental_status not in History.EventType.values:
+                return Response(
+                    {'detail': f"'{rental_status}' is not a valid rental_status"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rollups = rollups.filter(rental_status=rental_status)
+
+        paginator = KeysetPagination(ordering=('-day', '-id'))
+        page = paginator.paginate_queryset(rollups, request, view=self)
+        return paginator.get_paginated_response(serializer_class(page, many=True).data)
+
 
-        history_serializer = HistorySerializer(history, many=True)
-        return Response(history_serializer.data, status=200)
-    
 class HistoryCreateView(APIView):
-    """ Object for creating, deleting, and updating the History objects in the database """
+    """
+    Object for creating, deleting, and updating the History objects in the database
+
+    POSTing a JSON list instead of an object creates a batch of up to
+    max_batch_size History rows with bulk INSERTs in a single transaction.
+    Invalid items are skipped and reported by index.
+    """
 
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [authentication.TokenAuthentication]
+    max_batch_size = 1000
+    insert_batch_size = 250
+    references = (
+        ('bike', 'bike_id', Bike),
+        ('rentee', 'rentee_id', Rentee),
+        ('renter', 'renter_id', Renter),
+    )
 
+    @idempotent
     def post(self, request):
         """ Handles the POST http method """
+        if isinstance(request.data, list):
+            return self.post_batch(request)
         serializer = HistorySerializer(data=request.data)
         if serializer.is_valid():
             if request.user.role == User.Role.RENTER:
-                serializer.save(renter=request.user)
+                serializer.save(renter_id=request.user.pk)
             if request.user.role == User.Role.RENTEE:
-                serializer.save(rentee=request.user)
+                serializer.save(rentee_id=request.user.pk)
             created_instance = serializer.instance
 
             # Return the serialized data of the created instance
             return Response(HistorySerializer(created_instance).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def post_batch(self, request):
+        """
+        Validates and bulk inserts a list of History payloads.
+
+        Returns:
+        - 201 when every item was created, 207 when only some were and 400
+          when none were, with per-item errors as {"index": i, "errors": {...}}.
+        """
+        if len(request.data) > self.max_batch_size:
+            return Response(
+                {'detail': f'A batch may hold at most {self.max_batch_size} items.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        owner = {}
+        if request.user.role == User.Role.RENTER:
+            owner = {'renter_id': request.user.pk}
+        elif request.user.role == User.Role.RENTEE:
+            owner = {'rentee_id': request.user.pk}
+
+        valid, errors = [], []
+        for index, item in enumerate(request.data):
+            serializer = HistoryBatchItemSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, {**serializer.validated_data, **owner}))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        # Check every referenced bike, rentee and renter with one query per model
+        for name, attname, model in self.references:
+            wanted = {data[attname] for _, data in valid if data.get(attname) is not None}
+            missing = wanted - set(model._base_manager.filter(pk__in=wanted).values_list('pk', flat=True))
+            if not missing:
+                continue
+            remaining = []
+            for index, data in valid:
+                if data.get(attname) in missing:
+                    errors.append({'index': index, 'errors': {name: [f'Invalid pk "{data[attname]}" - object does not exist.']}})
+                else:
+                    remaining.append((index, data))
+            valid = remaining
+
+        with transaction.atomic():
+            created = History.objects.bulk_create(
+                [History(**data) for _, data in valid], batch_size=self.insert_batch_size
+            )
+
+        if not created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'created': HistorySerializer(created, many=True).data,
+            'errors': sorted(errors, key=lambda error: error['index']),
+        }, status=response_status)
+
     def put(self, request, pk):
         """ Handles the PUT http method for updating a History instance """
         history_instance = self.get_object(pk)
@@ -84,4 +552,104 @@ class HistoryCreateView(APIView):
         try:
             return History.objects.get(pk=pk)
         except History.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+
+class NotificationBroadcastView(APIView):
+    """
+    Queues a notification for every user matching a role and/or institution.
+
+    Only admins may broadcast. The notifications are written by a
+    background worker, so the request returns 202 immediately.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        """ Handles the POST http method """
+        if request.user.role != User.Role.ADMIN and not request.user.is_staff:
+            return Response({'detail': 'Only admins can broadcast.'}, status=status.HTTP_403_FORBIDDEN)
+        content = request.data.get('content')
+        role = request.data.get('role')
+        if not content:
+            return Response({'content': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        if role is not None and role not in User.Role.values:
+            return Response({'role': [f"'{role}' is not a valid role."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        broadcast_in_background(content, role=role, institution=request.data.get('institution'))
+        return Response({'detail': 'Broadcast queued.'}, status=status.HTTP_202_ACCEPTED)
+
+
+class NotificationReadView(APIView):
+    """
+    Marks the user's notifications as read in a single UPDATE.
+
+    The body selects the notifications by "ids", by "before" (ISO 8601,
+    everything created earlier), by both, or by neither to mark everything.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        """ Handles the POST http method """
+        ids = request.data.get('ids')
+        before = request.data.get('before')
+        if ids is not None and not isinstance(ids, list):
+            return Response({'ids': ['Expected a list of notification IDs.']}, status=status.HTTP_400_BAD_REQUEST)
+        if before is not None:
+            before = parse_datetime(str(before))
+            if before is None:
+                return Response({'before': ['Expected an ISO 8601 datetime.']}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+        try:
+            updated = Notification.mark_many_as_read(request.user.pk, ids=ids, before=before)
+        except (ValidationError, ValueError):
+            return Response({'ids': ['Expected a list of notification IDs.']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'updated': updated, 'unread': NotificationCounter.get_unread(request.user.pk)})
+
+
+class NotificationUnreadCountView(APIView):
+    """ Returns the user's unread notification count from its counter row """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """ Handles the GET http method """
+        return Response({'unread': NotificationCounter.get_unread(request.user.pk)})
+
+
+def _authenticate(request):
+    """ Runs the DRF authenticators on a plain Django request """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    return drf_request.user
+
+
+class NotificationStreamView(View):
+    """
+    Pushes the user's new notifications as server-sent events.
+
+    This is an async view: served over ASGI (cycle.asgi) each connection is
+    a suspended coroutine waiting on the in-process notification hub rather
+    than a worker thread, so idle clients cost almost nothing. Clients
+    reconnect with Last-Event-ID to receive what they missed.
+    """
+
+    async def get(self, request):
+        """ Handles the GET http method """
+        try:
+            user = await sync_to_async(_authenticate)(request)
+        except exceptions.APIException as error:
+            return JsonResponse({'detail': str(error.detail)}, status=error.status_code)
+        if not user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        response = StreamingHttpResponse(
+            stream_notifications(user.pk, request.headers.get('Last-Event-ID')),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
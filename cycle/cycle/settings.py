@@ -67,7 +67,7 @@ WSGI_APPLICATION = "cycle.wsgi.application"
 # Authentication and Permission Classes for DRF
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
@@ -79,6 +79,82 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=2),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=5),
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.FilteredTokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "users.serializers.FilteredTokenVerifySerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "users.serializers.FilteredTokenBlacklistSerializer",
+    "TOKEN_USER_CLASS": "users.authentication.ClaimsUser",
+}
+
+AUTHENTICATION_BACKENDS = ['users.authentication.PooledModelBackend']
+
+# Bounded pool for password hashing, see users.hashing. WORKERS defaults to
+# the CPU count; logins beyond WORKERS + MAX_QUEUE get a 503.
+PASSWORD_HASHING = {
+    "WORKERS": None,
+    "MAX_QUEUE": 64,
+}
+
+# Maximum age in seconds of the user state token claims are checked against,
+# see users.authentication
+AUTH_CLAIMS_MAX_STALENESS = 60
+
+# In-process Bloom filter of blacklisted token JTIs, see users.blacklist
+TOKEN_BLACKLIST_FILTER = {
+    "CAPACITY": 100000,
+    "ERROR_RATE": 0.001,
+    "REFRESH_INTERVAL": 1.0,
+    "REBUILD_INTERVAL": 3600.0,
+    "LAG": 10.0,
+}
+
+# Buffered History event writes, see components.eventlog
+HISTORY_EVENT_BUFFER = {
+    "ENABLED": getenv('HISTORY_EVENT_BUFFER') == 'on',
+    "MAX_BATCH": 200,
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_QUEUE": 10000,
+    "SPOOL_DIR": BASE_DIR / "var" / "history-spool",
+}
+
+# Compressed daily segments of archived History rows, see components.archive
+HISTORY_ARCHIVE_DIR = BASE_DIR / "var" / "history-archive"
+HISTORY_ARCHIVE_MIN_AGE_DAYS = 365
+
+# How long a rental may reserve wallet money before the sweeper frees it
+WALLET_HOLD_TTL = timedelta(hours=24)
+
+# Idempotency-Key handling, see components.idempotency
+IDEMPOTENCY_TTL = timedelta(hours=24)
+IDEMPOTENCY_CACHE_TTL = 300
+IDEMPOTENCY_WAIT = timedelta(seconds=5)
+# In-flight claims expire after this, so a retry can take over a key whose worker died
+IDEMPOTENCY_LEASE = timedelta(seconds=30)
+
+# Retention of expired tokens, sessions and old rows, see components.retention
+RETENTION = {
+    "BATCH_SIZE": 500,
+    "SLEEP": 0.2,
+    "EXPIRED_TOKENS": timedelta(days=1),
+    "EXPIRED_SESSIONS": timedelta(0),
+    "READ_NOTIFICATIONS": timedelta(days=90),
+    "EXPIRED_IDEMPOTENCY_KEYS": timedelta(0),
+}
+
+# Server-sent notification streams, see components.streams
+NOTIFICATION_STREAM = {
+    "POLL_INTERVAL": 5.0,
+    "POLL_OVERLAP": 5.0,
+    "HEARTBEAT": 15.0,
+    "MAX_AGE": 300.0,
+    "MAX_QUEUE": 100,
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
 }
 
 # Database
@@ -1,14 +1,46 @@
 from django.contrib import admin
 from users.models import User, Renter, Rentee, RenterProfile, RenteeProfile, Administrator
 from django.contrib.auth.admin import UserAdmin
+from common.pagination import EstimatedCountPaginator
+from users.loaders import get_profile, with_role_relations
 
 
-class UserAdminConfig(UserAdmin):
+class LargeTableAdminMixin:
+    """
+    Changelist settings for tables with millions of rows: the page count is
+    estimated from table statistics when unfiltered and the extra COUNT(*)
+    of the whole table behind "N total" is skipped.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    search_fields = ('email', 'username', 'first_name', 'role')
-    list_filter = ('email', 'username', 'first_name', 'last_name', 'role', 'is_active')
+
+class RoleProfileAdminMixin:
+    """
+    Shows the profile id of each user on the changelist, read through the
+    role loader from relations joined by get_queryset() so a page costs one
+    query however many roles it mixes.
+    """
+
+    @admin.display(description='Profile ID')
+    def profile_id(self, user):
+        profile = get_profile(user)
+        if isinstance(profile, RenterProfile):
+            return profile.renter_id
+        if isinstance(profile, RenteeProfile):
+            return profile.rentee_id
+        return None
+
+
+class UserAdminConfig(RoleProfileAdminMixin, LargeTableAdminMixin, UserAdmin):
+
+    search_fields = ('^email', '^username', '^first_name')
+    list_filter = ('role', 'is_active')
     ordering = ('-last_login',)
-    list_display = ('first_name', 'last_name', 'username', 'email', 'is_active', 'is_superuser', 'role')
+    list_display = ('first_name', 'last_name', 'username', 'email', 'is_active', 'is_superuser', 'role', 'profile_id')
+
+    def get_queryset(self, request):
+        return with_role_relations(super().get_queryset(request))
 
     fieldsets = (
         (None, {'fields': ('username','first_name', 'last_name', 'password')}),
@@ -26,12 +58,15 @@ class UserAdminConfig(UserAdmin):
          })
     )
 
-class RenterAdminConfig(UserAdmin):
+class RenterAdminConfig(RoleProfileAdminMixin, LargeTableAdminMixin, UserAdmin):
 
-    search_fields = ('email', 'username', 'first_name', 'role')
-    list_filter = ('email', 'username', 'first_name', 'last_name', 'role', 'is_active')
+    search_fields = ('^email', '^username', '^first_name')
+    list_filter = ('role', 'is_active')
     ordering = ('-last_login',)
-    list_display = ('first_name', 'last_name', 'username', 'email', 'is_active', 'is_superuser', 'role')
+    list_display = ('first_name', 'last_name', 'username', 'email', 'is_active', 'is_superuser', 'role', 'profile_id')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('renterprofile')
 
     fieldsets = (
         (None, {'fields': ('username','first_name', 'last_name', 'password', 'phone_number')}),
@@ -57,12 +92,15 @@ class RenterAdminConfig(UserAdmin):
          }),
     )
 
-class RenteeAdminConfig(UserAdmin):
+class RenteeAdminConfig(RoleProfileAdminMixin, LargeTableAdminMixin, UserAdmin):
 
-    search_fields = ('email', 'username', 'first_name', 'role')
-    list_filter = ('email', 'username', 'first_name', 'last_name', 'role', 'is_active')
+    search_fields = ('^email', '^username', '^first_name')
+    list_filter = ('role', 'is_active')
     ordering = ('-last_login',)
-    list_display = ('first_name', 'last_name', 'username', 'email', 'is_active', 'is_superuser', 'role')
+    list_display = ('first_name', 'last_name', 'username', 'email', 'is_active', 'is_superuser', 'role', 'profile_id')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('renteeprofile')
 
     fieldsets = (
         (None, {'fields': ('username','first_name', 'last_name', 'password')}),
@@ -81,13 +119,21 @@ class RenteeAdminConfig(UserAdmin):
     )
 
 
-class RenterProfileAdminConfig(UserAdmin):
+class RenterProfileAdminConfig(admin.ModelAdmin):
     search_fields = ('user__username','renter_id')
     list_display = ('user','renter_id', 'max_rent_streak')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+
+class RenteeProfileAdminConfig(admin.ModelAdmin):
+    search_fields = ('user__username','rentee_id')
+    list_display = ('user','rentee_id')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
 
 admin.site.register(User, UserAdminConfig)
 admin.site.register(Rentee, RenteeAdminConfig)
 admin.site.register(Renter, RenterAdminConfig)
 admin.site.register(Administrator)
-admin.site.register(RenterProfile)
-admin.site.register(RenteeProfile)
+admin.site.register(RenterProfile, RenterProfileAdminConfig)
+admin.site.register(RenteeProfile, RenteeProfileAdminConfig)
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from . import hashing
+from .models import User
+
+# User columns copied into the tokens and checked against the database
+CLAIMS = ('role', 'is_active', 'is_staff', 'is_superuser')
+
+
+def add_claims(token, user):
+    """
+    Copies the user's role and status into a token.
+
+    Parameters:
+    - token: RefreshToken or AccessToken, access tokens minted from a
+      refresh token inherit its claims.
+    - user: User the token is issued for.
+
+    Returns:
+    - The token.
+    """
+    for claim in CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def get_state_key(user_id):
+    return f'auth-claims:{user_id}'
+
+
+def get_user_state(user_id):
+    """
+    Returns the current claims of a user, read at most once per
+    AUTH_CLAIMS_MAX_STALENESS seconds per process.
+
+    Returns:
+    - Dict of CLAIMS, or None if the user does not exist.
+    """
+    key = get_state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = User.objects.filter(pk=user_id).values(*CLAIMS).first() or {}
+        cache.set(key, state, settings.AUTH_CLAIMS_MAX_STALENESS)
+    return state or None
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the token claims, without a database row.
+
+    Exposes id, pk, role, is_active, is_staff and is_superuser, which is
+    what the views branch on. Filter by request.user.pk, not request.user,
+    since this is not a model instance.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    @cached_property
+    def is_active(self):
+        return self.token['is_active']
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication that trusts the role and status claims of the token.
+
+    Instead of loading the User row on every request, the claims are
+    compared with a per-process cached copy of the user's current state that
+    is at most AUTH_CLAIMS_MAX_STALENESS seconds old, and dropped at once
+    when the user is saved in this process. Deactivating a user or changing
+    their role therefore revokes their tokens within that bound. Tokens
+    issued before the claims existed are authenticated against the database
+    as before.
+    """
+
+    def get_user(self, validated_token):
+        """
+        Returns a ClaimsUser for tokens carrying the claims.
+
+        Raises:
+        - AuthenticationFailed: If the user was deleted, deactivated or
+          their claims changed since the token was issued.
+        """
+        if any(claim not in validated_token for claim in CLAIMS):
+            return JWTAuthentication.get_user(self, validated_token)
+        user = ClaimsUser(validated_token)
+        state = get_user_state(user.pk)
+        if state is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not state['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if any(state[claim] != validated_token[claim] for claim in CLAIMS):
+            raise AuthenticationFailed('Token claims are out of date, log in again', code='stale_claims')
+        return user
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend verifying passwords on the bounded hashing pool.
+
+    Raises HashingOverloaded (503) instead of queueing without bound when
+    too many logins are being verified at once.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown and known accounts take as long (#20760)
+            hashing.make_password(password)
+            return None
+
+        def setter(raw_password):
+            user.password = hashing.make_password(raw_password)
+            user.save(update_fields=['password'])
+
+        if hashing.check_password(password, user.password, setter) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def forget_user_state(sender, instance, **kwargs):
+    """ Drops the cached claims of a changed user, Renter and Rentee included """
+    if isinstance(instance, User):
+        cache.delete(get_state_key(instance.pk))
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from common.conf import LazyInstance
+from common.pagination import iterate_in_chunks
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CAPACITY': 100000,
+    'ERROR_RATE': 0.001,
+    'REFRESH_INTERVAL': 1.0,
+    'REBUILD_INTERVAL': 3600.0,
+    'LAG': 10.0,
+}
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter of strings.
+
+    Membership tests never give false negatives; false positives happen at
+    about error_rate while no more than capacity items were added.
+
+    Attributes:
+    - capacity: Number of items the filter is sized for.
+    - error_rate: Target false positive rate at capacity.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        # Double hashing, h1 + i * h2, over one 128 bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class FilterState:
+    """
+    Bloom filter of the blacklisted JTIs read up to a BlacklistedToken id.
+
+    Attributes:
+    - bloom: BloomFilter of the JTIs.
+    - last_id: Highest id below which every row is loaded for good.
+    - max_id: Highest id loaded.
+    - count: Number of distinct rows loaded.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.last_id = self.max_id = self.count = 0
+
+    def load(self, lag):
+        """ Adds the blacklisted JTIs past the last id to the filter """
+        horizon = timezone.now() - lag
+        settled = True
+        rows = BlacklistedToken.objects.filter(id__gt=self.last_id).values('id', 'token__jti', 'blacklisted_at')
+        for chunk in iterate_in_chunks(rows, ordering=('id',), chunk_size=5000):
+            for row in chunk:
+                self.bloom.add(row['token__jti'])
+                if row['id'] > self.max_id:
+                    self.max_id = row['id']
+                    self.count += 1
+                settled = settled and row['blacklisted_at'] < horizon
+                if settled:
+                    self.last_id = row['id']
+
+
+class JTIFilter:
+    """
+    In-process Bloom filter of blacklisted token JTIs.
+
+    The filter is refreshed incrementally, at most every refresh_interval
+    seconds, by reading the BlacklistedToken rows past the highest id seen.
+    Rows younger than lag are read again on the next refresh because
+    transactions still in flight may commit lower ids behind them. A caller
+    that finds another thread refreshing checks against the current filter
+    instead of waiting.
+
+    The filter is built on first use, then every rebuild_interval seconds
+    or when it is over capacity, so purged tokens drop out. Builds read the
+    whole table on a background thread and swap the new filter in under the
+    lock, together with the JTIs add()ed meanwhile; until the first one
+    finishes every check goes to the database.
+
+    A JTI the filter does not contain is certainly not blacklisted, which
+    answers almost every check without a query; probable hits are confirmed
+    against the database.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, refresh_interval=1.0, rebuild_interval=3600.0, lag=10.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.lag = timedelta(seconds=lag)
+        self.lock = threading.Lock()
+        self.state = None
+        # JTIs added while a rebuild runs, None when no rebuild runs
+        self.added = None
+        self.refreshed_at = self.rebuilt_at = 0.0
+
+    def rebuild(self):
+        """ Loads every blacklisted JTI into a new filter and swaps it in """
+        with self.lock:
+            if self.added is None:
+                self.added = set()
+        try:
+            total = BlacklistedToken.objects.count()
+            state = FilterState(max(self.capacity, total * 2), self.error_rate)
+            state.load(self.lag)
+            with self.lock:
+                for jti in self.added:
+                    state.bloom.add(jti)
+                self.state = state
+                self.refreshed_at = self.rebuilt_at = time.monotonic()
+        finally:
+            with self.lock:
+                self.added = None
+
+    def run_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Rebuilding the JTI filter failed')
+        finally:
+            connection.close()
+
+    def start_rebuild(self):
+        """ Starts a rebuild on a background thread, the lock must be held """
+        if self.added is not None:
+            return
+        self.added = set()
+        self.rebuilt_at = time.monotonic()
+        threading.Thread(target=self.run_rebuild, name='jti-filter-rebuild', daemon=True).start()
+
+    def refresh(self):
+        """ Brings the filter up to date if it is due """
+        now = time.monotonic()
+        if now - self.refreshed_at < self.refresh_interval or not self.lock.acquire(blocking=False):
+            return
+        try:
+            state = self.state
+            if state is None or now - self.rebuilt_at >= self.rebuild_interval or state.count > state.bloom.capacity:
+                self.start_rebuild()
+            if state is not None:
+                state.load(self.lag)
+            self.refreshed_at = now
+        finally:
+            self.lock.release()
+
+    def add(self, jti):
+        """ Records a JTI blacklisted by this process without waiting for a refresh """
+        with self.lock:
+            if self.state is not None:
+                self.state.bloom.add(jti)
+            if self.added is not None:
+                self.added.add(jti)
+
+    def is_blacklisted(self, jti):
+        """
+        Checks a JTI against the blacklist.
+
+        Returns:
+        - True if the JTI is blacklisted.
+        """
+        self.refresh()
+        state = self.state
+        if state is not None and jti not in state.bloom:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+_filter = LazyInstance('TOKEN_BLACKLIST_FILTER', DEFAULTS, lambda config: JTIFilter(
+    capacity=config['CAPACITY'],
+    error_rate=config['ERROR_RATE'],
+    refresh_interval=config['REFRESH_INTERVAL'],
+    rebuild_interval=config['REBUILD_INTERVAL'],
+    lag=config['LAG'],
+))
+
+
+def get_jti_filter():
+    """ Returns the process-wide JTIFilter configured by TOKEN_BLACKLIST_FILTER """
+    return _filter.get()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """ RefreshToken whose blacklist check goes through the JTI filter """
+
+    def check_blacklist(self):
+        if get_jti_filter().is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        result = super().blacklist()
+        get_jti_filter().add(self.payload[api_settings.JTI_CLAIM])
+        return result
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from common.conf import LazyInstance
+
+DEFAULTS = {
+    'WORKERS': None,
+    'MAX_QUEUE': 64,
+}
+
+
+class HashingOverloaded(APIException):
+    """ Raised when more password hashes are waiting than the pool accepts """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, please retry shortly.'
+    default_code = 'hashing_overloaded'
+    # Rendered as a Retry-After header by the DRF exception handler
+    wait = 1
+
+
+class HashingPool:
+    """
+    Bounded thread pool running password hashing and verification.
+
+    The PBKDF2 hasher releases the GIL, so workers hash in parallel while the
+    request threads or event loop that submitted the work just wait. At most
+    workers hashes run at once and at most max_queue more may wait; beyond
+    that submit() raises HashingOverloaded, which DRF turns into a 503, so a
+    burst of logins is shed instead of pinning every request worker.
+
+    Attributes:
+    - workers: Number of hashing threads, defaults to the CPU count.
+    - max_queue: Number of hashes allowed to wait for a thread.
+    """
+
+    def __init__(self, workers=None, max_queue=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hashing')
+        self.slots = threading.BoundedSemaphore(self.workers + max_queue)
+
+    def submit(self, function, *args):
+        """
+        Queues a call on the pool.
+
+        Returns:
+        - concurrent.futures.Future of the call.
+
+        Raises:
+        - HashingOverloaded: If the queue is full.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise HashingOverloaded()
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def run(self, function, *args):
+        """ Runs a call on the pool and waits for its result """
+        return self.submit(function, *args).result()
+
+    async def arun(self, function, *args):
+        """ Runs a call on the pool without blocking the event loop """
+        return await asyncio.wrap_future(self.submit(function, *args))
+
+
+_pool = LazyInstance(
+    'PASSWORD_HASHING', DEFAULTS, lambda config: HashingPool(workers=config['WORKERS'], max_queue=config['MAX_QUEUE'])
+)
+
+
+def get_hashing_pool():
+    """ Returns the process-wide HashingPool configured by PASSWORD_HASHING """
+    return _pool.get()
+
+
+def must_update(encoded):
+    """ Returns whether a hash should be upgraded to the preferred hasher """
+    preferred = hashers.get_hasher()
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def make_password(password):
+    """ Pooled counterpart of django.contrib.auth.hashers.make_password """
+    return get_hashing_pool().run(hashers.make_password, password)
+
+
+def check_password(password, encoded, setter=None):
+    """
+    Pooled counterpart of django.contrib.auth.hashers.check_password.
+
+    The setter, which saves an upgraded hash, runs on the calling thread so
+    pool threads never touch the database.
+    """
+    is_correct = get_hashing_pool().run(hashers.check_password, password, encoded)
+    if setter and is_correct and must_update(encoded):
+        setter(password)
+    return is_correct
+
+
+async def amake_password(password):
+    """ Awaitable make_password() for async views """
+    return await get_hashing_pool().arun(hashers.make_password, password)
+
+
+async def acheck_password(password, encoded):
+    """ Awaitable check_password() for async views, without hash upgrades """
+    return await get_hashing_pool().arun(hashers.check_password, password, encoded)
@@ -0,0 +1,125 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404
+
+from .models import User, Renter, Rentee, Administrator
+
+# Role -> (child model, reverse accessor on User, profile relation on the child)
+ROLE_MODELS = {
+    User.Role.RENTER: (Renter, 'renter', 'renterprofile'),
+    User.Role.RENTEE: (Rentee, 'rentee', 'renteeprofile'),
+    User.Role.ADMIN: (Administrator, 'administrator', None),
+}
+
+# select_related() paths reaching every child row and profile from User
+USER_RELATIONS = ('renter__renterprofile', 'rentee__renteeprofile', 'administrator')
+
+
+def get_role_queryset(role):
+    """
+    Returns the queryset loading the child model of a role with its profile.
+
+    Parameters:
+    - role: User.Role value.
+
+    Returns:
+    - Queryset of Renter, Rentee or Administrator rows, or of User rows for
+      an unknown role.
+    """
+    if role not in ROLE_MODELS:
+        return User.objects.all()
+    model, _, profile = ROLE_MODELS[role]
+    queryset = model.objects.all()
+    return queryset.select_related(profile) if profile else queryset
+
+
+def with_role_relations(queryset):
+    """
+    Joins the child rows and profiles of every role onto a User queryset,
+    so downcast() on its rows needs no further queries.
+    """
+    return queryset.select_related(*USER_RELATIONS)
+
+
+def downcast(user):
+    """
+    Returns the child instance of a User loaded by with_role_relations().
+
+    Returns:
+    - Renter, Rentee or Administrator instance, or the user itself when it
+      has no child row.
+    """
+    if user.role not in ROLE_MODELS:
+        return user
+    model, accessor, _ = ROLE_MODELS[user.role]
+    if isinstance(user, model):
+        return user
+    try:
+        return getattr(user, accessor)
+    except model.DoesNotExist:
+        return user
+
+
+def get_profile(user):
+    """
+    Returns the RenterProfile or RenteeProfile of a user.
+
+    Free for users loaded by get_role_queryset() or with_role_relations(),
+    otherwise it costs the queries of the missing relations.
+
+    Returns:
+    - Profile instance, or None for roles without one or a missing profile.
+    """
+    user = downcast(user)
+    if user.role not in ROLE_MODELS:
+        return None
+    model, _, profile = ROLE_MODELS[user.role]
+    if profile is None or not isinstance(user, model):
+        return None
+    try:
+        return getattr(user, profile)
+    except ObjectDoesNotExist:
+        return None
+
+
+def load_role_user(user_id, role=None):
+    """
+    Loads a user as its role's child model, with its profile, in one query.
+
+    Parameters:
+    - user_id: Primary key of the user.
+    - role: The user's role if already known, e.g. from the token claims,
+      which narrows the query to that child table.
+
+    Returns:
+    - Renter, Rentee or Administrator instance with its profile cached.
+
+    Raises:
+    - User.DoesNotExist: If the user does not exist.
+    """
+    if role in ROLE_MODELS:
+        try:
+            return get_role_queryset(role).get(pk=user_id)
+        except ROLE_MODELS[role][0].DoesNotExist:
+            # The role changed or the child row is missing, look it up
+            pass
+    return downcast(with_role_relations(User.objects.all()).get(pk=user_id))
+
+
+def get_role_user(request):
+    """
+    Returns the authenticated user as its role's child model with profile,
+    loading it at most once per request.
+
+    Parameters:
+    - request: DRF or Django request of an authenticated user.
+
+    Raises:
+    - Http404: If the user no longer exists.
+    """
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, '_role_user'):
+        try:
+            http_request._role_user = load_role_user(request.user.pk, getattr(request.user, 'role', None))
+        except User.DoesNotExist:
+            raise Http404('User not found')
+    return http_request._role_user
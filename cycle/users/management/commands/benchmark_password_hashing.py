@@ -0,0 +1,54 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+
+from users import hashing
+
+
+class Command(BaseCommand):
+    """
+    Measures password verifications per second, the CPU bound part of a
+    login, inline on one thread and through the hashing pool with many
+    concurrent callers. Uses the configured default hasher and no database.
+    """
+    help = "Benchmarks logins per second per core"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200,
+                            help='Number of verifications per run')
+        parser.add_argument('--callers', type=int, default=None,
+                            help='Concurrent callers, defaults to twice the pool size')
+
+    def handle(self, *args, **options):
+        logins = options['logins']
+        pool = hashing.get_hashing_pool()
+        callers = options['callers'] or pool.workers * 2
+        cores = min(pool.workers, os.cpu_count() or 1)
+        encoded = hashers.make_password('benchmark-password')
+        self.stdout.write(f'{hashers.get_hasher().algorithm}, {pool.workers} pool workers, {cores} cores')
+
+        started = time.perf_counter()
+        for _ in range(logins):
+            hashers.check_password('benchmark-password', encoded)
+        inline = logins / (time.perf_counter() - started)
+        self.stdout.write(f'inline: {inline:.1f} logins/s on 1 core')
+
+        rejected = 0
+        def login(_):
+            nonlocal rejected
+            try:
+                hashing.check_password('benchmark-password', encoded)
+            except hashing.HashingOverloaded:
+                rejected += 1
+
+        with ThreadPoolExecutor(max_workers=callers) as callers_pool:
+            started = time.perf_counter()
+            list(callers_pool.map(login, range(logins)))
+            pooled = (logins - rejected) / (time.perf_counter() - started)
+        self.stdout.write(
+            f'pool: {pooled:.1f} logins/s, {pooled / cores:.1f} logins/s/core '
+            f'with {callers} callers, {rejected} rejected'
+        )
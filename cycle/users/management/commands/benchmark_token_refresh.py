@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from users import blacklist
+from users.models import User
+from users.serializers import ClaimsTokenObtainPairSerializer, FilteredTokenRefreshSerializer
+
+
+class Command(BaseCommand):
+    """
+    Measures token refreshes per second with the blacklist checked in the
+    database and through the in-process JTI filter.
+
+    The blacklist is filled with --blacklisted fake tokens inside a
+    transaction that is rolled back at the end, so nothing is left behind.
+    """
+    help = "Benchmarks token refresh throughput with and without the JTI filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blacklisted', type=int, default=100000,
+                            help='Number of blacklisted tokens to create')
+        parser.add_argument('--refreshes', type=int, default=2000,
+                            help='Number of refreshes per run')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.fill_blacklist(options['blacklisted'])
+            user = User.objects.filter(is_active=True).first()
+            if user is None:
+                user = User.objects.create_user(f'{uuid4().hex}@benchmark.invalid', uuid4().hex, 'Benchmark', None)
+            refresh = str(ClaimsTokenObtainPairSerializer.get_token(user))
+
+            # Built on this thread, a background build would not see the uncommitted rows
+            jti_filter = blacklist.JTIFilter()
+            jti_filter.rebuild()
+            blacklist._filter.reset(jti_filter)
+            for name, serializer_class in (
+                ('database', TokenRefreshSerializer),
+                ('jti filter', FilteredTokenRefreshSerializer),
+            ):
+                self.run(name, serializer_class, refresh, options['refreshes'])
+            transaction.set_rollback(True)
+        blacklist._filter.reset()
+
+    def fill_blacklist(self, count, batch_size=5000):
+        expires_at = timezone.now() + timedelta(days=5)
+        for start in range(0, count, batch_size):
+            tokens = OutstandingToken.objects.bulk_create([
+                OutstandingToken(jti=uuid4().hex, token='', expires_at=expires_at)
+                for _ in range(min(batch_size, count - start))
+            ])
+            jtis = [token.jti for token in tokens]
+            ids = OutstandingToken.objects.filter(jti__in=jtis).values_list('id', flat=True)
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=token_id) for token_id in ids])
+
+    def run(self, name, serializer_class, refresh, refreshes):
+        # Warm up, this also loads the JTI filter
+        serializer_class(data={'refresh': refresh}).is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(refreshes):
+                serializer_class(data={'refresh': refresh}).is_valid(raise_exception=True)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name}: {refreshes / elapsed:.0f} refreshes/s, '
+            f'{len(queries) / refreshes:.2f} queries per refresh'
+        )
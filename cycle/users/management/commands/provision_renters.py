@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.provisioning import provision_renters
+
+
+class Command(BaseCommand):
+    """
+    Onboards an institution's Renters from a CSV file in batches, see
+    users.provisioning.provision_renters for the columns.
+    """
+    help = "Bulk creates Renters from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--institution', default=None,
+                            help='Institution of every renter, overrides the CSV column')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of renters created per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as csv_file:
+                result = provision_renters(
+                    csv_file, institution=options['institution'], batch_size=options['batch_size']
+                )
+        except OSError as error:
+            raise CommandError(str(error))
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(f"Created {result['created']} renters, skipped {result['skipped']}"))
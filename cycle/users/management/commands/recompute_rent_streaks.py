@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from users.streaks import recompute_rent_streaks
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the current and max rent streaks of every renter from the
+    Rent table in one sorted, chunked pass, e.g. after backdated rentals or
+    to repair streaks written by the old per-rent recount.
+    """
+    help = "Recomputes every renter's rent streaks from their rentals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of rows read per query and profiles written per UPDATE')
+
+    def handle(self, *args, **options):
+        result = recompute_rent_streaks(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {result['checked']} renter profiles, updated {result['updated']}"
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:26
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_delete_rentee_rentee_alter_renteeprofile_user"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="administrator",
+            managers=[
+                ("admin_manager", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["role", "id"], name="user_role_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["role", "last_login"], name="user_role_last_login_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["last_login"], name="user_last_login_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["first_name"], name="user_first_name_idx"),
+        ),
+    ]
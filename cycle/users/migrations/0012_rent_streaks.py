@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_user_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="renterprofile",
+            name="current_rent_streak",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="rent",
+            index=models.Index(
+                fields=["renter", "rental_date"], name="rent_renter_date_idx"
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -96,6 +98,14 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'username']
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['role', 'id'], name='user_role_id_idx'),
+            models.Index(fields=['role', 'last_login'], name='user_role_last_login_idx'),
+            models.Index(fields=['last_login'], name='user_last_login_idx'),
+            models.Index(fields=['first_name'], name='user_first_name_idx'),
+        ]
+
     def has_permission(self, request, view):
         """
         Check if the user has permission for a specific view action.
@@ -180,6 +190,11 @@ class Rent(models.Model):
     renter = models.ForeignKey(User, on_delete=models.CASCADE)
     rental_date = models.DateField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['renter', 'rental_date'], name='rent_renter_date_idx'),
+        ]
+
 
 class RenterProfile(models.Model):
     """
@@ -189,6 +204,7 @@ class RenterProfile(models.Model):
     user = models.OneToOneField(Renter, on_delete=models.CASCADE)
     renter_id = models.CharField(max_length=60, unique=True)
     last_rent_date = models.DateField(null=True, blank=True)
+    current_rent_streak = models.IntegerField(default=0)
     max_rent_streak = models.IntegerField(default=0)
 
     def __str__(self):
@@ -213,40 +229,43 @@ def create_renter_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Rent)
 def update_rent_streak_on_rent(sender, instance, created, **kwargs):
     """
-    Signal receiver to update the rent streak on the RenterProfile when a new Rent is created.
+    Signal receiver to update the rent streaks on the RenterProfile when a new Rent is created.
     """
-    if created and instance.role == User.Role.RENTER:
-        renter_profile = RenterProfile.objects.get(user=instance.renter)
-        update_rent_streak(renter_profile)
+    if created:
+        update_rent_streak(instance.renter_id, instance.rental_date)
 
 
-def update_rent_streak(renter_profile):
+def update_rent_streak(renter_id, rental_date):
     """
-    Update the renter's rent streak based on the rental history.
+    Update a renter's current and max rent streaks for a new rental day,
+    in a single UPDATE.
 
-    If the renter has rented consecutively, increment the streak; otherwise, reset it.
+    A rental the day after last_rent_date extends the current streak, any
+    later day starts a new streak of 1. Rentals on or before last_rent_date
+    (same day repeats, backdated rows) leave the profile untouched;
+    recompute_rent_streaks rebuilds streaks from every Rent when needed.
 
     Parameters:
-    - renter_profile: RenterProfile instance.
+    - renter_id: ID of the renting user.
+    - rental_date: Date of the rental.
 
     Returns:
-    - None
+    - Number of profiles updated, 0 or 1.
     """
-    today = renter_profile.last_rent_date
-
-    if not today or today != renter_profile.last_rent_date:
-        # If no previous rent date or today is different from the last rent date, set streak to 1
-        renter_profile.max_rent_streak = 1
-    else:
-        yesterday = today - timedelta(days=1)
-        if yesterday == renter_profile.last_rent_date:
-            # If yesterday is the last rent date, increment the streak
-            renter_profile.max_rent_streak += 1
-        else:
-            # If there is a gap in rental history, reset the streak to 0
-            renter_profile.max_rent_streak = 0
-
-    renter_profile.save()
+    current = Case(
+        When(last_rent_date=rental_date - timedelta(days=1), then=F('current_rent_streak') + 1),
+        default=Value(1),
+    )
+    # MySQL applies SET assignments left to right, each seeing the previous
+    # ones, so the columns the others read from are assigned last.
+    return RenterProfile.objects.filter(
+        Q(last_rent_date__lt=rental_date) | Q(last_rent_date__isnull=True),
+        user_id=renter_id,
+    ).update(
+        max_rent_streak=Greatest(F('max_rent_streak'), current),
+        current_rent_streak=current,
+        last_rent_date=rental_date,
+    )
 
 
 class RenteeManager(BaseUserManager):
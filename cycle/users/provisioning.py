@@ -0,0 +1,155 @@
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from django.contrib.auth import hashers
+from django.db import IntegrityError, connection, transaction
+
+from .models import User, Renter, RenterProfile
+from .serializers import RenterProvisionSerializer
+
+# Renter child table columns written next to user_ptr_id
+RENTER_FIELDS = ('institution', 'phone_number', 'registration_number')
+
+
+def provision_renters(stream, institution=None, batch_size=1000, max_errors=100):
+    """
+    Creates Renters, their child rows and profiles from a CSV stream.
+
+    The CSV needs a header with email, first_name, phone_number and
+    registration_number, plus institution unless one is passed in.
+    username and last_name are optional. Passwords are taken pre-hashed
+    from a password_hash column, hashed in parallel from a password column,
+    or otherwise left unusable until the renter sets one.
+
+    Rows are read and validated one batch at a time and every batch is
+    written in one transaction with a bulk INSERT per table, without the
+    per-row post_save signals of Renter.save(). Emails and usernames are
+    lowercased, and rows whose email or username already exists are
+    skipped. A batch that still hits a unique constraint, e.g. because of a
+    concurrent signup, is rolled back and all its rows reported as errors.
+
+    Parameters:
+    - stream: Text file object of the CSV.
+    - institution: Institution of every row, overriding the column.
+    - batch_size: Number of rows written per transaction.
+    - max_errors: Number of row errors reported, later ones are only counted.
+
+    Returns:
+    - Dict with the created and skipped counts and the row errors as
+      {"line": n, "errors": {...}}.
+    """
+    result = {'created': 0, 'skipped': 0, 'errors': []}
+    batch = []
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        if institution:
+            row['institution'] = institution
+        serializer = RenterProvisionSerializer(data=row)
+        if not serializer.is_valid():
+            report_error(result, line, serializer.errors, max_errors)
+            continue
+        batch.append((line, serializer.validated_data))
+        if len(batch) == batch_size:
+            write_batch(batch, result, max_errors)
+            batch = []
+    if batch:
+        write_batch(batch, result, max_errors)
+    return result
+
+
+def report_error(result, line, errors, max_errors):
+    result['skipped'] += 1
+    if len(result['errors']) < max_errors:
+        result['errors'].append({'line': line, 'errors': errors})
+
+
+def write_batch(batch, result, max_errors):
+    """
+    Drops duplicate rows of a batch, then inserts the rest.
+
+    The emails and usernames of the batch are already lowercased. Existing
+    users are matched with IN lookups that stay on the unique indexes; they
+    are case-insensitive under the *_ci collations of the MySQL database.
+    """
+    emails = {data['email'] for _, data in batch}
+    usernames = {data['username'] for _, data in batch}
+    taken_emails = {email.lower() for email in User.objects.filter(email__in=emails).values_list('email', flat=True)}
+    taken_usernames = {
+        username.lower() for username in User.objects.filter(username__in=usernames).values_list('username', flat=True)
+    }
+
+    lines, rows = [], []
+    for line, data in batch:
+        if data['email'] in taken_emails:
+            report_error(result, line, {'email': ['A user with this email already exists.']}, max_errors)
+        elif data['username'] in taken_usernames:
+            report_error(result, line, {'username': ['A user with this username already exists.']}, max_errors)
+        else:
+            taken_emails.add(data['email'])
+            taken_usernames.add(data['username'])
+            lines.append(line)
+            rows.append(data)
+    if not rows:
+        return
+    try:
+        insert_renters(rows)
+    except IntegrityError:
+        for line in lines:
+            report_error(
+                result, line, {'non_field_errors': ['A user with this email or username already exists.']}, max_errors
+            )
+        return
+    result['created'] += len(rows)
+
+
+def hash_passwords(rows):
+    """
+    Returns the password column of the rows.
+
+    Raw passwords are hashed on a pool of their own, one thread per core,
+    so an import does not queue ahead of logins on the shared hashing pool.
+    """
+    raw = [index for index, data in enumerate(rows) if not data.get('password_hash') and data.get('password')]
+    passwords = [data.get('password_hash') or hashers.make_password(None) for data in rows]
+    if raw:
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='provisioning') as executor:
+            hashed = executor.map(hashers.make_password, [rows[index]['password'] for index in raw])
+            for index, password in zip(raw, hashed):
+                passwords[index] = password
+    return passwords
+
+
+def insert_renters(rows):
+    """
+    Inserts User, Renter and RenterProfile rows for validated data.
+
+    bulk_create() does not support multi-table inheritance, so the User rows
+    are bulk inserted, their ids read back by email (MySQL does not return
+    them), and the Renter child rows inserted with executemany().
+    """
+    passwords = hash_passwords(rows)
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(
+                email=data['email'], username=data['username'], first_name=data['first_name'],
+                last_name=data.get('last_name', ''), password=password, role=User.Role.RENTER, is_active=True,
+            )
+            for data, password in zip(rows, passwords)
+        ])
+        ids = dict(User.objects.filter(email__in=[data['email'] for data in rows]).values_list('email', 'id'))
+
+        meta = Renter._meta
+        columns = [meta.get_field('user_ptr').column] + [meta.get_field(name).column for name in RENTER_FIELDS]
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(meta.db_table), ', '.join(quote(column) for column in columns), ', '.join(['%s'] * len(columns))
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [ids[data['email']]] + [data[name] for name in RENTER_FIELDS] for data in rows
+            ])
+
+        RenterProfile.objects.bulk_create([
+            RenterProfile(user_id=ids[data['email']], renter_id=str(uuid4()), max_rent_streak=0) for data in rows
+        ])
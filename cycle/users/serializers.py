@@ -1,20 +1,116 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer, TokenObtainPairSerializer, TokenRefreshSerializer, TokenVerifySerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from .authentication import add_claims
+from .blacklist import FilteredRefreshToken, get_jti_filter
+from .loaders import get_profile
 from .models import User, Renter, Rent, RenterProfile, Rentee, RenteeProfile
 
 class UserSerializer(serializers.ModelSerializer):
+    """
+    Serializes users with the id of their role's profile.
+
+    profile_id is read through the role loader, so querysets built with
+    users.loaders.with_role_relations() serialize without extra queries.
+    """
     password = serializers.CharField(write_only=True)
+    profile_id = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = '__all__'
 
+    def get_profile_id(self, user):
+        profile = get_profile(user)
+        if isinstance(profile, RenterProfile):
+            return profile.renter_id
+        if isinstance(profile, RenteeProfile):
+            return profile.rentee_id
+        return None
+
 class RenterSerializer(serializers.ModelSerializer):
+    """
+    Serializes Renters with their profile.
+
+    Pair it with users.loaders.get_role_queryset(User.Role.RENTER), which
+    joins the profile in the same query.
+    """
     password = serializers.CharField(write_only=True)
-    
+    renter_id = serializers.CharField(source='renterprofile.renter_id', read_only=True)
+    current_rent_streak = serializers.IntegerField(source='renterprofile.current_rent_streak', read_only=True)
+    max_rent_streak = serializers.IntegerField(source='renterprofile.max_rent_streak', read_only=True)
+
     class Meta:
         model = Renter
         fields = ['id', 'first_name', 'last_name', 'username', 'email', 'password',
-                  'institution', 'registration_number', 'phone_number', 'role']
+                  'institution', 'registration_number', 'phone_number', 'role',
+                  'renter_id', 'current_rent_streak', 'max_rent_streak']
+
+class RenterProvisionSerializer(serializers.Serializer):
+    """
+    Validates one CSV row of a bulk Renter import.
+
+    Uniqueness is not checked here, the import checks a whole batch of
+    emails and usernames with one query each, see users.provisioning.
+    """
+    email = serializers.EmailField(max_length=254)
+    username = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    first_name = serializers.CharField(max_length=255)
+    last_name = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    institution = serializers.CharField(max_length=255)
+    phone_number = serializers.CharField(max_length=10)
+    registration_number = serializers.CharField(max_length=255)
+    password = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    password_hash = serializers.CharField(max_length=128, required=False, allow_blank=True)
+
+    def validate_password_hash(self, value):
+        if value:
+            try:
+                hashers.identify_hasher(value)
+            except ValueError:
+                raise serializers.ValidationError('Unknown password hash format.')
+        return value
+
+    def validate(self, attrs):
+        # Lowercased so that rows differing only in case are caught as duplicates
+        attrs['email'] = User.objects.normalize_email(attrs['email']).lower()
+        if not attrs.get('username'):
+            attrs['username'] = attrs['email'].split('@')[0]
+        attrs['username'] = attrs['username'].lower()
+        return attrs
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """ Issues token pairs carrying the role and status claims """
+    token_class = FilteredRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """ Refreshes tokens, checking the blacklist through the JTI filter """
+    token_class = FilteredRefreshToken
+
+class FilteredTokenBlacklistSerializer(TokenBlacklistSerializer):
+    """ Blacklists tokens and adds them to this process's JTI filter """
+    token_class = FilteredRefreshToken
+
+class FilteredTokenVerifySerializer(TokenVerifySerializer):
+    """ Verifies tokens, checking the blacklist through the JTI filter """
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if (
+            api_settings.BLACKLIST_AFTER_ROTATION
+            and 'rest_framework_simplejwt.token_blacklist' in settings.INSTALLED_APPS
+            and get_jti_filter().is_blacklisted(token.get(api_settings.JTI_CLAIM))
+        ):
+            raise serializers.ValidationError('Token is blacklisted')
+        return {}
 
 # class UserSerializer():
 #     pass
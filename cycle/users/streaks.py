@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.db import transaction
+
+from common.pagination import iterate_in_chunks
+
+from .models import Rent, RenterProfile
+
+STREAK_FIELDS = ('last_rent_date', 'current_rent_streak', 'max_rent_streak')
+
+
+def scan_rent_dates(chunk_size=2000):
+    """
+    Yields (renter_id, rental_date) of every Rent sorted by renter and date,
+    read in keyset chunks along the rent_renter_date_idx index.
+    """
+    rents = Rent.objects.values('id', 'renter_id', 'rental_date')
+    for chunk in iterate_in_chunks(rents, ordering=('renter_id', 'rental_date', 'id'), chunk_size=chunk_size):
+        for rent in chunk:
+            yield rent['renter_id'], rent['rental_date']
+
+
+def compute_streaks(rent_dates):
+    """
+    Folds sorted rent dates into the streaks of each renter.
+
+    Parameters:
+    - rent_dates: (renter_id, rental_date) pairs sorted by renter and date.
+
+    Yields:
+    - (renter_id, {last_rent_date, current_rent_streak, max_rent_streak})
+      per renter, in renter order.
+    """
+    renter_id = streaks = None
+    for rent_renter_id, rental_date in rent_dates:
+        if rent_renter_id != renter_id:
+            if streaks is not None:
+                yield renter_id, streaks
+            renter_id = rent_renter_id
+            streaks = {'last_rent_date': None, 'current_rent_streak': 0, 'max_rent_streak': 0}
+        last = streaks['last_rent_date']
+        if last == rental_date:
+            continue
+        if last is not None and last == rental_date - timedelta(days=1):
+            streaks['current_rent_streak'] += 1
+        else:
+            streaks['current_rent_streak'] = 1
+        streaks['max_rent_streak'] = max(streaks['max_rent_streak'], streaks['current_rent_streak'])
+        streaks['last_rent_date'] = rental_date
+    if streaks is not None:
+        yield renter_id, streaks
+
+
+def recompute_rent_streaks(chunk_size=2000):
+    """
+    Rebuilds the streaks of every RenterProfile from the Rent table.
+
+    Rents sorted by renter and profiles sorted by user are both walked in
+    keyset chunks and merged in a single pass, so memory stays bounded by
+    chunk_size and each chunk of profiles costs one SELECT and one bulk
+    UPDATE instead of a query per renter. Profiles whose renter has no
+    rents are reset to zero, and unchanged profiles are not written.
+
+    Parameters:
+    - chunk_size: Number of rows read per query and profiles per UPDATE.
+
+    Returns:
+    - Dict with the checked and updated profile counts.
+    """
+    result = {'checked': 0, 'updated': 0}
+    empty = {'last_rent_date': None, 'current_rent_streak': 0, 'max_rent_streak': 0}
+    streaks = compute_streaks(scan_rent_dates(chunk_size))
+    pending = next(streaks, None)
+
+    profiles = RenterProfile.objects.only('id', 'user_id', *STREAK_FIELDS)
+    for chunk in iterate_in_chunks(profiles, ordering=('user_id',), chunk_size=chunk_size):
+        changed = []
+        for profile in chunk:
+            while pending is not None and pending[0] < profile.user_id:
+                pending = next(streaks, None)
+            values = pending[1] if pending is not None and pending[0] == profile.user_id else empty
+            if any(getattr(profile, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(profile, name, value)
+                changed.append(profile)
+        if changed:
+            with transaction.atomic():
+                RenterProfile.objects.bulk_update(changed, STREAK_FIELDS)
+        result['checked'] += len(chunk)
+        result['updated'] += len(changed)
+    return result
@@ -1,3 +1,378 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import hashers
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import hashing
+from .authentication import ClaimsJWTAuthentication, ClaimsUser, PooledModelBackend
+from .blacklist import JTIFilter
+from .hashing import HashingOverloaded, HashingPool
+from .loaders import get_role_queryset
+from .models import Rent, Renter, RenterProfile, Rentee, User
+from .provisioning import provision_renters
+from .streaks import recompute_rent_streaks
+from .serializers import RenterSerializer, UserSerializer
+from .views import UserListView
+
+
+def create_renter(email='renter@example.com'):
+    return Renter.objects.create_user(
+        email, email.split('@')[0], 'Renter', 'password',
+        institution='Cycle University', phone_number='0700000000', registration_number='REG-1',
+    )
+
+
+def create_rentee(email='rentee@example.com'):
+    return Rentee.objects.create_user(email, email.split('@')[0], 'Rentee', 'password')
+
+
+class RoleLoaderTest(TestCase):
+    """ Users serialize with their role's profile in a constant number of queries """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin@example.com', 'admin', 'Admin', 'password')
+        for i in range(5):
+            create_renter(f'renter{i}@example.com')
+            create_rentee(f'rentee{i}@example.com')
+
+    def test_user_serializer(self):
+        # the users, their groups and their permissions
+        with self.assertNumQueries(3):
+            data = UserSerializer(UserListView.queryset.all(), many=True).data
+        profile_ids = {row['email']: row['profile_id'] for row in data}
+        renter = Renter.objects.select_related('renterprofile').get(email='renter0@example.com')
+        rentee = Rentee.objects.select_related('renteeprofile').get(email='rentee0@example.com')
+        self.assertEqual(profile_ids['renter0@example.com'], renter.renterprofile.renter_id)
+        self.assertEqual(profile_ids['rentee0@example.com'], rentee.renteeprofile.rentee_id)
+        self.assertIsNone(profile_ids['admin@example.com'])
+
+    def test_renter_serializer(self):
+        with self.assertNumQueries(1):
+            data = RenterSerializer(get_role_queryset(User.Role.RENTER), many=True).data
+        self.assertEqual(len(data), 5)
+        self.assertTrue(all(row['renter_id'] and row['max_rent_streak'] == 0 for row in data))
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for model in ('user', 'renter', 'rentee'):
+            response = self.client.get(reverse(f'admin:users_{model}_changelist'))
+            self.assertEqual(response.status_code, 200)
+
+
+class UserListTest(TestCase):
+    """ Admins page through users by cursor, filtered by role and name prefix """
+
+    url = '/accounts/users/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin@example.com', 'admin', 'Admin', 'password')
+        create_renter('alice@example.com')
+        create_renter('bob@example.com')
+        create_rentee('carol@example.com')
+        Rentee.objects.create_user('dave@example.com', 'alfred', 'Dave', 'password')
+        Rentee.objects.create_user('erin@example.com', 'erin', 'Alma', 'password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def emails(self, **params):
+        emails, response = [], self.client.get(self.url, {'page_size': 2, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            emails.extend(user['email'] for user in response.data['results'])
+            if response.data['next'] is None:
+                return emails
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walks_every_user_once(self):
+        self.assertEqual(self.emails(), list(User.objects.order_by('-id').values_list('email', flat=True)))
+
+    def test_role_filter(self):
+        self.assertEqual(self.emails(role=User.Role.RENTEE), ['erin@example.com', 'dave@example.com', 'carol@example.com'])
+        response = self.client.get(self.url, {'role': 'OWNER'})
+        self.assertEqual((response.status_code, response.data), (400, {'role': ["'OWNER' is not a valid role."]}))
+
+    def test_prefix_search(self):
+        # email, username and first name prefixes, case insensitive
+        self.assertEqual(self.emails(search='AL'), ['erin@example.com', 'dave@example.com', 'alice@example.com'])
+        self.assertEqual(self.emails(search='lice'), [])
+        self.assertEqual(self.emails(search='b', role=User.Role.RENTEE), [])
+
+    def test_admins_only(self):
+        client = APIClient()
+        client.force_authenticate(Renter.objects.get(email='alice@example.com'))
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+
+class ProvisionRentersTest(TestCase):
+    """ Bulk imports skip duplicates regardless of case and report rejected batches """
+
+    header = 'email,username,first_name,institution,phone_number,registration_number\n'
+
+    def provision(self, *rows, **kwargs):
+        return provision_renters(StringIO(self.header + ''.join(f'{row}\n' for row in rows)), **kwargs)
+
+    def test_case_insensitive_duplicates(self):
+        create_renter('taken@example.com')
+        result = self.provision(
+            'New@Example.com,,New,Cycle University,0700000001,REG-2',
+            'new@EXAMPLE.com,other,Other,Cycle University,0700000002,REG-3',
+            'TAKEN@example.com,,Taken,Cycle University,0700000003,REG-4',
+            'fresh@example.com,NEW,Fresh,Cycle University,0700000004,REG-5',
+        )
+        self.assertEqual((result['created'], result['skipped']), (1, 3))
+        self.assertEqual([error['line'] for error in result['errors']], [3, 4, 5])
+        renter = Renter.objects.select_related('renterprofile').get(email='new@example.com')
+        self.assertEqual(renter.username, 'new')
+        self.assertTrue(renter.renterprofile.renter_id)
+
+    def test_integrity_error_rejects_the_batch(self):
+        with mock.patch('users.provisioning.insert_renters', side_effect=IntegrityError):
+            result = self.provision(
+                'a@example.com,,A,Cycle University,0700000001,REG-2',
+                'b@example.com,,B,Cycle University,0700000002,REG-3',
+                'c@example.com,,C,Cycle University,0700000003,REG-4',
+                batch_size=2,
+            )
+        self.assertEqual((result['created'], result['skipped']), (0, 3))
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3, 4])
+        self.assertFalse(Renter.objects.exists())
+
+
+class RentStreakTest(TestCase):
+    """ Streaks follow consecutive rental days and are rebuilt from every Rent """
+
+    start = date(2024, 1, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.renter = create_renter()
+        cls.idle = create_renter('idle@example.com')
+
+    def rent(self, days):
+        Rent.objects.create(renter=self.renter, rental_date=self.start + timedelta(days=days))
+        return self.streaks(self.renter)
+
+    def streaks(self, renter):
+        profile = RenterProfile.objects.get(user=renter)
+        return profile.last_rent_date, profile.current_rent_streak, profile.max_rent_streak
+
+    def day(self, days):
+        return self.start + timedelta(days=days)
+
+    def test_update_rent_streak(self):
+        self.assertEqual(self.rent(0), (self.day(0), 1, 1))
+        # consecutive
+        self.assertEqual(self.rent(1), (self.day(1), 2, 2))
+        # same day
+        self.assertEqual(self.rent(1), (self.day(1), 2, 2))
+        # gap
+        self.assertEqual(self.rent(3), (self.day(3), 1, 2))
+        # backdated rows are left to the recompute
+        self.assertEqual(self.rent(2), (self.day(3), 1, 2))
+
+    def test_recompute_rent_streaks(self):
+        for days in (0, 1, 1, 3, 2, 5):
+            self.rent(days)
+        RenterProfile.objects.filter(user=self.idle).update(
+            last_rent_date=self.start, current_rent_streak=3, max_rent_streak=3,
+        )
+        result = recompute_rent_streaks(chunk_size=1)
+        self.assertEqual(result, {'checked': 2, 'updated': 2})
+        self.assertEqual(self.streaks(self.renter), (self.day(5), 1, 4))
+        self.assertEqual(self.streaks(self.idle), (None, 0, 0))
+        self.assertEqual(recompute_rent_streaks(), {'checked': 2, 'updated': 0})
+
+
+class JTIFilterTest(TransactionTestCase):
+    """ The JTI filter is built off the request thread and swapped in whole """
+
+    def blacklist(self, jti):
+        token = OutstandingToken.objects.create(jti=jti, token='', expires_at=timezone.now() + timedelta(days=1))
+        BlacklistedToken.objects.create(token=token)
+
+    def wait_for_rebuild(self, jti_filter, previous=None):
+        deadline = time.monotonic() + 5
+        while jti_filter.state is previous or jti_filter.added is not None:
+            self.assertLess(time.monotonic(), deadline, 'the JTI filter was not rebuilt')
+            time.sleep(0.01)
+
+    def test_background_rebuild(self):
+        self.blacklist('old')
+        jti_filter = JTIFilter(refresh_interval=60)
+        # answered by the database while the first build runs
+        self.assertTrue(jti_filter.is_blacklisted('old'))
+        self.wait_for_rebuild(jti_filter)
+        with self.assertNumQueries(0):
+            self.assertFalse(jti_filter.is_blacklisted('unknown'))
+        self.assertTrue(jti_filter.is_blacklisted('old'))
+
+        state = jti_filter.state
+        self.blacklist('new')
+        jti_filter.refreshed_at, jti_filter.rebuilt_at = 0.0, -jti_filter.rebuild_interval
+        jti_filter.is_blacklisted('unknown')
+        self.wait_for_rebuild(jti_filter, previous=state)
+        self.assertIn('new', jti_filter.state.bloom)
+        self.assertTrue(jti_filter.is_blacklisted('new'))
+
+    def test_rebuild_keeps_added_jtis(self):
+        jti_filter = JTIFilter()
+        jti_filter.rebuild()
+        # a rebuild is running when this process blacklists a token
+        jti_filter.added = set()
+        jti_filter.add('local')
+        jti_filter.rebuild()
+        self.assertIn('local', jti_filter.state.bloom)
+        self.assertIsNone(jti_filter.added)
+
+
+class ClaimsAuthenticationTest(TestCase):
+    """ Tokens carry the role and status claims and stop working once they change """
+
+    url = '/components/notifications/unread-count/'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = create_rentee()
+        tokens = APIClient().post('/api/token/', {'email': self.user.email, 'password': 'password'}).data
+        self.access, self.refresh = tokens['access'], tokens['refresh']
+
+    def get(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return client.get(self.url)
+
+    def authenticate(self, access):
+        request = RequestFactory().get(self.url, HTTP_AUTHORIZATION=f'Bearer {access}')
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_claims_are_issued_and_refreshed(self):
+        claims = {'role': User.Role.RENTEE, 'is_active': True, 'is_staff': False, 'is_superuser': False}
+        access = AccessToken(self.access)
+        self.assertEqual({claim: access[claim] for claim in claims}, claims)
+        refreshed = APIClient().post('/api/token/refresh/', {'refresh': self.refresh}).data['access']
+        access = AccessToken(refreshed)
+        self.assertEqual({claim: access[claim] for claim in claims}, claims)
+        self.assertEqual(self.get(refreshed).status_code, 200)
+
+    def test_no_user_query(self):
+        self.authenticate(self.access)
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.access)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.role), (self.user.pk, User.Role.RENTEE))
+
+    def test_deactivated_user(self):
+        self.assertEqual(self.get(self.access).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(self.access).status_code, 401)
+
+    def test_role_change_after_the_cache_expires(self):
+        self.assertEqual(self.get(self.access).status_code, 200)
+        # an UPDATE sends no signal, the cached state holds until it expires
+        User.objects.filter(pk=self.user.pk).update(role=User.Role.RENTER)
+        self.assertEqual(self.get(self.access).status_code, 200)
+        cache.clear()
+        response = self.get(self.access)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'stale_claims')
+
+    def test_deleted_user(self):
+        self.assertEqual(self.get(self.access).status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.get(self.access).status_code, 401)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.access)
+
+    def test_legacy_tokens_use_the_database(self):
+        legacy = str(AccessToken.for_user(self.user))
+        with self.assertNumQueries(1):
+            user = self.authenticate(legacy)
+        self.assertIsInstance(user, User)
+        self.assertEqual(self.get(legacy).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get(legacy).status_code, 401)
+
+
+class HashingPoolTest(TestCase):
+    """ Passwords are verified on the bounded pool, which sheds load once full """
+
+    def setUp(self):
+        self.user = create_rentee()
+        hashing._pool.reset()
+        self.addCleanup(hashing._pool.reset)
+
+    def login(self, password='password'):
+        return APIClient().post('/api/token/', {'email': self.user.email, 'password': password})
+
+    def test_login_hashes_on_the_pool(self):
+        threads = []
+
+        def check_password(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return check(*args, **kwargs)
+
+        check = hashers.check_password
+        with mock.patch('django.contrib.auth.hashers.check_password', check_password):
+            response = self.login()
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('access', response.data)
+            self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith('password-hashing') for name in threads))
+
+    def test_saturated_pool_is_refused(self):
+        pool = HashingPool(workers=1, max_queue=1)
+        self.addCleanup(pool.executor.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        futures = [pool.submit(release.wait), pool.submit(release.wait)]
+        with self.assertRaises(HashingOverloaded):
+            pool.submit(release.wait)
+
+        hashing._pool.reset(pool)
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        # the slots are released by the done callbacks, which may run just after result()
+        deadline = time.monotonic() + 5
+        while (response := self.login()).status_code == 503:
+            self.assertLess(time.monotonic(), deadline, 'the pool slots were not released')
+            time.sleep(0.01)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher', 'django.contrib.auth.hashers.UnsaltedMD5PasswordHasher',
+    ])
+    def test_outdated_hash_is_upgraded_on_the_calling_thread(self):
+        User.objects.filter(pk=self.user.pk).update(
+            password=hashers.make_password('password', hasher='unsalted_md5')
+        )
+        # queries of other threads use their own connections and are not captured
+        with CaptureQueriesContext(connection) as queries:
+            user = PooledModelBackend().authenticate(None, email=self.user.email, password='password')
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(any(query['sql'].startswith('UPDATE') for query in queries.captured_queries))
+        self.assertTrue(User.objects.get(pk=self.user.pk).password.startswith('md5$'))
@@ -1,11 +1,21 @@
+import csv
+import io
+
+from django.db.models import Q
 from rest_framework import generics, permissions, status, authentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
-from django.contrib.auth.hashers import make_password
+from .hashing import make_password
+from .provisioning import provision_renters
 from .models import User, Renter
 from .serializers import UserSerializer, RenterSerializer
 from .permissions import IsRenterOrReadOnly
+from .loaders import get_role_queryset, with_role_relations
+from components.idempotency import idempotent
+from common.pagination import KeysetPagination
 
 
 class RenterCreateView(generics.CreateAPIView):
@@ -16,6 +26,15 @@ class RenterCreateView(generics.CreateAPIView):
     """
     permission_classes = [permissions.AllowAny]
     serializer_class = RenterSerializer
+    queryset = get_role_queryset(User.Role.RENTER)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """
+        Create a Renter, replaying the earlier response when a retry carries
+        the same Idempotency-Key header.
+        """
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         """
@@ -57,13 +76,74 @@ class RenterLoginView(TokenObtainPairView):
         return response
 
 
+class UserPagination(KeysetPagination):
+    """ Cursor pagination over users, newest accounts first """
+    ordering = ('-id',)
+
+
 class UserListView(generics.ListAPIView):
     """
     API view for retrieving the list of all users in the system.
 
-    Requires token authentication and is only visible to admins.
+    Requires token authentication and is only visible to admins. Results are
+    cursor-paginated on the primary key, so every page is an index range
+    scan however deep the client pages.
+
+    Query parameters:
+    - role: Only list users with this User.Role.
+    - search: Prefix of the email, username or first name.
+    - cursor / page_size: Pagination controls, see KeysetPagination.
     """
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAdminUser]
-    queryset = User.objects.all()
+    queryset = with_role_relations(User.objects.prefetch_related('groups', 'user_permissions'))
     serializer_class = UserSerializer
+    pagination_class = UserPagination
+
+    def get_queryset(self):
+        """
+        Applies the role filter and prefix search.
+
+        Raises:
+        - ValidationError: If role is not a User.Role.
+        """
+        users = super().get_queryset()
+        params = self.request.query_params
+        role = params.get('role')
+        if role:
+            if role not in User.Role.values:
+                raise ValidationError({'role': [f"'{role}' is not a valid role."]})
+            users = users.filter(role=role)
+        search = params.get('search', '').strip()
+        if search:
+            users = users.filter(
+                Q(email__istartswith=search) | Q(username__istartswith=search) | Q(first_name__istartswith=search)
+            )
+        return users
+
+
+class RenterProvisionView(APIView):
+    """
+    API view for onboarding an institution's Renters from a CSV upload.
+
+    Only admins may provision. The CSV is streamed from the "file" upload
+    and written in batches, see users.provisioning.provision_renters.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """ Handles the POST http method """
+        if request.user.role != User.Role.ADMIN and not request.user.is_staff:
+            return Response({'detail': 'Only admins can provision renters.'}, status=status.HTTP_403_FORBIDDEN)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = provision_renters(stream, institution=request.data.get('institution') or None)
+        except (UnicodeDecodeError, csv.Error) as error:
+            return Response({'file': [f'Could not read the CSV: {error}']}, status=status.HTTP_400_BAD_REQUEST)
+        response_status = status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=response_status)